@@ -0,0 +1,65 @@
+"""Compares the per-call cost of JSON-RPC calls sent one request at a time with the same calls sent as batches.
+
+A threaded development server is started against a temporary test database and called over a kept-alive HTTP
+connection, the way a browser would. Run from the backend directory:
+
+    python -m benchmarks.batch_rpc [--calls 4] [--rounds 200]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "planning_poker_backend.settings")
+django.setup()
+
+from benchmarks.database import temporary_database  # noqa: E402
+from benchmarks.server import Client, running_server  # noqa: E402
+
+
+def measure(client: Client, calls: list[dict], rounds: int, batched: bool) -> list[float]:
+    """Returns the time spent per call in every round."""
+    durations = []
+
+    for _ in range(rounds):
+        started = time.perf_counter()
+
+        if batched:
+            client.post(calls)
+        else:
+            for call in calls:
+                client.post(call)
+
+        durations.append((time.perf_counter() - started) / len(calls))
+
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=4, help="calls in a batch")
+    parser.add_argument("--rounds", type=int, default=200, help="batches measured for each variant")
+    arguments = parser.parse_args()
+
+    with temporary_database(), running_server() as port:
+        client = Client(port)
+        client.call("register", "benchmark", "benchmark")
+        session_id = client.call("create_session")
+
+        # The calls the frontend makes after voting and when refreshing a session.
+        methods = [("get_session_if_changed", session_id, -1), ("get_selection", session_id),
+                   ("get_session", session_id), ("get_sessions",)]
+        calls = [{"jsonrpc": "2.0", "method": method, "params": list(params), "id": i}
+                 for i, (method, *params) in zip(range(arguments.calls), methods * arguments.calls)]
+
+        for name, batched in [("one call per request", False), ("batched", True)]:
+            durations = measure(client, calls, arguments.rounds, batched)
+            print(f"{name}")
+            print(f"  {arguments.calls} calls   p50 {statistics.median(durations) * 1e3:7.2f} ms per call"
+                  f"   p95 {sorted(durations)[int(len(durations) * 0.95)] * 1e3:7.2f} ms per call")
+
+
+if __name__ == "__main__":
+    main()
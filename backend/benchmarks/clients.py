@@ -0,0 +1,38 @@
+"""XML-RPC clients keeping a logged-in user each, shared by the functional tests and the load test."""
+from copy import deepcopy
+from functools import wraps
+from xmlrpc.client import Transport, ServerProxy
+
+
+class CookiesTransport(Transport):
+    """A Transport (HTTP) subclass that retains cookies over its lifetime."""
+    def __init__(self):
+        super().__init__()
+        self._cookies = []
+
+    def send_headers(self, connection, headers):
+        if self._cookies:
+            connection.putheader("Cookie", "; ".join(self._cookies))
+        super().send_headers(connection, headers)
+
+    def parse_response(self, response):
+        if response.msg.get_all("Set-Cookie"):
+            for header in response.msg.get_all("Set-Cookie"):
+                cookie = header.split(";", 1)[0]
+                self._cookies.append(cookie)
+        return super().parse_response(response)
+
+
+class ServerProxyPool:
+    @wraps(ServerProxy.__init__, assigned=("__doc__", "__annotations__"), updated=("__dict__",))
+    def __init__(self, *args, **kwargs):
+        self._client_storage = {}
+        self._server_proxy_args = args
+        self._server_proxy_kwargs = kwargs
+
+    def __getitem__(self, item: int) -> ServerProxy:
+        if self._client_storage.get(item) is None:
+            self._client_storage[item] = ServerProxy(*deepcopy(self._server_proxy_args),
+                                                     **deepcopy(self._server_proxy_kwargs))
+
+        return self._client_storage[item]
@@ -0,0 +1,15 @@
+"""Helpers for benchmarks which need a database."""
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def temporary_database():
+    """Creates and migrates the test database for the duration of the block, the same way the test runner does."""
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
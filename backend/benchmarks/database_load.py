@@ -0,0 +1,120 @@
+"""Puts the configured database under mixed read/write RPC traffic: many players of one session voting, resetting
+their votes, adding stories and refreshing the session at the same time, through threaded development servers
+running in several worker processes.
+
+With SQLite, the default rollback journal is compared with the tuned mode set up by ``SQLITE_PRAGMAS``. Set
+``POSTGRES_HOST`` (and the other ``POSTGRES_*`` variables) to measure PostgreSQL instead. Run from the backend
+directory:
+
+    python -m benchmarks.database_load [--clients 16] [--processes 4] [--duration 10] [--writes 0.3]
+"""
+import argparse
+import collections
+import os
+import random
+import statistics
+import threading
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "planning_poker_backend.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from benchmarks.database import temporary_database  # noqa: E402
+from benchmarks.server import Client, running_servers  # noqa: E402
+
+
+def play(client: Client, session_id: int, writes: float, deadline: float, latencies: list[float],
+         errors: collections.Counter):
+    """Calls procedures like a player would until the deadline, a `writes` fraction of them modifying the session."""
+    voted = False
+
+    while time.perf_counter() < deadline:
+        if random.random() < writes:
+            if random.random() < 0.2:
+                call = ("create_story", session_id, "summary", "description")
+            else:
+                call = ("reset_selection", session_id) if voted else ("make_selection", session_id, 3)
+        else:
+            call = random.choice([("get_session_if_changed", session_id, -1), ("get_session", session_id)])
+
+        started = time.perf_counter()
+
+        try:
+            client.call(*call)
+        except Exception as exc:
+            errors[str(exc)] += 1
+        else:
+            voted = voted != (call[0] in ("make_selection", "reset_selection"))
+
+        latencies.append(time.perf_counter() - started)
+
+
+def measure(arguments) -> tuple[list[float], collections.Counter]:
+    latencies, errors = [], collections.Counter()
+
+    with temporary_database(), running_servers(arguments.processes) as ports:
+        owner = Client(ports[0])
+        owner.call("register", "owner", "owner")
+        session_id = owner.call("create_session")
+        clients = []
+
+        for i in range(arguments.clients):
+            client = Client(ports[i % len(ports)])
+            client.call("register", f"player{i}", "player")
+            client.call("join_session", session_id)
+            clients.append(client)
+
+        deadline = time.perf_counter() + arguments.duration
+        threads = [threading.Thread(target=play, args=(client, session_id, arguments.writes, deadline,
+                                                       latencies, errors)) for client in clients]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        for client in [owner, *clients]:
+            client.close()
+
+    return latencies, errors
+
+
+def report(name: str, arguments):
+    latencies, errors = measure(arguments)
+    latencies.sort()
+    percentile = lambda fraction: latencies[int(len(latencies) * fraction)] * 1e3  # noqa: E731
+
+    print(f"{name}")
+    print(f"  {len(latencies) / arguments.duration:8.1f} calls/s   p50 {statistics.median(latencies) * 1e3:7.2f} ms"
+          f"   p95 {percentile(0.95):7.2f} ms   p99 {percentile(0.99):7.2f} ms")
+    print(f"  {sum(errors.values())} failed calls" + "".join(f"\n    {count:6} x {message}"
+                                                         for message, count in errors.most_common(3)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16, help="players calling procedures at the same time")
+    parser.add_argument("--processes", type=int, default=4, help="server worker processes")
+    parser.add_argument("--duration", type=float, default=10, help="seconds every configuration is measured for")
+    parser.add_argument("--writes", type=float, default=0.3, help="fraction of calls modifying the session")
+    arguments = parser.parse_args()
+
+    if connection.vendor != "sqlite":
+        report(connection.vendor, arguments)
+        return
+
+    with override_settings(SQLITE_PRAGMAS={}):
+        report("sqlite, rollback journal", arguments)
+
+    report(f"sqlite, {', '.join(f'{name}={value}' for name, value in settings.SQLITE_PRAGMAS.items())}", arguments)
+
+
+if __name__ == "__main__":
+    main()
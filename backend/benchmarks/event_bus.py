@@ -0,0 +1,124 @@
+"""Measures the session event bus: publish-to-receive latency and fan-out throughput.
+
+Both backends are measured, the Redis protocol one against the bundled broker listening on a Unix socket,
+so no network access or Redis server is needed. Run from the backend directory:
+
+    python -m benchmarks.event_bus [--messages 2000] [--subscribers 10000] [--events 20]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "planning_poker_backend.settings")
+django.setup()
+
+from rpc.changes import SessionSubscription, deliver  # noqa: E402
+from rpc.event_broker import EventBrokerThread  # noqa: E402
+from rpc.event_bus import EventBus, InMemoryEventBus, RedisEventBus  # noqa: E402
+
+
+def measure_latency(make_buses, messages: int) -> list[float]:
+    """Publishes messages one at a time and times their arrival at the receiving bus."""
+    received = threading.Event()
+    latencies = []
+
+    def receive(session_id, events):
+        latencies.append(time.perf_counter() - events[0]["sent"])
+        received.set()
+
+    publisher, subscriber = make_buses(receive)
+
+    for _ in range(messages):
+        received.clear()
+        publisher.publish(1, [{"type": "vote_cast", "sent": time.perf_counter()}])
+        received.wait(5)
+
+    publisher.close()
+    subscriber.close()
+    return latencies
+
+
+def measure_fan_out(make_buses, subscribers: int, events: int) -> float:
+    """Publishes events from another thread to a session with many subscriptions in this process
+    and returns the time it took until every subscription has received every event."""
+    publisher, receiver = make_buses(deliver)
+
+    async def run() -> float:
+        subscriptions = [SessionSubscription(1) for _ in range(subscribers)]
+
+        for subscription in subscriptions:
+            subscription.__enter__()
+
+        started = time.perf_counter()
+        threading.Thread(target=lambda: [publisher.publish(1, [{"type": "vote_cast", "version": version}])
+                                         for version in range(events)]).start()
+
+        for subscription in subscriptions:
+            for _ in range(events):
+                await subscription.get()
+
+        elapsed = time.perf_counter() - started
+
+        for subscription in subscriptions:
+            subscription.__exit__(None, None, None)
+
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    publisher.close()
+    receiver.close()
+    return elapsed
+
+
+def report(name: str, make_buses, arguments):
+    latencies = sorted(measure_latency(make_buses, arguments.messages))
+    elapsed = measure_fan_out(make_buses, arguments.subscribers, arguments.events)
+    deliveries = arguments.subscribers * arguments.events
+
+    print(f"{name}")
+    print(f"  latency     p50 {statistics.median(latencies) * 1e6:8.1f} us"
+          f"   p99 {latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} us")
+    print(f"  fan-out     {arguments.subscribers} subscribers x {arguments.events} events in {elapsed:.3f} s"
+          f" = {deliveries / elapsed:,.0f} deliveries/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="messages used to measure latency")
+    parser.add_argument("--subscribers", type=int, default=10000, help="subscriptions of the fanned out session")
+    parser.add_argument("--events", type=int, default=20, help="events published to the fanned out session")
+    arguments = parser.parse_args()
+
+    # The in-memory bus only delivers within its process, so it publishes to itself.
+    def make_in_memory_buses(receiver) -> tuple[EventBus, EventBus]:
+        bus = InMemoryEventBus(receiver)
+        return bus, bus
+
+    report("in-memory", make_in_memory_buses, arguments)
+
+    with tempfile.TemporaryDirectory() as directory:
+        location = f"unix://{directory}/broker.sock"
+        broker = EventBrokerThread(location)
+        broker.start()
+
+        # Two buses stand for two worker processes, events travel through the broker.
+        def make_redis_buses(receiver) -> tuple[EventBus, EventBus]:
+            buses = RedisEventBus(lambda session_id, events: None, location), RedisEventBus(receiver, location)
+
+            for bus in buses:
+                bus.subscribed.wait(5)
+
+            return buses
+
+        report("redis protocol (bundled broker, unix socket)", make_redis_buses, arguments)
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compares revealing the votes of a large session player by player with the set-based update
+done by ``force_selections``. Runs against a temporary test database. Run from the backend directory:
+
+    python -m benchmarks.force_selections [--players 500] [--repeats 20]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "planning_poker_backend.settings")
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import F  # noqa: E402
+from django.http import HttpRequest  # noqa: E402
+
+from benchmarks.database import temporary_database  # noqa: E402
+from rpc.models import Player, Session  # noqa: E402
+from rpc.remote_procedures import force_selections  # noqa: E402
+
+
+def create_session(players: int) -> tuple[User, Session]:
+    owner = User.objects.create_user("owner")
+    users = User.objects.bulk_create(User(username=f"player{i}") for i in range(players - 1))
+    session = Session.objects.create(owner=owner, players_number=players, ready_players_number=0)
+    Player.objects.bulk_create(Player(user=user, session=session) for user in [owner, *users])
+    return owner, session
+
+
+def reset_votes(session: Session):
+    Player.objects.filter(session=session).update(voted=False, selection=None)
+    Session.objects.filter(id=session.id).update(ready_players_number=0)
+
+
+def reveal_player_by_player(owner: User, session: Session):
+    """The reveal as it was done before, saving every player who hasn't voted separately."""
+    session = Session.objects.get(id=session.id, owner=owner)
+    Session.objects.filter(id=session.id).update(ready_players_number=F("players_number"))
+
+    for player in session.player_set.all():
+        if not player.voted:
+            player.voted = True
+            player.save()
+
+
+def reveal_in_bulk(owner: User, session: Session):
+    request = HttpRequest()
+    request.user = owner
+    force_selections(session.id, request=request)
+
+
+def measure(reveal, owner: User, session: Session, repeats: int) -> tuple[list[float], int]:
+    durations = []
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    for _ in range(repeats):
+        reset_votes(session)
+        queries.clear()
+
+        with connection.execute_wrapper(count_query):
+            started = time.perf_counter()
+            reveal(owner, session)
+            durations.append(time.perf_counter() - started)
+
+    return durations, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=500, help="players in the revealed session")
+    parser.add_argument("--repeats", type=int, default=20, help="reveals measured for each variant")
+    arguments = parser.parse_args()
+
+    with temporary_database():
+        owner, session = create_session(arguments.players)
+
+        for name, reveal in [("player by player", reveal_player_by_player), ("set-based update", reveal_in_bulk)]:
+            durations, queries = measure(reveal, owner, session, arguments.repeats)
+            print(f"{name}")
+            print(f"  {arguments.players} players   p50 {statistics.median(durations) * 1e3:8.2f} ms"
+                  f"   max {max(durations) * 1e3:8.2f} ms   {queries} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Simulates planning poker rooms against the production server profile (``gunicorn.conf.py``), spawned locally
+on a temporary database, and reports the latency of every procedure and the overall throughput.
+
+Every player registers, joins their room and then keeps polling ``get_session``. Players vote from time to time,
+reset their votes once everyone's selections are revealed, and room owners force reveals and add stories and tasks.
+Run from the backend directory:
+
+    python -m benchmarks.load_test [--rooms 4] [--players 8] [--poll-interval 1] [--duration 30] [--workers 1]
+        [--max-p95 MS]
+
+The players start polling once everyone has joined, the throughput only counts the calls made from then on.
+With ``--max-p95``, the exit status is 1 if any procedure is slower than that at the 95th percentile, or any call
+fails, which makes it usable as a regression check before deploying. ``register`` and ``login`` are left out of the
+check, they hash passwords, which is slow on purpose.
+"""
+import argparse
+import collections
+import os
+import random
+import sys
+import threading
+import time
+from xmlrpc.client import Fault, ServerProxy
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "planning_poker_backend.settings")
+django.setup()
+
+from benchmarks.clients import CookiesTransport, ServerProxyPool  # noqa: E402
+from benchmarks.database import temporary_database  # noqa: E402
+from benchmarks.server import spawned_server  # noqa: E402
+
+SELECTIONS = [1, 2, 3, 5, 8, 13, 21]
+
+# Procedures hashing passwords, left out of the --max-p95 check.
+UNCHECKED_PROCEDURES = {"register", "login"}
+
+
+class Recorder:
+    """Collects the latency of every call and the errors, per procedure, from many threads."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = collections.defaultdict(list)
+        self.errors: collections.Counter = collections.Counter()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def call(self, client: ServerProxy, method: str, *params, raise_errors: bool = False):
+        """Calls a procedure and returns its result, or None if it failed, unless `raise_errors` is set."""
+        started = time.perf_counter()
+
+        try:
+            return getattr(client, method)(*params)
+        except Exception as exc:
+            if raise_errors:
+                raise
+
+            with self.lock:
+                self.errors[(method, str(exc))] += 1
+        finally:
+            elapsed = time.perf_counter() - started
+
+            with self.lock:
+                self.latencies[method].append(elapsed)
+                self.calls += 1
+
+
+class Room:
+    """A session shared by the players of one room, available once its owner has created it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.session_id = None
+        self.created = threading.Event()
+
+
+def play(client: ServerProxy, username: str, room: Room, owner: bool, playing: threading.Barrier,
+         deadline: list[float], arguments, recorder: Recorder):
+    """Joins a room, or creates it, and acts like a player until the deadline."""
+    try:
+        recorder.call(client, "register", username, username, raise_errors=True)
+    except Fault:
+        # Already registered on a database kept from an earlier run
+        recorder.call(client, "login", username, username)
+
+    if owner:
+        room.session_id = recorder.call(client, "create_session")
+        room.created.set()
+    else:
+        room.created.wait()
+        recorder.call(client, "join_session", room.session_id)
+
+    session_id = room.session_id
+    playing.wait()
+    voted = False
+
+    while time.perf_counter() < deadline[0]:
+        time.sleep(arguments.poll_interval * random.uniform(0.5, 1.5))
+        session = recorder.call(client, "get_session", session_id)
+
+        if session is None:
+            continue
+
+        if all("selection" in player for player in session["players"]):
+            # Players who didn't vote before the reveal was forced have no selection to reset yet.
+            if not voted:
+                recorder.call(client, "make_selection", session_id, random.choice(SELECTIONS))
+
+            recorder.call(client, "reset_selection", session_id)
+            voted = False
+        elif not voted and random.random() < arguments.vote_chance:
+            recorder.call(client, "make_selection", session_id, random.choice(SELECTIONS))
+            voted = True
+
+        if owner and random.random() < arguments.reveal_chance:
+            recorder.call(client, "force_selections", session_id)
+
+        if owner and random.random() < arguments.story_chance:
+            story_id = recorder.call(client, "create_story", session_id, "summary", "description")
+
+            if story_id is not None:
+                recorder.call(client, "create_task", story_id, "summary", random.choice(SELECTIONS))
+
+
+def percentile(latencies: list[float], fraction: float) -> float:
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1e3
+
+
+def run(port: int, arguments, recorder: Recorder) -> tuple[int, float]:
+    """Lets the players of every room play and returns the number of calls made and the time taken after everyone
+    has joined.
+    """
+    clients = ServerProxyPool(f"http://127.0.0.1:{port}/", transport=CookiesTransport(), allow_none=True)
+    deadline, started = [], []
+
+    def start_playing():
+        started.extend([recorder.calls, time.perf_counter()])
+        deadline.append(started[1] + arguments.duration)
+
+    playing = threading.Barrier(arguments.rooms * arguments.players, action=start_playing)
+    threads = []
+
+    for number in range(arguments.rooms):
+        room = Room(f"room{number}")
+
+        for player in range(arguments.players):
+            client = clients[number * arguments.players + player]
+            threads.append(threading.Thread(target=play, args=(client, f"{room.name}-player{player}", room,
+                                                               player == 0, playing, deadline, arguments,
+                                                               recorder)))
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return recorder.calls - started[0], time.perf_counter() - started[1]
+
+
+def report(recorder: Recorder, calls: int, elapsed: float, max_p95: float | None) -> bool:
+    """Prints the results and returns whether they are within the limits."""
+    passed = not recorder.errors
+
+    print(f"{'procedure':<20} {'calls':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+    for method, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        errors = sum(count for (name, _), count in recorder.errors.items() if name == method)
+        p95 = percentile(latencies, 0.95)
+        passed = passed and (max_p95 is None or p95 <= max_p95 or method in UNCHECKED_PROCEDURES)
+
+        print(f"{method:<20} {len(latencies):>7} {errors:>7} {percentile(latencies, 0.5):>8.2f} {p95:>8.2f}"
+              f" {percentile(latencies, 0.99):>8.2f}")
+
+    print(f"{calls} calls in {elapsed:.1f} s of play, {calls / elapsed:.1f} calls/s")
+
+    for (method, message), count in recorder.errors.most_common(5):
+        print(f"  {count:6} x {method}: {message}")
+
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=4, help="number of sessions played at the same time")
+    parser.add_argument("--players", type=int, default=8, help="players in every room, the owner included")
+    parser.add_argument("--poll-interval", type=float, default=1, help="average seconds between get_session calls")
+    parser.add_argument("--duration", type=float, default=30, help="seconds the rooms are played for, once joined")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--vote-chance", type=float, default=0.3, help="chance of voting after a poll")
+    parser.add_argument("--reveal-chance", type=float, default=0.05,
+                        help="chance of the owner forcing a reveal after a poll")
+    parser.add_argument("--story-chance", type=float, default=0.02,
+                        help="chance of the owner adding a story with a task after a poll")
+    parser.add_argument("--max-p95", type=float, help="fail if any procedure is slower at the 95th percentile (ms)")
+    arguments = parser.parse_args()
+
+    print(f"{arguments.rooms} rooms of {arguments.players} players, {arguments.workers} workers")
+    recorder = Recorder()
+
+    with temporary_database(), spawned_server(arguments.workers) as port:
+        calls, elapsed = run(port, arguments, recorder)
+
+    if not report(recorder, calls, elapsed, arguments.max_p95) and arguments.max_p95 is not None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
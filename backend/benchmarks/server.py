@@ -0,0 +1,145 @@
+"""Development and production servers, and an HTTP JSON-RPC client for benchmarks."""
+import http.client
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    # Response headers and body are written separately, Nagle's algorithm would hold the body back
+    # until the client acknowledges the headers on a kept-alive connection.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def running_server():
+    """Serves the project from a threaded development server in the background and yields its port."""
+    server = ThreadedWSGIServer(("localhost", 0), QuietWSGIRequestHandler)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        yield server.server_port
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _serve(connection: multiprocessing.connection.Connection):
+    server = ThreadedWSGIServer(("localhost", 0), QuietWSGIRequestHandler)
+    server.set_app(get_wsgi_application())
+    connection.send(server.server_port)
+    server.serve_forever()
+
+
+@contextmanager
+def running_servers(processes: int):
+    """Serves the project from threaded development servers in forked worker processes and yields their ports.
+    The processes share the database, like the workers of a production server do.
+    """
+    # Forked processes must not share the database connections of this one.
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    workers, ports = [], []
+
+    for _ in range(processes):
+        receiver, sender = context.Pipe(duplex=False)
+        worker = context.Process(target=_serve, args=(sender,), daemon=True)
+        worker.start()
+        workers.append(worker)
+        ports.append(receiver.recv())
+
+    try:
+        yield ports
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def spawned_server(workers: int):
+    """Runs the production server profile (``gunicorn.conf.py``) on the current database in a separate process
+    and yields its port once it reports being healthy.
+    """
+    port = free_port()
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "GUNICORN_BIND": f"127.0.0.1:{port}"}
+    env["SQLITE_PATH" if connection.vendor == "sqlite" else "POSTGRES_DB"] = str(connection.settings_dict["NAME"])
+    # The server opens its own connections.
+    connection.close()
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "--access-logfile", os.devnull,
+                               "--log-level", "warning"], env=env)
+
+    try:
+        for _ in range(300):
+            if server.poll() is not None:
+                raise RuntimeError("The server did not start")
+
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health") as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("The server did not become healthy")
+
+        yield port
+    finally:
+        server.terminate()
+        server.wait()
+
+
+class Client:
+    """Posts JSON-RPC payloads over a single connection, keeping the session cookie."""
+
+    def __init__(self, port: int):
+        self.connection = http.client.HTTPConnection("localhost", port)
+        self.cookies = {}
+
+    def post(self, payload) -> object:
+        headers = {"Content-Type": "application/json"}
+
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+
+        self.connection.request("POST", "/", json.dumps(payload), headers)
+        response = self.connection.getresponse()
+
+        for header in response.headers.get_all("Set-Cookie") or []:
+            name, value = header.split(";", 1)[0].split("=", 1)
+            self.cookies[name] = value
+
+        return json.loads(response.read())
+
+    def call(self, method: str, *params) -> object:
+        response = self.post({"jsonrpc": "2.0", "method": method, "params": list(params), "id": 1})
+
+        if "error" in response:
+            raise Exception(response["error"]["message"])
+
+        return response["result"]
+
+    def close(self):
+        self.connection.close()
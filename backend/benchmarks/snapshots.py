@@ -0,0 +1,97 @@
+"""Compares reading a session from its precomputed snapshot, as ``get_session`` does, with rebuilding its details
+from players, stories and tasks, for sessions of growing size. Also measures what refreshing the snapshot adds to
+a modification. Runs against a temporary test database. Run from the backend directory:
+
+    python -m benchmarks.snapshots [--sizes 2 20 200] [--repeats 200]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "planning_poker_backend.settings")
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.http import HttpRequest  # noqa: E402
+
+from benchmarks.database import temporary_database  # noqa: E402
+from rpc.changes import session_changed  # noqa: E402
+from rpc.models import Player, Session, Story, Task  # noqa: E402
+from rpc.remote_procedures import get_session  # noqa: E402
+from rpc.snapshots import build_session_details  # noqa: E402
+
+
+def create_session(size: int) -> tuple[User, Session]:
+    """Creates a session with `size` players and `size` stories of 5 tasks each."""
+    owner = User.objects.create_user(f"owner{size}")
+    users = User.objects.bulk_create(User(username=f"player{size}-{i}") for i in range(size - 1))
+    session = Session.objects.create(owner=owner, players_number=size, ready_players_number=0)
+    Player.objects.bulk_create(Player(user=user, session=session) for user in [owner, *users])
+    stories = Story.objects.bulk_create(Story(session=session, summary="summary", description="description" * 10)
+                                        for _ in range(size))
+    Task.objects.bulk_create(Task(story=story, summary="summary", estimation=3) for story in stories for _ in range(5))
+    session_changed(session.id)
+    return owner, session
+
+
+def read_snapshot(owner: User, session: Session):
+    request = HttpRequest()
+    request.user = owner
+    get_session(session.id, request=request)
+
+
+def rebuild(owner: User, session: Session):
+    """Reading the session as it was done before snapshots."""
+    session = Player.objects.select_related("session").get(user=owner, session=session.id).session
+    build_session_details(session, owner)
+
+
+def modify(owner: User, session: Session):
+    session_changed(session.id)
+
+
+def measure(operation, owner: User, session: Session, repeats: int) -> tuple[list[float], int]:
+    durations = []
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    for _ in range(repeats):
+        queries.clear()
+
+        with connection.execute_wrapper(count_query):
+            started = time.perf_counter()
+            operation(owner, session)
+            durations.append(time.perf_counter() - started)
+
+    return durations, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 20, 200],
+                        help="numbers of players and of stories in the measured sessions")
+    parser.add_argument("--repeats", type=int, default=200, help="operations measured for each variant and size")
+    arguments = parser.parse_args()
+
+    with temporary_database():
+        sessions = {size: create_session(size) for size in arguments.sizes}
+
+        for name, operation in [("read from snapshot", read_snapshot), ("rebuilt from tables", rebuild),
+                                ("modification with snapshot refresh", modify)]:
+            print(name)
+
+            for size, (owner, session) in sessions.items():
+                durations, queries = measure(operation, owner, session, arguments.repeats)
+                print(f"  {size:4} players, {size:4} stories   p50 {statistics.median(durations) * 1e3:8.3f} ms"
+                      f"   max {max(durations) * 1e3:8.3f} ms   {queries} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Measures the estimation statistics engine on synthetic votes, and compares it with describing every round
+in a Python loop, for growing numbers of votes. Then stores the votes of a single session in a temporary test
+database and measures reading them with ``load_votes`` and the whole ``estimation_statistics`` of the session,
+for sizes up to --stored-limit. Run from the backend directory:
+
+    python -m benchmarks.statistics [--votes 10000 100000 5000000] [--players 8] [--loop-limit 100000]
+                                    [--stored-limit 1000000]
+"""
+import argparse
+import os
+import time
+
+import django
+import numpy as np
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "planning_poker_backend.settings")
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+
+from benchmarks.database import temporary_database  # noqa: E402
+from rpc.models import Session, Story, Vote, VoteRound  # noqa: E402
+from rpc.statistics import Votes, estimation_statistics, group_statistics, load_votes  # noqa: E402
+from rpc.statistics import player_statistics, story_statistics  # noqa: E402
+
+DECK = [0, 1, 2, 3, 5, 8, 13, 20, 40, 100]
+
+
+def synthetic_votes(size: int, players: int, generator: np.random.Generator) -> Votes:
+    """Rounds of `players` votes each, ordered by round as they are loaded, with about 3 rounds per story.
+    Every round is played by a different selection of `players` out of ``players * 50`` users.
+    """
+    rounds = np.arange(size) // players
+    users = (rounds * 7 + np.arange(size) % players) % (players * 50)
+    values = generator.choice(DECK, size)
+
+    return Votes(rounds, rounds // 3, users, values)
+
+
+def store(votes: Votes, players: int) -> Session:
+    """Saves the votes as the recorded rounds of a new session."""
+    owner = User.objects.create_user(f"owner{len(votes)}")
+    users = User.objects.bulk_create(User(username=f"player{len(votes)}-{i}") for i in range(players * 50))
+    session = Session.objects.create(owner=owner, players_number=players, ready_players_number=0)
+    stories = Story.objects.bulk_create(Story(session=session, summary="summary", description="description")
+                                        for _ in range(votes.stories.max() + 1))
+    rounds = VoteRound.objects.bulk_create(VoteRound(session=session, story=stories[story], number=number + 1)
+                                           for number, story in enumerate(votes.stories[::players].tolist()))
+    Vote.objects.bulk_create((Vote(round_id=rounds[vote_round].id, user_id=users[user].id, value=value)
+                              for vote_round, user, value in zip(votes.rounds.tolist(), votes.users.tolist(),
+                                                                 votes.values.tolist())), batch_size=10_000)
+    return session
+
+
+def loop(votes: Votes):
+    """Describing every round on its own, as a straightforward implementation would."""
+    for key in np.unique(votes.rounds):
+        group = votes.values[votes.rounds == key]
+        first_quartile, third_quartile = np.quantile(group, [0.25, 0.75])
+        (group.mean(), np.median(group), group.std(), group.min(), group.max(), first_quartile, third_quartile)
+
+
+def measure(operation, *args) -> float:
+    started = time.perf_counter()
+    operation(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--votes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--loop-limit", type=int, default=100_000, help="largest number of votes to loop over")
+    parser.add_argument("--stored-limit", type=int, default=1_000_000, help="largest number of votes to store")
+    args = parser.parse_args()
+    generator = np.random.default_rng(0)
+    stored = []
+
+    print(f"{'votes':>10} {'rounds':>10} {'stories':>10} {'players':>10} {'loop':>10}")
+
+    for size in args.votes:
+        votes = synthetic_votes(size, args.players, generator)
+        looped = f"{measure(loop, votes):9.3f}s" if size <= args.loop_limit else f"{'-':>10}"
+
+        print(f"{size:>10} {measure(group_statistics, votes.rounds, votes.values):9.3f}s "
+              f"{measure(story_statistics, votes):9.3f}s {measure(player_statistics, votes):9.3f}s {looped}")
+
+        if size <= args.stored_limit:
+            stored.append(votes)
+
+    if not stored:
+        return
+
+    print(f"\n{'votes':>10} {'load':>10} {'session':>10}")
+
+    with temporary_database():
+        for votes in stored:
+            session = store(votes, args.players)
+            loading = measure(load_votes, Vote.objects.filter(round__session=session))
+
+            print(f"{len(votes):>10} {loading:9.3f}s {measure(estimation_statistics, session.id):9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Measures the throughput of ``get_session`` polling served by the production server profile
+(``gunicorn.conf.py``) with different numbers of worker processes. Run from the backend directory:
+
+    python -m benchmarks.workers [--workers 1 4 8] [--clients 32] [--duration 10]
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "planning_poker_backend.settings")
+django.setup()
+
+from benchmarks.database import temporary_database  # noqa: E402
+from benchmarks.server import Client, spawned_server  # noqa: E402
+
+
+def poll(client: Client, session_id: int, deadline: float, latencies: list[float]):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        client.call("get_session", session_id)
+        latencies.append(time.perf_counter() - started)
+
+
+def measure(workers: int, arguments) -> list[float]:
+    latencies = []
+
+    with spawned_server(workers) as port:
+        owner = Client(port)
+        owner.call("register", f"owner{workers}", "owner")
+        session_id = owner.call("create_session")
+        clients = []
+
+        for _ in range(arguments.clients):
+            client = Client(port)
+            client.cookies = dict(owner.cookies)
+            clients.append(client)
+
+        deadline = time.perf_counter() + arguments.duration
+        threads = [threading.Thread(target=poll, args=(client, session_id, deadline, latencies))
+                   for client in clients]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        for client in [owner, *clients]:
+            client.close()
+
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="worker counts to measure")
+    parser.add_argument("--clients", type=int, default=32, help="clients polling at the same time")
+    parser.add_argument("--duration", type=float, default=10, help="seconds every worker count is measured for")
+    arguments = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {arguments.clients} clients polling get_session")
+
+    with temporary_database():
+        for workers in arguments.workers:
+            latencies = sorted(measure(workers, arguments))
+            print(f"  {workers} workers   {len(latencies) / arguments.duration:8.1f} calls/s"
+                  f"   p50 {statistics.median(latencies) * 1e3:7.2f} ms"
+                  f"   p95 {latencies[int(len(latencies) * 0.95)] * 1e3:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
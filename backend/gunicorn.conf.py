@@ -0,0 +1,70 @@
+"""Production server profile, read by ``gunicorn`` from the working directory:
+
+    gunicorn
+
+Every setting comes from the environment:
+
+- ``WEB_CONCURRENCY``: number of worker processes, defaults to one per CPU
+- ``GUNICORN_WORKER_CLASS``: a Uvicorn worker, ``uvicorn.workers.UvicornWorker`` by default, serving
+  ``planning_poker_backend.asgi``. Other Gunicorn worker types are refused: under WSGI, Django reads
+  streaming responses whole before sending them, so event streams would never be sent and exports would
+  be held in memory, and WebSockets wouldn't be served at all
+- ``GUNICORN_BIND``, ``GUNICORN_KEEPALIVE``, ``GUNICORN_TIMEOUT``, ``GUNICORN_GRACEFUL_TIMEOUT`` and
+  ``GUNICORN_MAX_REQUESTS``, see below
+
+With more than one worker, session events have to travel between the workers. Unless
+``SESSION_EVENT_BUS_LOCATION`` points at Redis or at another broker, the master process runs the bundled
+event broker on a Unix socket for its workers.
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+
+if not worker_class.split(".", 1)[0].startswith("uvicorn"):
+    raise ValueError(f"GUNICORN_WORKER_CLASS has to be an ASGI worker such as uvicorn.workers.UvicornWorker, "
+                     f"got {worker_class}")
+
+wsgi_app = "planning_poker_backend.asgi:application"
+
+# Seconds an idle kept-alive connection stays open. Behind nginx, which reuses its upstream connections,
+# this should be longer than nginx's own keepalive_timeout.
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "75"))
+
+# Seconds a worker may stay silent before it is restarted. Asynchronous workers notify the master on their own,
+# long polls and event streams don't count.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+
+# Seconds workers get to finish requests in flight after SIGTERM, before they are killed. Long polls end
+# within LONG_POLL_MAX_TIMEOUT.
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "35"))
+
+# Workers are replaced after this many requests, spread out so that they don't restart at once. 0 disables it.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+
+
+def on_starting(server):
+    if workers < 2 or os.environ.get("SESSION_EVENT_BUS_LOCATION"):
+        return
+
+    from rpc.event_broker import EventBrokerThread
+
+    location = f"unix://{tempfile.mkdtemp(prefix='planning-poker-')}/events.sock"
+    server.event_broker = EventBrokerThread(location)
+    server.event_broker.start()
+    # Workers read the settings after being forked, so they all connect to this broker.
+    os.environ["SESSION_EVENT_BUS_LOCATION"] = location
+    server.log.info("Started the session event broker at %s", location)
+
+
+def on_exit(server):
+    if hasattr(server, "event_broker"):
+        server.event_broker.stop()
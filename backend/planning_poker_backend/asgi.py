@@ -2,6 +2,8 @@
 ASGI config for planning_poker_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are handled by Django, WebSocket connections by ``rpc.websockets``. On shutdown, the session event bus
+is closed.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -9,8 +11,36 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import sync_to_async
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'planning_poker_backend.settings')
+# Tells the settings that connections can't be kept between requests, see DATABASES
+os.environ.setdefault('DJANGO_SERVER_INTERFACE', 'asgi')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from rpc.changes import close_event_bus  # noqa: E402 - needs Django to be set up
+from rpc.websockets import session_events  # noqa: E402
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await sync_to_async(close_event_bus, thread_sensitive=False)()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await session_events(scope, receive, send)
+
+    if scope["type"] == "lifespan":
+        return await lifespan(scope, receive, send)
+
+    return await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -69,12 +70,57 @@ WSGI_APPLICATION = 'planning_poker_backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PostgreSQL is used when POSTGRES_HOST is set, SQLite otherwise
+#
+# Under ASGI, Django runs the synchronous code of every request in a thread of its own, and connections belong to
+# threads, so a persistent connection would never be reused and would only be closed by the garbage collector.
+# Connections are then closed at the end of every request. To reuse them, run a pooler such as PgBouncer in front
+# of PostgreSQL and set POSTGRES_POOLER. Under WSGI, worker threads keep their connections for CONN_MAX_AGE.
+
+_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE',
+                                   '0' if os.environ.get('DJANGO_SERVER_INTERFACE') == 'asgi' else '600'))
+
+if os.environ.get('POSTGRES_HOST'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'HOST': os.environ['POSTGRES_HOST'],
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'NAME': os.environ.get('POSTGRES_DB', 'planning_poker'),
+            'USER': os.environ.get('POSTGRES_USER', 'planning_poker'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            # Connections are kept open between requests under WSGI, and checked before being reused
+            'CONN_MAX_AGE': _CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # Server-side cursors don't survive transaction pooling, set POSTGRES_POOLER behind e.g. PgBouncer
+            'DISABLE_SERVER_SIDE_CURSORS': bool(os.environ.get('POSTGRES_POOLER')),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Reopening the database, and with it the WAL, costs about a millisecond, which is paid in every request
+            # under ASGI, together with SQLITE_PRAGMAS
+            'CONN_MAX_AGE': _CONN_MAX_AGE,
+            # An in-memory test database is shared between threads with table level locks, which make concurrent
+            # writers fail instead of waiting for each other.
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
     }
+
+# PRAGMAs set on every new SQLite connection, see rpc.database.configure_sqlite_connection. WAL lets readers
+# work alongside a writer, writers wait for each other for up to busy_timeout milliseconds instead of failing
+# with "database is locked", and NORMAL synchronization only syncs the WAL at checkpoints
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 20000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
 }
 
 
@@ -116,4 +162,122 @@ MODERNRPC_METHODS_MODULES = [
     "rpc.remote_procedures",
 ]
 
+# Modules holding coroutine procedures served by rpc.async_rpc.AsyncRPCEntryPoint
+
+ASYNC_RPC_METHODS_MODULES = [
+    "rpc.async_procedures",
+]
+
+# How long a long-polling request may be held open, in seconds
+
+LONG_POLL_MAX_TIMEOUT = 30
+
+# How often a waiting request re-reads the session version, in case an event was lost by the event bus, in seconds
+
+SESSION_CHANGE_POLL_INTERVAL = 5.0
+
+# Event bus delivering session events to all worker processes. With more than one worker or replica, point
+# SESSION_EVENT_BUS_LOCATION at Redis (redis://host:port) or at `manage.py run_event_broker` (unix:///path)
+
+SESSION_EVENT_BUS = {
+    "BACKEND": "rpc.event_bus.RedisEventBus",
+    "LOCATION": os.environ["SESSION_EVENT_BUS_LOCATION"],
+} if os.environ.get("SESSION_EVENT_BUS_LOCATION") else {
+    "BACKEND": "rpc.event_bus.InMemoryEventBus",
+}
+
+# How long an idle Server-Sent Events stream waits before sending a keep-alive comment, in seconds
+
+EVENT_STREAM_KEEP_ALIVE = 15
+
+# How long a Server-Sent Events stream is kept open before the client has to reconnect, in seconds. Disconnected
+# clients aren't noticed while streaming, so this also bounds how long their streams are kept
+
+EVENT_STREAM_MAX_LIFETIME = 300
+
+# How long a worker process remembers that a user is a player of a session, in seconds, 0 to look it up in every
+# request. Memberships are forgotten as soon as a player leaves in every process reached by the event bus
+
+SESSION_MEMBERSHIP_CACHE_TTL = 0
+
+# How many sessions get_sessions returns at most, the default page size of the lobby
+
+SESSIONS_PAGE_SIZE = 50
+
+# How many stories import_stories and /import/<session id> insert per bulk insert
+
+IMPORT_BATCH_SIZE = 500
+
+# How many rows /export/<session id> fetches from the database at a time, and how many characters it sends at a time
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+# How many of the most recent versions of every session are kept in its change log, the oldest version
+# get_session_delta answers with changes rather than the full session details, and event streams resume from
+
+SESSION_CHANGE_LOG_LENGTH = 64
+
+# Cache holding the serialized session details of the current version of every recently read session, None to
+# read them from the database every time. By default every worker process keeps its own cache in memory, evicting
+# the least recently used sessions past SESSION_DETAILS_CACHE_MAX_ENTRIES entries or MAX_BYTES bytes. Point
+# SESSION_DETAILS_CACHE_LOCATION at Redis (redis://host:port or unix:///path) to share it between workers, with the
+# server's maxmemory set and maxmemory-policy set to allkeys-lru to keep it bounded. Entries are removed whenever a
+# session changes and are never served for another version
+
+SESSION_DETAILS_CACHE = os.environ.get("SESSION_DETAILS_CACHE", "session_details") or None
+
+SESSION_DETAILS_CACHE_MAX_ENTRIES = int(os.environ.get("SESSION_DETAILS_CACHE_MAX_ENTRIES", "1000"))
+
+SESSION_DETAILS_CACHE_MAX_BYTES = int(os.environ.get("SESSION_DETAILS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+SESSION_DETAILS_CACHE_LOCATION = os.environ.get("SESSION_DETAILS_CACHE_LOCATION", "")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "session_details": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": SESSION_DETAILS_CACHE_LOCATION,
+        "TIMEOUT": None,
+    } if SESSION_DETAILS_CACHE_LOCATION else {
+        "BACKEND": "rpc.cache.BoundedLocMemCache",
+        "LOCATION": "session-details",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": SESSION_DETAILS_CACHE_MAX_ENTRIES, "MAX_BYTES": SESSION_DETAILS_CACHE_MAX_BYTES},
+    },
+}
+
+# Whether the duration, database queries and result size of every remote procedure call are recorded, and exported
+# at /metrics in the Prometheus text format. Every worker process exports the calls it has served, labelled with its
+# process id, so sum the series up by procedure. The nginx proxy doesn't forward /metrics, scrape the backend
+# directly, with RPC_METRICS_TOKEN as a bearer token when it is set
+
+RPC_METRICS_ENABLED = os.environ.get("RPC_METRICS_ENABLED", "true").lower() == "true"
+
+RPC_METRICS_TOKEN = os.environ.get("RPC_METRICS_TOKEN", "")
+
+# Whether every recorded call is also logged as a JSON line, by the rpc.metrics logger at INFO level
+
+RPC_METRICS_LOG = os.environ.get("RPC_METRICS_LOG", "false").lower() == "true"
+
+# Whether the call stacks of remote procedures are sampled, every RPC_PROFILING_INTERVAL seconds, and saved to
+# RPC_PROFILING_DIRECTORY for a RPC_PROFILING_SAMPLE_RATE fraction of calls and for every call taking at least
+# RPC_PROFILING_SLOW_CALL seconds. Only the RPC_PROFILING_MAX_FILES most recent profiles are kept. Print one as
+# folded stacks, the input of flame graph tools, with `manage.py export_profile`
+
+RPC_PROFILING_ENABLED = os.environ.get("RPC_PROFILING_ENABLED", "false").lower() == "true"
+
+RPC_PROFILING_SAMPLE_RATE = float(os.environ.get("RPC_PROFILING_SAMPLE_RATE", "0.01"))
+
+RPC_PROFILING_SLOW_CALL = float(os.environ.get("RPC_PROFILING_SLOW_CALL", "0.5"))
+
+RPC_PROFILING_INTERVAL = 0.005
+
+RPC_PROFILING_DIRECTORY = os.environ.get("RPC_PROFILING_DIRECTORY", BASE_DIR / "profiles")
+
+RPC_PROFILING_MAX_FILES = int(os.environ.get("RPC_PROFILING_MAX_FILES", "200"))
+
 CORS_ALLOW_ALL_ORIGINS = True
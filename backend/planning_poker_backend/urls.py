@@ -16,7 +16,17 @@ Including another URLconf
 """
 from django.urls import path
 from modernrpc.views import RPCEntryPoint
+from rpc import views
+from rpc.async_rpc import AsyncRPCEntryPoint
+from rpc.metrics import measure_responses
 
 urlpatterns = [
-    path("", RPCEntryPoint.as_view(enable_doc=True, template_name="modernrpc/bootstrap4/doc_index.html"))
+    path("", measure_responses(RPCEntryPoint.as_view(enable_doc=True,
+                                                     template_name="modernrpc/bootstrap4/doc_index.html"))),
+    path("async/", measure_responses(AsyncRPCEntryPoint.as_view())),
+    path("events/<int:session_id>", views.session_events),
+    path("import/<int:session_id>", views.import_stories),
+    path("export/<int:session_id>", views.export_session),
+    path("health", views.health),
+    path("metrics", views.metrics)
 ]
@@ -1,7 +1,26 @@
+from importlib import import_module
+
 from django.apps import AppConfig
+from django.conf import settings
 from django.core.management import call_command
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+
+from .database import configure_sqlite_connection
+from .metrics import install_query_recorder
 
 
 class RpcConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rpc'
+
+    def ready(self):
+        from .cache import invalidate_created_session
+        from .models import Session
+
+        connection_created.connect(configure_sqlite_connection)
+        connection_created.connect(install_query_recorder)
+        post_save.connect(invalidate_created_session, sender=Session)
+
+        for module in settings.ASYNC_RPC_METHODS_MODULES:
+            import_module(module)
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from modernrpc.core import REQUEST_KEY
+from .async_rpc import async_rpc_method
+from .changes import wait_for_change
+from .membership import aget_player_session
+from .metrics import instrumented
+from .models import Player
+from .profiling import profiled
+from .remote_procedures import authenticated_user_only
+from .snapshots import aget_session_details, session_details_related
+from .summaries import session_summaries, session_summary_dto
+from .types import SessionChangeDTO, SessionDetailsDTO, SessionSummaryDTO
+
+
+@async_rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+async def get_session(session_id: int, **kwargs) -> SessionDetailsDTO:
+    """Returns info about the chosen session if users is registered as a player.
+
+    :param session_id: identifier of the session to operate on
+    :return: session details
+    :raise Any: any error that occurs inside
+    """
+    request = kwargs[REQUEST_KEY]
+    session = await aget_player_session(request, session_id, *session_details_related())
+
+    return await aget_session_details(session, request.user)
+
+
+@async_rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+async def get_session_if_changed(session_id: int, known_version: int, **kwargs) -> SessionChangeDTO:
+    """Returns info about the chosen session only if it has changed since `known_version`.
+    When it has not, only the current version is returned and no details are built.
+
+    :param session_id: identifier of the session to operate on
+    :param known_version: version of the session the client already has
+    :return: session's version and, if it has changed, its details
+    :raise Any: any error that occurs inside
+    """
+    request = kwargs[REQUEST_KEY]
+    session = await aget_player_session(request, session_id)
+
+    if session.version == known_version:
+        return {"version": session.version, "changed": False}
+
+    return {"version": session.version, "changed": True,
+            "session": await aget_session_details(session, request.user)}
+
+
+@async_rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+async def get_sessions(before: int | None = None, limit: int | None = None, **kwargs) -> list[SessionSummaryDTO]:
+    """Returns a page of the sessions the current user is registered as a player in, newest first,
+    with a summary of each. To get the next page, pass the id of the last session returned as `before`.
+    A page shorter than `limit` is the last one.
+
+    :param before: id of the last session of the previous page, None for the first page
+    :param limit: maximum number of sessions to return, by default and at most ``SESSIONS_PAGE_SIZE``
+    :return: list of session summaries
+    :raise Any: any error that occurs inside
+    """
+    user: User = kwargs[REQUEST_KEY].user
+
+    return [session_summary_dto(user, row) async for row in session_summaries(user, before, limit)]
+
+
+@async_rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+async def get_selection(session_id: int, **kwargs) -> int | None:
+    """Gets current user's selection from chosen session.
+
+    :param session_id: identifies the session to operate on
+    :return: current user's selection
+    :raise Any: any error that occurs inside
+    """
+    user: User = kwargs[REQUEST_KEY].user
+
+    return await Player.objects.values_list("selection", flat=True).aget(user=user, session=session_id)
+
+
+@async_rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+async def wait_for_session_change(session_id: int, known_version: int, timeout: float, **kwargs) -> SessionChangeDTO:
+    """Waits until the chosen session changes and returns info about it, if users is registered as a player.
+    The request is held open for at most `timeout` seconds, capped by ``LONG_POLL_MAX_TIMEOUT``.
+
+    :param session_id: identifier of the session to operate on
+    :param known_version: version of the session the client already has
+    :param timeout: maximum number of seconds to wait for a change
+    :return: session's version and, if it has changed, its details
+    :raise Any: any error that occurs inside
+    """
+    user: User = kwargs[REQUEST_KEY].user
+    player = await Player.objects.aget(user=user, session=session_id)
+
+    version = await wait_for_change(player.session_id, known_version, min(timeout, settings.LONG_POLL_MAX_TIMEOUT))
+
+    if version is None:
+        return {"version": known_version, "changed": False}
+
+    player = await Player.objects.select_related("session__snapshot").aget(id=player.id)
+
+    return {"version": player.session.version, "changed": True,
+            "session": await aget_session_details(player.session, user)}
@@ -0,0 +1,108 @@
+import inspect
+import json
+import logging
+from typing import Any, Awaitable, Callable
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse
+from django.utils.decorators import method_decorator
+from django.utils.module_loading import import_string
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from modernrpc.conf import settings as modernrpc_settings
+from modernrpc.core import Protocol, REQUEST_KEY, RPCRequestContext, registry
+from modernrpc.exceptions import RPCException, RPCInvalidParams, RPCInvalidRequest, RPCMethodNotFound, RPCParseError, \
+    RPC_INTERNAL_ERROR
+
+logger = logging.getLogger(__name__)
+
+_registry: dict[str, Callable[..., Awaitable[Any]]] = {}
+
+
+def async_rpc_method(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Registers a coroutine function as a procedure served by :class:`AsyncRPCEntryPoint`.
+    Just like with modernrpc, the current request is passed in the keyword arguments.
+    """
+    _registry[func.__name__] = func
+    return func
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncRPCEntryPoint(View):
+    """JSON-RPC 2.0 entry point for asynchronous procedures.
+
+    Calls are awaited on the event loop, so procedures that wait for something, or read the database with the async
+    ORM, don't hold a worker thread. Procedures with no asynchronous version are run in a thread, so that batches
+    can mix both kinds. The calls of a batch are made one after another, with the same request.
+    Notifications, calls without an id, are made too, but aren't answered, as the synchronous entry point does.
+    """
+
+    http_method_names = ["post"]
+
+    async def post(self, request: HttpRequest) -> HttpResponse:
+        try:
+            payload = json.loads(request.body)
+        except ValueError as exc:
+            response = self.error_response(None, RPCParseError(f"Error while parsing JSON-RPC request: {exc}"))
+        else:
+            if isinstance(payload, list) and payload:
+                response = [answer for item in payload if (answer := await self.call(request, item)) is not None]
+            else:
+                response = await self.call(request, payload)
+
+        if response is None or response == []:
+            return HttpResponse("", content_type="application/json")
+
+        encoder = import_string(modernrpc_settings.MODERNRPC_JSON_ENCODER)
+        return HttpResponse(json.dumps(response, cls=encoder), content_type="application/json")
+
+    async def call(self, request: HttpRequest, payload: Any) -> dict | None:
+        """Executes a single JSON-RPC call and returns its response object, or None if it is a notification."""
+        request_id = payload.get("id") if isinstance(payload, dict) else None
+        is_notification = isinstance(payload, dict) and "id" not in payload
+
+        try:
+            if not isinstance(payload, dict) or payload.get("jsonrpc") != "2.0" or "method" not in payload:
+                raise RPCInvalidRequest("Expected a JSON-RPC 2.0 request object")
+
+            params = payload.get("params", [])
+            args = params if isinstance(params, list) else []
+            kwargs = params if isinstance(params, dict) else {}
+            procedure = _registry.get(payload["method"])
+
+            if procedure is None:
+                method = registry.get_method(payload["method"], modernrpc_settings.MODERNRPC_DEFAULT_ENTRYPOINT_NAME,
+                                             Protocol.JSON_RPC)
+
+                if method is None:
+                    raise RPCMethodNotFound(payload["method"])
+
+                context = RPCRequestContext(request, None, Protocol.JSON_RPC,
+                                            modernrpc_settings.MODERNRPC_DEFAULT_ENTRYPOINT_NAME)
+                result = await sync_to_async(method.execute)(context, args, kwargs)
+            else:
+                kwargs = {**kwargs, REQUEST_KEY: request}
+
+                # Only arguments not matching the signature are the client's fault, a TypeError raised inside
+                # the procedure is an internal error.
+                try:
+                    inspect.signature(procedure).bind(*args, **kwargs)
+                except TypeError as exc:
+                    raise RPCInvalidParams(str(exc))
+
+                result = await procedure(*args, **kwargs)
+
+            return None if is_notification else {"id": request_id, "jsonrpc": "2.0", "result": result}
+        except Exception as exc:
+            response = self.error_response(request_id, exc)
+            return None if is_notification else response
+
+    @staticmethod
+    def error_response(request_id: Any, exc: Exception) -> dict:
+        if isinstance(exc, RPCException):
+            logger.warning(exc, exc_info=modernrpc_settings.MODERNRPC_LOG_EXCEPTIONS)
+            return {"id": request_id, "jsonrpc": "2.0", "error": {"code": exc.code, "message": exc.message}}
+
+        logger.error(exc, exc_info=modernrpc_settings.MODERNRPC_LOG_EXCEPTIONS)
+        return {"id": request_id, "jsonrpc": "2.0", "error": {"code": RPC_INTERNAL_ERROR, "message": str(exc)}}
@@ -0,0 +1,151 @@
+import json
+import pickle
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+from .metrics import record_cache_access
+from .models import Session
+
+# Bytes taken by the entries of every bounded local memory cache, by cache name, and in total
+_entry_sizes: dict[str, dict[str, int]] = {}
+_total_sizes: dict[str, int] = {}
+
+
+class BoundedLocMemCache(LocMemCache):
+    """Local memory cache which, besides holding at most ``MAX_ENTRIES`` entries, evicts the least recently used
+    ones once the pickled values take more than ``MAX_BYTES`` bytes. Both are given in ``OPTIONS``.
+    """
+
+    def __init__(self, name: str, params: dict):
+        super().__init__(name, params)
+        self._name = name
+        self._max_bytes = int(params.get("OPTIONS", {}).get("MAX_BYTES", 0)) or None
+        self._sizes = _entry_sizes.setdefault(name, {})
+        _total_sizes.setdefault(name, 0)
+
+    @property
+    def total_size(self) -> int:
+        """Bytes taken by the pickled values currently stored."""
+        return _total_sizes[self._name]
+
+    def _set(self, key: str, value: bytes, timeout=DEFAULT_TIMEOUT):
+        _total_sizes[self._name] -= self._sizes.pop(key, 0)
+        super()._set(key, value, timeout)
+        self._sizes[key] = len(value)
+        _total_sizes[self._name] += len(value)
+
+        if self._max_bytes is not None:
+            # The most recently used entries are at the front.
+            while _total_sizes[self._name] > self._max_bytes and self._cache:
+                self._delete(next(reversed(self._cache)))
+
+    def incr(self, key: str, delta: int = 1, version=None) -> int:
+        value = super().incr(key, delta, version)
+        key = self.make_and_validate_key(key, version=version)
+
+        with self._lock:
+            if key in self._sizes:
+                _total_sizes[self._name] -= self._sizes[key]
+                self._sizes[key] = len(pickle.dumps(value, self.pickle_protocol))
+                _total_sizes[self._name] += self._sizes[key]
+
+        return value
+
+    def _cull(self):
+        if self._cull_frequency == 0:
+            count = len(self._cache)
+        else:
+            count = len(self._cache) // self._cull_frequency
+
+        for _ in range(count):
+            self._delete(next(reversed(self._cache)))
+
+    def _delete(self, key: str) -> bool:
+        _total_sizes[self._name] -= self._sizes.pop(key, 0)
+        return super()._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._sizes.clear()
+            _total_sizes[self._name] = 0
+
+
+def get_session_cache() -> BaseCache | None:
+    """Returns the cache configured with ``SESSION_DETAILS_CACHE``, or None if session details aren't cached."""
+    alias = settings.SESSION_DETAILS_CACHE
+    return None if alias is None else caches[alias]
+
+
+def _session_key(session_id: int, revealed: bool) -> str:
+    return f"session-details:{session_id}:{'revealed' if revealed else 'hidden'}"
+
+
+def _key(session: Session) -> str:
+    return _session_key(session.id, session.ready_players_number == session.players_number)
+
+
+def _cached_contents(session: Session, entry: tuple[int, str] | None) -> dict | None:
+    # Entries stored for another version of the session, e.g. by a process which read the session
+    # just before it was modified, are never served.
+    hit = entry is not None and entry[0] == session.version
+    record_cache_access(hit)
+    return json.loads(entry[1]) if hit else None
+
+
+def get_cached_contents(session: Session) -> dict | None:
+    """Returns the contents of the session details cached for the current version of a session, if there are any.
+    Every lookup is counted as a cache hit or miss.
+
+    :param session: session to describe, with its current version
+    :return: contents as returned by :func:`~rpc.snapshots.build_session_contents`, or None
+    """
+    cache = get_session_cache()
+    return None if cache is None else _cached_contents(session, cache.get(_key(session)))
+
+
+async def aget_cached_contents(session: Session) -> dict | None:
+    """Asynchronous version of :func:`get_cached_contents`."""
+    cache = get_session_cache()
+    return None if cache is None else _cached_contents(session, await cache.aget(_key(session)))
+
+
+def cache_contents(session: Session, contents: dict):
+    """Stores the contents of the session details, serialized as JSON, for the current version of a session.
+
+    :param session: described session, with its current version
+    :param contents: contents as returned by :func:`~rpc.snapshots.build_session_contents`
+    """
+    cache = get_session_cache()
+
+    if cache is not None:
+        cache.set(_key(session), (session.version, json.dumps(contents)))
+
+
+async def acache_contents(session: Session, contents: dict):
+    """Asynchronous version of :func:`cache_contents`."""
+    cache = get_session_cache()
+
+    if cache is not None:
+        await cache.aset(_key(session), (session.version, json.dumps(contents)))
+
+
+def invalidate_session(session_id: int):
+    """Removes the cached details of a session, whatever the state of its round.
+
+    :param session_id: identifies the modified session
+    """
+    cache = get_session_cache()
+
+    if cache is not None:
+        cache.delete_many([_session_key(session_id, False), _session_key(session_id, True)])
+
+
+def invalidate_created_session(sender, instance: Session, created: bool, **kwargs):
+    """Removes cached details left behind by a deleted session whose id is reused. Receiver of ``post_save``."""
+    if created:
+        invalidate_session(instance.id)
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache import invalidate_session
+from .event_bus import EventBus
+from .membership import forget_session_memberships
+from .models import Session
+from .snapshots import CONTENTS_PARTS, refresh_snapshot
+from .types import SessionEventDTO
+
+_subscriptions: dict[int, set["SessionSubscription"]] = {}
+_subscriptions_lock = threading.Lock()
+
+_event_bus: EventBus | None = None
+_event_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> EventBus:
+    """Returns the event bus configured with ``SESSION_EVENT_BUS``, creating it on first use.
+    """
+    global _event_bus
+
+    with _event_bus_lock:
+        if _event_bus is None:
+            config = settings.SESSION_EVENT_BUS
+            options = {"location": config["LOCATION"]} if "LOCATION" in config else {}
+            _event_bus = import_string(config["BACKEND"])(deliver, **options, **config.get("OPTIONS", {}))
+
+        return _event_bus
+
+
+def close_event_bus():
+    """Closes the event bus, if it has been created, e.g. when the worker process shuts down.
+    """
+    global _event_bus
+
+    with _event_bus_lock:
+        if _event_bus is not None:
+            _event_bus.close()
+            _event_bus = None
+
+
+def event(event_type: str, **data: Any) -> tuple[str, dict[str, Any]]:
+    """Describes a single change of a session, to be passed to :func:`session_changed`.
+
+    :param event_type: kind of the change, e.g. ``player_joined`` or ``story_deleted``
+    :param data: details of the change
+    :return: event description
+    """
+    return event_type, data
+
+
+# Parts of the session contents, see ``rpc.snapshots.CONTENTS_PARTS``, every kind of event may change.
+# Modifications described by any other event rebuild all of them.
+_CHANGED_PARTS = {
+    "player_joined": {"players"},
+    "player_left": {"players"},
+    "vote_cast": {"players"},
+    "vote_reset": {"players"},
+    "votes_revealed": {"players"},
+    "current_story_changed": set(),
+    "story_created": {"stories"},
+    "story_updated": {"stories"},
+    "story_deleted": {"stories"},
+    "stories_imported": {"stories"},
+    "task_created": {"stories"},
+    "task_updated": {"stories"},
+    "task_deleted": {"stories"},
+}
+
+
+def _changed_parts(events: tuple[tuple[str, dict[str, Any]], ...]) -> set[str]:
+    if not events or any(event_type not in _CHANGED_PARTS for event_type, _ in events):
+        return set(CONTENTS_PARTS)
+
+    return set().union(*(_CHANGED_PARTS[event_type] for event_type, _ in events))
+
+
+def _known_contents(events: tuple[tuple[str, dict[str, Any]], ...]) -> dict:
+    # Revealing the selections describes the players and the results, the snapshot doesn't read them again.
+    return {part: data[part] for event_type, data in events if event_type == "votes_revealed"
+            for part in ("players", "results")}
+
+
+def session_changed(session_id: int, *events: tuple[str, dict[str, Any]], session: Session | None = None):
+    """Marks a session as modified by bumping its version and its last activity time, and publishes the events
+    describing the modification.
+
+    Has to be called after the modification has been written, in the same transaction, so that a client which
+    has seen the new version can never have been served the old state, and a failure here rolls the modification
+    back rather than leaving it behind a stale version. The session's snapshot is refreshed in that transaction
+    and its cached details are removed. Only the parts of the snapshot the events may have changed are read again.
+    Events are delivered once the surrounding transaction commits.
+    When no events are given, a generic ``session_changed`` event is published instead.
+
+    :param session_id: identifies the modified session
+    :param events: events created with :func:`event`
+    :param session: the session as already read by the caller in the transaction, after locking its row, e.g. by
+        updating it, which is then updated in place rather than read again
+    """
+    with transaction.atomic():
+        last_activity = timezone.now()
+        Session.objects.filter(id=session_id).update(version=F("version") + 1, last_activity=last_activity)
+
+        if session is None:
+            session = Session.objects.filter(id=session_id).first()
+        else:
+            session.version += 1
+            session.last_activity = last_activity
+
+        if session is not None:
+            refresh_snapshot(session, _known_contents(events), _changed_parts(events))
+
+        invalidate_session(session_id)
+
+    version = None if session is None else session.version
+
+    event_dtos: list[SessionEventDTO] = [{"type": event_type, "version": version, "data": data}
+                                         for event_type, data in events or [event("session_changed")]]
+    transaction.on_commit(lambda: get_event_bus().publish(session_id, event_dtos))
+
+
+def deliver(session_id: int, event_dtos: list[SessionEventDTO]):
+    """Hands events over to the subscriptions of the session in this process. Called by the event bus.
+    """
+    if any(event_dto["type"] in ("player_left", "session_deleted") for event_dto in event_dtos):
+        forget_session_memberships(session_id)
+
+    with _subscriptions_lock:
+        subscriptions = list(_subscriptions.get(session_id, ()))
+
+    for subscription in subscriptions:
+        subscription.deliver(event_dtos)
+
+
+class SessionSubscription:
+    """Receives the events of a single session on the event loop it was created in.
+
+    Session changes happen in worker threads, so events are handed over to the loop thread-safely.
+    Use it as a context manager to make sure it is unsubscribed.
+    """
+
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[SessionEventDTO] = asyncio.Queue()
+
+    def __enter__(self) -> "SessionSubscription":
+        with _subscriptions_lock:
+            _subscriptions.setdefault(self.session_id, set()).add(self)
+
+        return self
+
+    def __exit__(self, *exc_info):
+        with _subscriptions_lock:
+            subscriptions = _subscriptions.get(self.session_id)
+
+            if subscriptions is not None:
+                subscriptions.discard(self)
+
+                if not subscriptions:
+                    del _subscriptions[self.session_id]
+
+    def deliver(self, event_dtos: list[SessionEventDTO]):
+        for event_dto in event_dtos:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, event_dto)
+
+    async def get(self, timeout: float | None = None) -> SessionEventDTO | None:
+        """Returns the next event, or None if there was none within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+async def wait_for_change(session_id: int, known_version: int, timeout: float) -> int | None:
+    """Waits until the version of a session differs from `known_version`.
+
+    Changes published on the event bus wake the waiter up immediately. As a safety net for events lost
+    by the bus, the version is also re-read every ``SESSION_CHANGE_POLL_INTERVAL`` seconds.
+
+    :param session_id: identifies the session to watch
+    :param known_version: version of the session the caller already has
+    :param timeout: maximum number of seconds to wait
+    :return: the new version, or None if the session didn't change before the timeout
+    :raise Session.DoesNotExist: if the session doesn't exist or was deleted
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    # The subscription is made before reading the version, so a change committed in between isn't missed.
+    with SessionSubscription(session_id) as subscription:
+        while True:
+            version = await Session.objects.values_list("version", flat=True).aget(id=session_id)
+
+            if version != known_version:
+                return version
+
+            remaining = deadline - loop.time()
+
+            if remaining <= 0:
+                return None
+
+            await subscription.get(min(remaining, settings.SESSION_CHANGE_POLL_INTERVAL))
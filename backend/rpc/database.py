@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+
+def configure_sqlite_connection(sender, connection: BaseDatabaseWrapper, **kwargs):
+    """Applies ``SQLITE_PRAGMAS`` to a newly opened SQLite connection. Receiver of ``connection_created``.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,68 @@
+from typing import Any, Iterable
+
+from .types import SessionChangesDTO
+
+# Parts of the session contents a delta is made of, with the key identifying their elements
+_PARTS = {"players": "username", "stories": "id", "tasks": "id"}
+
+
+def _elements(contents: dict[str, Any]) -> dict[str, dict[Any, dict[str, Any]]]:
+    """Indexes players, stories without their tasks, and tasks with the id of their story by their keys."""
+    stories = {story["id"]: {key: value for key, value in story.items() if key != "tasks"}
+               for story in contents["stories"]}
+    tasks = {task["id"]: {**task, "story_id": story["id"]} for story in contents["stories"] for task in story["tasks"]}
+
+    return {"players": {player["username"]: player for player in contents["players"]}, "stories": stories,
+            "tasks": tasks}
+
+
+def make_delta(old: dict[str, Any], new: dict[str, Any]) -> SessionChangesDTO:
+    """Lists the players, stories and tasks added, changed or removed between two versions of the session contents.
+
+    :param old: contents as returned by :func:`~rpc.snapshots.build_session_contents`
+    :param new: later contents of the same session
+    :return: changed elements, in the order they appear in `new`, keys of the removed ones, and the new results
+        of the selections if they changed
+    """
+    old_elements, new_elements = _elements(old), _elements(new)
+    delta = {}
+
+    for part, key in _PARTS.items():
+        before, after = old_elements[part], new_elements[part]
+        delta[part] = {
+            "changed": [element for element_key, element in after.items() if before.get(element_key) != element],
+            "removed": [element_key for element_key in before if element_key not in after]
+        }
+
+    if old.get("results") != new.get("results"):
+        delta["results"] = new.get("results")
+
+    return delta
+
+
+def merge_deltas(deltas: Iterable[SessionChangesDTO]) -> SessionChangesDTO:
+    """Compacts consecutive deltas into one, keeping only the last state of every element.
+
+    :param deltas: deltas in the order of the versions they lead to
+    :return: delta leading from the version before the first one to the version of the last one
+    """
+    merged: dict[str, dict[Any, dict[str, Any] | None]] = {part: {} for part in _PARTS}
+    results = {}
+
+    for delta in deltas:
+        if "results" in delta:
+            results["results"] = delta["results"]
+
+        for part, key in _PARTS.items():
+            for element_key in delta[part]["removed"]:
+                merged[part].pop(element_key, None)
+                merged[part][element_key] = None
+
+            for element in delta[part]["changed"]:
+                merged[part].pop(element[key], None)
+                merged[part][element[key]] = element
+
+    return {**{part: {
+        "changed": [element for element in elements.values() if element is not None],
+        "removed": [element_key for element_key, element in elements.items() if element is None]
+    } for part, elements in merged.items()}, **results}
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class EventBroker:
+    """Small publish/subscribe server speaking the subset of the Redis protocol used by
+    :class:`rpc.event_bus.RedisEventBus`: ``SUBSCRIBE``, ``UNSUBSCRIBE``, ``PUBLISH`` and ``PING``.
+
+    It lets several workers share session events without running Redis, e.g. next to the workers in a single
+    container or in tests, where it listens on a Unix socket and needs no network access.
+
+    Like Redis does with its pub/sub output buffer limit, subscribers which don't read their messages are
+    disconnected once more than `max_buffer_size` bytes wait to be sent to them, so that a stalled subscriber
+    doesn't make the broker's memory grow without bound. They resubscribe when they reconnect.
+
+    :param location: ``redis://host:port`` or ``unix:///path/to/socket`` to listen on
+    :param max_buffer_size: bytes which may wait to be sent to a subscriber before it is disconnected
+    """
+
+    def __init__(self, location: str, max_buffer_size: int = 8 * 1024 * 1024):
+        self.location = location
+        self.max_buffer_size = max_buffer_size
+        self._channels: dict[bytes, set[asyncio.StreamWriter]] = {}
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self):
+        url = urlparse(self.location)
+
+        if url.scheme == "unix":
+            self._server = await asyncio.start_unix_server(self._serve, url.path)
+        else:
+            self._server = await asyncio.start_server(self._serve, url.hostname or "localhost", url.port or 6379)
+
+    async def serve_forever(self):
+        await self.start()
+        await self._server.serve_forever()
+
+    async def stop(self):
+        self._server.close()
+
+        for writers in self._channels.values():
+            for writer in writers:
+                writer.close()
+
+        await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions: set[bytes] = set()
+
+        try:
+            while True:
+                command = await _read_command(reader)
+
+                if command is None:
+                    break
+
+                if not command:
+                    continue
+
+                name = command[0].upper()
+
+                if name == b"PUBLISH" and len(command) == 3:
+                    writer.write(b":%d\r\n" % self._publish(command[1], command[2]))
+                elif name == b"SUBSCRIBE" and len(command) > 1:
+                    for channel in command[1:]:
+                        subscriptions.add(channel)
+                        self._channels.setdefault(channel, set()).add(writer)
+                        writer.write(_encode_array([b"subscribe", channel, len(subscriptions)]))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in command[1:] or list(subscriptions):
+                        subscriptions.discard(channel)
+                        self._unsubscribe(channel, writer)
+                        writer.write(_encode_array([b"unsubscribe", channel, len(subscriptions)]))
+                elif name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                else:
+                    writer.write(b"-ERR unknown command or wrong number of arguments\r\n")
+
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as exc:
+            logger.debug("Client disconnected: %s", exc)
+        finally:
+            for channel in subscriptions:
+                self._unsubscribe(channel, writer)
+
+            writer.close()
+
+    def _publish(self, channel: bytes, message: bytes) -> int:
+        writers = self._channels.get(channel, set())
+        data = _encode_array([b"message", channel, message])
+        stalled = []
+
+        for writer in writers:
+            # Writes are buffered by the transport, a slow subscriber doesn't hold up the publisher.
+            if writer.transport.get_write_buffer_size() + len(data) > self.max_buffer_size:
+                stalled.append(writer)
+            else:
+                writer.write(data)
+
+        delivered = len(writers) - len(stalled)
+
+        for writer in stalled:
+            logger.warning("Disconnecting a subscriber which doesn't read its messages")
+            self._disconnect(writer)
+
+        return delivered
+
+    def _disconnect(self, writer: asyncio.StreamWriter):
+        for channel in [channel for channel, writers in self._channels.items() if writer in writers]:
+            self._unsubscribe(channel, writer)
+
+        # Closing would wait for the buffered messages to be sent, aborting discards them.
+        writer.transport.abort()
+
+    def _unsubscribe(self, channel: bytes, writer: asyncio.StreamWriter):
+        writers = self._channels.get(channel)
+
+        if writers is not None:
+            writers.discard(writer)
+
+            if not writers:
+                del self._channels[channel]
+
+
+class EventBrokerThread(threading.Thread):
+    """Runs an :class:`EventBroker` on its own event loop in a background thread, for tests and benchmarks."""
+
+    def __init__(self, location: str, **options):
+        super().__init__(name="event-broker", daemon=True)
+        self.broker = EventBroker(location, **options)
+        self._loop = asyncio.new_event_loop()
+
+    def start(self):
+        """Starts the thread and returns once the broker accepts connections."""
+        super().start()
+        asyncio.run_coroutine_threadsafe(self.broker.start(), self._loop).result()
+
+    def run(self):
+        self._loop.run_forever()
+        self._loop.close()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.broker.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self.join()
+
+
+async def _read_command(reader: asyncio.StreamReader) -> list[bytes] | None:
+    line = await reader.readline()
+
+    if not line:
+        return None
+
+    if not line.startswith(b"*"):
+        # Inline command, as sent by e.g. telnet.
+        return line.split()
+
+    arguments = []
+
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        arguments.append((await reader.readexactly(length + 2))[:-2])
+
+    return arguments
+
+
+def _encode_array(items: list[bytes | int]) -> bytes:
+    parts = [b"*%d\r\n" % len(items)]
+
+    for item in items:
+        if isinstance(item, int):
+            parts.append(b":%d\r\n" % item)
+        else:
+            parts.append(b"$%d\r\n%s\r\n" % (len(item), item))
+
+    return b"".join(parts)
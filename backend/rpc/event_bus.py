@@ -0,0 +1,126 @@
+import abc
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+Receiver = Callable[[int, list[Any]], None]
+
+
+class EventBus(abc.ABC):
+    """Delivers the events of a session to every process serving the session's subscribers.
+
+    Backends call `receiver` with the session id and the list of events for every publication,
+    including the ones made by their own process.
+    """
+
+    def __init__(self, receiver: Receiver, **options):
+        self.receiver = receiver
+
+    @abc.abstractmethod
+    def publish(self, session_id: int, events: list[Any]):
+        """Delivers events of a session to every process, this one included."""
+
+    def close(self):
+        pass
+
+
+class InMemoryEventBus(EventBus):
+    """Delivers events within the current process only. Meant for a single worker and for tests."""
+
+    def publish(self, session_id: int, events: list[Any]):
+        self.receiver(session_id, events)
+
+
+class RedisEventBus(EventBus):
+    """Fans events out across processes through Redis pub/sub, using redis-py.
+
+    Works with Redis itself as well as with :class:`rpc.event_broker.EventBroker`. Events are delivered to the
+    publishing process directly, other processes receive them through a subscription on a single channel.
+    When the server is unavailable, events still reach the subscribers of the publishing process and other
+    processes only notice changes by re-reading session versions.
+
+    Events are published in the requests modifying sessions, so publishing is bounded by `publish_timeout`.
+    When it fails, events aren't published to other processes for `reconnect_delay` seconds, so that a stalled
+    server doesn't hold up every modification for the whole timeout.
+
+    :param location: ``redis://host:port`` or ``unix:///path/to/socket``
+    :param channel: name of the channel shared by all processes
+    :param reconnect_delay: seconds to wait before reconnecting after a failure
+    :param publish_timeout: seconds connecting, sending a publication and reading its reply may take each
+    :param poll_interval: seconds the subscription waits for a message before checking whether the bus is closed
+    """
+
+    def __init__(self, receiver: Receiver, location: str, channel: str = "planning-poker:sessions",
+                 reconnect_delay: float = 1.0, publish_timeout: float = 0.5, poll_interval: float = 0.5, **options):
+        super().__init__(receiver, **options)
+        self.location = location
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.poll_interval = poll_interval
+        self._publish_resumes = 0.0
+        self._origin = uuid.uuid4().hex
+        self._publisher = redis.Redis.from_url(location, socket_timeout=publish_timeout,
+                                               socket_connect_timeout=publish_timeout)
+        self._closed = threading.Event()
+        self.subscribed = threading.Event()
+        self._listener = threading.Thread(target=self._listen, name="event-bus-listener", daemon=True)
+        self._listener.start()
+
+    def publish(self, session_id: int, events: list[Any]):
+        self.receiver(session_id, events)
+
+        if time.monotonic() < self._publish_resumes:
+            return
+
+        try:
+            self._publisher.publish(self.channel, json.dumps({"origin": self._origin, "session_id": session_id,
+                                                              "events": events}))
+        except redis.RedisError as exc:
+            self._publish_resumes = time.monotonic() + self.reconnect_delay
+            logger.warning("Could not publish session events, dropping them: %s", exc)
+
+    def close(self):
+        self._closed.set()
+        self._publisher.close()
+        self._listener.join()
+
+    def _listen(self):
+        while not self._closed.is_set():
+            # Messages are polled for, so that closing is noticed within a poll interval. Connecting and the replies
+            # to commands are bounded by the socket timeout.
+            subscriber = redis.Redis.from_url(self.location, socket_timeout=self.poll_interval,
+                                              socket_connect_timeout=self.poll_interval).pubsub()
+
+            try:
+                subscriber.subscribe(self.channel)
+
+                while not self._closed.is_set():
+                    message = subscriber.get_message(timeout=self.poll_interval)
+
+                    if message is None:
+                        continue
+                    elif message["type"] == "subscribe":
+                        self.subscribed.set()
+                    elif message["type"] == "message":
+                        self._receive(message["data"])
+            except redis.RedisError as exc:
+                self.subscribed.clear()
+
+                if not self._closed.is_set():
+                    logger.warning("Session event subscription lost: %s", exc)
+                    self._closed.wait(self.reconnect_delay)
+            finally:
+                subscriber.close()
+
+    def _receive(self, payload: bytes):
+        message = json.loads(payload)
+
+        if message["origin"] != self._origin:
+            self.receiver(message["session_id"], message["events"])
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator
+
+from django.conf import settings
+from django.db.models import QuerySet
+
+from .models import Player, Session, Story, Task
+
+# Columns of the CSV export, every record fills in the ones it has
+CSV_COLUMNS = ("record", "id", "story_id", "username", "summary", "description", "selection", "voted", "estimation",
+               "version", "last_activity")
+
+
+async def _chunks(queryset: QuerySet) -> AsyncIterator[dict[str, Any]]:
+    # Every chunk is read in a query of its own, starting after the last id of the previous one,
+    # so no cursor is kept open while a slow client is downloading.
+    chunk_size, last_id = settings.EXPORT_CHUNK_SIZE, None
+
+    while True:
+        rows = [row async for row in (queryset if last_id is None else queryset.filter(id__gt=last_id))[:chunk_size]]
+
+        for row in rows:
+            yield row
+
+        if len(rows) < chunk_size:
+            return
+
+        last_id = rows[-1]["id"]
+
+
+async def export_records(session_id: int) -> AsyncIterator[dict[str, Any]]:
+    """Yields a session followed by its players, stories and tasks, each as a record of its own.
+
+    Rows are read in chunks of ``EXPORT_CHUNK_SIZE``, so only a chunk of a session is held in memory at a time.
+    Selections are only exported once everyone is ready, as in the session details.
+
+    :param session_id: identifies the session to export
+    :raise Session.DoesNotExist: if there is no such session
+    """
+    session = await Session.objects.aget(id=session_id)
+    revealed = session.ready_players_number == session.players_number
+
+    yield {"record": "session", "id": session.id, "version": session.version,
+           "last_activity": session.last_activity.isoformat()}
+
+    async for player in _chunks(Player.objects.filter(session=session).order_by("id")
+                                .values("id", "user__username", "selection", "voted")):
+        yield {"record": "player", "username": player["user__username"],
+               "selection": player["selection"] if revealed else None, "voted": player["voted"]}
+
+    async for story in _chunks(Story.objects.filter(session=session).order_by("id")
+                               .values("id", "summary", "description")):
+        yield {"record": "story", **story}
+
+    async for task in _chunks(Task.objects.filter(story__session=session).order_by("id")
+                              .values("id", "story_id", "summary", "estimation")):
+        yield {"record": "task", **task}
+
+
+async def _buffered(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    # Sending every record on its own would cost a write per record.
+    buffer, size = [], 0
+
+    async for line in lines:
+        buffer.append(line)
+        size += len(line)
+
+        if size >= settings.EXPORT_BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+async def _ndjson_lines(records: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    async for record in records:
+        yield json.dumps(record) + "\n"
+
+
+async def _csv_lines(records: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    line = io.StringIO()
+    writer = csv.DictWriter(line, CSV_COLUMNS)
+    writer.writeheader()
+
+    async for record in records:
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+        writer.writerow(record)
+
+    yield line.getvalue()
+
+
+def format_ndjson(records: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    """Formats records as newline delimited JSON, in chunks of about ``EXPORT_BUFFER_SIZE`` characters."""
+    return _buffered(_ndjson_lines(records))
+
+
+def format_csv(records: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    """Formats records as CSV with the :data:`CSV_COLUMNS` header, in chunks of about ``EXPORT_BUFFER_SIZE``
+    characters.
+    """
+    return _buffered(_csv_lines(records))
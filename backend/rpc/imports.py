@@ -0,0 +1,150 @@
+import csv
+import json
+import tempfile
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+from django.conf import settings
+from django.db import transaction
+
+from .changes import event, session_changed
+from .models import Story, Task
+from .types import ImportedStoryDTO
+
+# Spooled uploads are kept in memory up to this size, and written to a temporary file past it
+_SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+def _clean_task(task: Any, position: str) -> dict[str, Any]:
+    if not isinstance(task, dict) or not isinstance(task.get("summary"), str):
+        raise ValueError(f"{position}: a task needs a summary")
+
+    estimation = task.get("estimation")
+
+    if estimation is not None and (not isinstance(estimation, int) or isinstance(estimation, bool)
+                                   or not -32768 <= estimation <= 32767):
+        raise ValueError(f"{position}: estimation has to be a small integer or null")
+
+    return {"summary": task["summary"], "estimation": estimation}
+
+
+def clean_story(story: Any, position: str) -> dict[str, Any]:
+    """Validates a story to be imported, with its tasks.
+
+    :param story: object with a ``summary``, an optional ``description`` and an optional list of ``tasks``,
+        each with a ``summary`` and an optional ``estimation``
+    :param position: where the story comes from, used in error messages
+    :return: the story with only the known fields
+    :raise ValueError: if the story is malformed
+    """
+    if not isinstance(story, dict) or not isinstance(story.get("summary"), str):
+        raise ValueError(f"{position}: a story needs a summary")
+
+    description = "" if story.get("description") is None else story["description"]
+    tasks = [] if story.get("tasks") is None else story["tasks"]
+
+    if not isinstance(description, str):
+        raise ValueError(f"{position}: description has to be a string")
+
+    if not isinstance(tasks, list):
+        raise ValueError(f"{position}: tasks have to be a list")
+
+    return {"summary": story["summary"], "description": description,
+            "tasks": [_clean_task(task, f"{position}, task {index + 1}") for index, task in enumerate(tasks)]}
+
+
+def parse_ndjson(lines: Iterable[str]) -> Iterator[dict[str, Any]]:
+    """Reads stories from newline delimited JSON, one story with its tasks per line, see :func:`clean_story`.
+    Blank lines are skipped.
+    """
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                story = json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(f"line {number}: {error.msg}")
+
+            yield clean_story(story, f"line {number}")
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[dict[str, Any]]:
+    """Reads stories from CSV with a ``kind,summary,description,estimation`` header. Rows of the ``story`` kind
+    start a new story, rows of the ``task`` kind add a task to the last story.
+    """
+    reader = csv.DictReader(lines)
+
+    if reader.fieldnames is None or not {"kind", "summary"} <= set(reader.fieldnames):
+        raise ValueError("line 1: the header needs kind and summary columns")
+
+    story = None
+
+    for row in reader:
+        position = f"line {reader.line_num}"
+        kind = (row.get("kind") or "").strip().lower()
+
+        if kind == "story":
+            if story is not None:
+                yield story
+
+            story = clean_story({"summary": row["summary"], "description": row.get("description")}, position)
+        elif kind == "task":
+            if story is None:
+                raise ValueError(f"{position}: a task has to follow a story")
+
+            estimation = (row.get("estimation") or "").strip()
+
+            try:
+                estimation = int(estimation) if estimation else None
+            except ValueError:
+                raise ValueError(f"{position}: estimation has to be a small integer or empty")
+
+            story["tasks"].append(_clean_task({"summary": row["summary"], "estimation": estimation}, position))
+        else:
+            raise ValueError(f"{position}: kind has to be story or task")
+
+    if story is not None:
+        yield story
+
+
+def _spool(stories: Iterable[dict[str, Any]]) -> tempfile.SpooledTemporaryFile:
+    spool = tempfile.SpooledTemporaryFile(_SPOOL_MAX_MEMORY, mode="w+", encoding="utf-8")
+
+    for story in stories:
+        spool.write(json.dumps(story) + "\n")
+
+    spool.seek(0)
+    return spool
+
+
+def bulk_import_stories(session_id: int, stories: Iterable[dict[str, Any]]) -> list[ImportedStoryDTO]:
+    """Adds stories with their tasks to a session, bumping its version once if anything was added.
+
+    The stories are validated and spooled to a temporary file first, so that a large or slowly uploaded
+    backlog is neither held in memory nor keeps the database locked. They are then inserted in batches of
+    ``IMPORT_BATCH_SIZE`` stories with bulk inserts, in a single transaction.
+
+    :param session_id: identifies the session, whose membership has already been checked
+    :param stories: stories as accepted by :func:`clean_story`
+    :return: ids of the created stories and of their tasks, in the order they were given
+    :raise ValueError: if any of the stories is malformed, before anything is written
+    """
+    imported: list[ImportedStoryDTO] = []
+
+    with _spool(stories) as spool, transaction.atomic():
+        lines = (json.loads(line) for line in spool)
+
+        while batch := list(islice(lines, settings.IMPORT_BATCH_SIZE)):
+            created = Story.objects.bulk_create([Story(session_id=session_id, summary=story["summary"],
+                                                       description=story["description"]) for story in batch])
+            tasks = Task.objects.bulk_create([Task(story=story, summary=task["summary"], estimation=task["estimation"])
+                                              for story, values in zip(created, batch) for task in values["tasks"]],
+                                             batch_size=settings.IMPORT_BATCH_SIZE)
+            task_ids = iter(task.id for task in tasks)
+
+            imported.extend({"id": story.id, "tasks": list(islice(task_ids, len(values["tasks"])))}
+                            for story, values in zip(created, batch))
+
+        if imported:
+            session_changed(session_id, event("stories_imported", ids=[story["id"] for story in imported]))
+
+    return imported
@@ -0,0 +1,51 @@
+from typing import Any
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> list[dict[str, Any]]:
+    """Computes a JSON Patch (RFC 6902) turning `old` into `new`.
+
+    Objects are compared key by key and lists element by element, so appending to or changing a single
+    element of a list only produces operations for that element.
+
+    :param old: original JSON document
+    :param new: desired JSON document
+    :param path: JSON Pointer of the compared documents, used when recursing
+    :return: list of patch operations
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        operations = []
+
+        for key in old.keys() - new.keys():
+            operations.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+
+        for key, value in new.items():
+            if key not in old:
+                operations.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            else:
+                operations.extend(make_patch(old[key], value, f"{path}/{_escape(key)}"))
+
+        return operations
+
+    if isinstance(old, list) and isinstance(new, list):
+        operations = []
+
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            operations.extend(make_patch(old_item, new_item, f"{path}/{index}"))
+
+        # Removing from the end keeps the indices of the remaining elements valid.
+        for index in range(len(old) - 1, len(new) - 1, -1):
+            operations.append({"op": "remove", "path": f"{path}/{index}"})
+
+        for item in new[len(old):]:
+            operations.append({"op": "add", "path": f"{path}/-", "value": item})
+
+        return operations
+
+    if type(old) is not type(new) or old != new:
+        return [{"op": "replace", "path": path, "value": new}]
+
+    return []
+
+
+def _escape(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
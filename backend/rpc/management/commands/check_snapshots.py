@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from rpc.models import Session
+from rpc.snapshots import build_session_contents, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Compares the precomputed session snapshots with the sessions' players, stories and tasks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repair", action="store_true", help="refresh missing and inconsistent snapshots")
+
+    def handle(self, *args, **options):
+        checked, inconsistent = 0, []
+
+        for session_id in Session.objects.order_by("id").values_list("id", flat=True).iterator():
+            # Every session is compared in a transaction of its own, so that it cannot change in between.
+            with transaction.atomic():
+                session = Session.objects.select_for_update().select_related("snapshot").filter(id=session_id).first()
+
+                if session is None:
+                    continue
+
+                snapshot = getattr(session, "snapshot", None)
+                checked += 1
+
+                if snapshot is None:
+                    problem = "missing"
+                elif snapshot.version != session.version:
+                    problem = f"version {snapshot.version} instead of {session.version}"
+                elif snapshot.details != build_session_contents(session):
+                    problem = "details differ"
+                else:
+                    continue
+
+                inconsistent.append(session_id)
+                self.stdout.write(f"Session {session_id}: {problem}")
+
+                if options["repair"]:
+                    refresh_snapshot(session)
+
+        self.stdout.write(f"Checked {checked} sessions, {len(inconsistent)} inconsistent"
+                          + (", repaired" if options["repair"] and inconsistent else ""))
+
+        if inconsistent and not options["repair"]:
+            raise CommandError(f"{len(inconsistent)} snapshots are missing or inconsistent")
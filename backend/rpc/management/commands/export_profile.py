@@ -0,0 +1,36 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Prints a saved remote procedure call profile as folded stacks, the input of flamegraph.pl, speedscope " \
+           "and similar flame graph tools."
+
+    def add_arguments(self, parser):
+        parser.add_argument("profile", nargs="?",
+                            help="path of the profile, defaults to the latest one in RPC_PROFILING_DIRECTORY")
+
+    def handle(self, *args, **options):
+        if options["profile"]:
+            path = Path(options["profile"])
+        else:
+            profiles = sorted(Path(settings.RPC_PROFILING_DIRECTORY).glob("*.json"))
+
+            if not profiles:
+                raise CommandError(f"No profiles in {settings.RPC_PROFILING_DIRECTORY}")
+
+            path = profiles[-1]
+
+        try:
+            profile = json.loads(path.read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        self.stderr.write(f"{profile['procedure']}({', '.join(profile['params'])}) by user {profile['user_id']}, "
+                          f"{profile['duration'] * 1e3:.1f} ms, {profile['reason']}")
+
+        for stack, count in sorted(profile["stacks"].items()):
+            self.stdout.write(f"{stack} {count}")
@@ -0,0 +1,22 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rpc.event_broker import EventBroker
+
+
+class Command(BaseCommand):
+    help = "Runs a publish/subscribe broker the workers can use as their session event bus instead of Redis."
+
+    def add_arguments(self, parser):
+        parser.add_argument("location", nargs="?", default=settings.SESSION_EVENT_BUS.get("LOCATION"),
+                            help="redis://host:port or unix:///path/to/socket to listen on, "
+                                 "defaults to SESSION_EVENT_BUS_LOCATION")
+
+    def handle(self, *args, **options):
+        if not options["location"]:
+            raise CommandError("No location given and SESSION_EVENT_BUS_LOCATION is not set")
+
+        self.stdout.write(f"Event broker listening on {options['location']}")
+        asyncio.run(EventBroker(options["location"]).serve_forever())
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpRequest
+
+from .models import Player, Session, Story, Task
+
+# Name of the request attribute holding the (user id, session id) pairs already confirmed for the request.
+# Every call of a JSON-RPC batch receives the same request, so a membership is looked up once per batch.
+_MEMBERSHIPS_ATTRIBUTE = "_session_memberships"
+
+# Memberships confirmed by any request of this process, with the time they expire at, oldest first.
+# Only used when ``SESSION_MEMBERSHIP_CACHE_TTL`` is set.
+_process_memberships: OrderedDict[tuple[int, int], float] = OrderedDict()
+_process_memberships_lock = threading.Lock()
+
+
+def _memberships(request: HttpRequest) -> set[tuple[int, int]]:
+    if not hasattr(request, _MEMBERSHIPS_ATTRIBUTE):
+        setattr(request, _MEMBERSHIPS_ATTRIBUTE, set())
+
+    return getattr(request, _MEMBERSHIPS_ATTRIBUTE)
+
+
+def _is_known(request: HttpRequest, session_id: int) -> bool:
+    key = (request.user.id, session_id)
+
+    if key in _memberships(request):
+        return True
+
+    if not settings.SESSION_MEMBERSHIP_CACHE_TTL:
+        return False
+
+    with _process_memberships_lock:
+        expires = _process_memberships.get(key)
+
+    if expires is None or expires <= time.monotonic():
+        return False
+
+    _memberships(request).add(key)
+    return True
+
+
+def check_membership(request: HttpRequest, session_id: int):
+    """Makes sure the current user is registered as a player in a session.
+
+    :param request: request made by the user
+    :param session_id: identifies the session
+    :raise Player.DoesNotExist: if the user is not a player of the session
+    """
+    if not _is_known(request, session_id):
+        if not Player.objects.filter(user=request.user, session=session_id).exists():
+            raise Player.DoesNotExist("Player matching query does not exist.")
+
+        remember_membership(request, session_id)
+
+
+def get_player_session(request: HttpRequest, session_id: int, *related: str) -> Session:
+    """Returns a session if the current user is registered as a player in it.
+    Membership and session are read in a single query unless the membership is already known.
+
+    :param request: request made by the user
+    :param session_id: identifies the session
+    :param related: relations of the session to read in the same query, e.g. ``"snapshot"``
+    :return: the session
+    :raise Player.DoesNotExist: if the user is not a player of the session
+    """
+    if _is_known(request, session_id):
+        return Session.objects.select_related(*related).get(id=session_id)
+
+    session = Player.objects.select_related("session", *(f"session__{name}" for name in related)) \
+        .get(user=request.user, session=session_id).session
+    remember_membership(request, session_id)
+
+    return session
+
+
+async def aget_player_session(request: HttpRequest, session_id: int, *related: str) -> Session:
+    """Asynchronous version of :func:`get_player_session`."""
+    if _is_known(request, session_id):
+        return await Session.objects.select_related(*related).aget(id=session_id)
+
+    player = await Player.objects.select_related("session", *(f"session__{name}" for name in related)) \
+        .aget(user=request.user, session=session_id)
+    remember_membership(request, session_id)
+
+    return player.session
+
+
+def get_player_story(request: HttpRequest, story_id: int) -> Story:
+    """Returns a story if the current user is registered as a player in its session,
+    checking both in a single query.
+
+    :param request: request made by the user
+    :param story_id: identifies the story
+    :return: the story
+    :raise Story.DoesNotExist: if there is no such story in any of the user's sessions
+    """
+    story = Story.objects.filter(session__player__user=request.user).get(id=story_id)
+    remember_membership(request, story.session_id)
+
+    return story
+
+
+def get_player_task(request: HttpRequest, task_id: int) -> Task:
+    """Returns a task together with its story if the current user is registered as a player in its session,
+    checking both in a single query.
+
+    :param request: request made by the user
+    :param task_id: identifies the task
+    :return: the task, with its story loaded
+    :raise Task.DoesNotExist: if there is no such task in any of the user's sessions
+    """
+    task = Task.objects.select_related("story").filter(story__session__player__user=request.user).get(id=task_id)
+    remember_membership(request, task.story.session_id)
+
+    return task
+
+
+def remember_membership(request: HttpRequest, session_id: int):
+    """Records that the current user is a player of a session."""
+    key = (request.user.id, session_id)
+    _memberships(request).add(key)
+    ttl = settings.SESSION_MEMBERSHIP_CACHE_TTL
+
+    if ttl:
+        now = time.monotonic()
+
+        with _process_memberships_lock:
+            _process_memberships[key] = now + ttl
+            _process_memberships.move_to_end(key)
+
+            # Every entry lives equally long, so the expired ones are at the front.
+            while next(iter(_process_memberships.values())) <= now:
+                _process_memberships.popitem(last=False)
+
+
+def forget_membership(request: HttpRequest, session_id: int):
+    """Records that the current user is no longer a player of a session."""
+    key = (request.user.id, session_id)
+    _memberships(request).discard(key)
+
+    with _process_memberships_lock:
+        _process_memberships.pop(key, None)
+
+
+def forget_session_memberships(session_id: int):
+    """Drops the memberships of a session remembered by this process, e.g. after another process
+    reported that a player has left it.
+    """
+    with _process_memberships_lock:
+        for key in [key for key in _process_memberships if key[1] == session_id]:
+            del _process_memberships[key]
@@ -0,0 +1,296 @@
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable, TypeVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.http import HttpRequest, HttpResponse
+
+from modernrpc.core import REQUEST_KEY
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Upper bounds of the call duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class CallStatistics:
+    """Database work done by a single call, collected by :func:`record_query`."""
+    queries: int = 0
+    database_time: float = 0.0
+
+
+@dataclass
+class ProcedureMetrics:
+    """Totals of all calls of a procedure made in this process."""
+    calls: int = 0
+    errors: int = 0
+    duration: float = 0.0
+    queries: int = 0
+    database_time: float = 0.0
+    response_bytes: int = 0
+    duration_buckets: list[int] = field(default_factory=lambda: [0] * len(DURATION_BUCKETS))
+
+
+@dataclass
+class CacheMetrics:
+    """Lookups of cached session details made in this process."""
+    hits: int = 0
+    misses: int = 0
+
+
+# Name of the request attribute listing the procedures called in the request, see :func:`measure_responses`
+_CALLS_ATTRIBUTE = "_rpc_metrics_calls"
+
+_current_call: ContextVar[CallStatistics | None] = ContextVar("current_rpc_call", default=None)
+
+_metrics: dict[str, ProcedureMetrics] = {}
+_cache_metrics = CacheMetrics()
+_metrics_lock = threading.Lock()
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting the queries of the procedure being called and the time they take.
+    Queries made outside of a call are passed through.
+    """
+    statistics = _current_call.get()
+
+    if statistics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        statistics.queries += 1
+        statistics.database_time += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection: BaseDatabaseWrapper, **kwargs):
+    """Adds :func:`record_query` to a newly opened connection. Receiver of ``connection_created``.
+
+    The context of the call is copied to the threads running synchronous code for asynchronous procedures,
+    so their queries are counted as well.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _record(name: str, statistics: CallStatistics, duration: float, failed: bool, request: Any):
+    calls = getattr(request, _CALLS_ATTRIBUTE, None)
+
+    if calls is not None:
+        calls.append(name)
+
+    with _metrics_lock:
+        metrics = _metrics.setdefault(name, ProcedureMetrics())
+        metrics.calls += 1
+        metrics.errors += failed
+        metrics.duration += duration
+        metrics.queries += statistics.queries
+        metrics.database_time += statistics.database_time
+
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                metrics.duration_buckets[index] += 1
+                break
+
+    if settings.RPC_METRICS_LOG:
+        logger.info(json.dumps({
+            "procedure": name,
+            "duration_ms": round(duration * 1e3, 3),
+            "queries": statistics.queries,
+            "database_ms": round(statistics.database_time * 1e3, 3),
+            "error": failed
+        }))
+
+
+def instrumented(func: F) -> F:
+    """Records the duration, the number of queries and the time spent in the database of every call of
+    the decorated procedure, unless ``RPC_METRICS_ENABLED`` is off. The size of the response is added by
+    :func:`measure_responses`. Works with both synchronous and asynchronous functions.
+    """
+
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def async_instrumented_wrapper(*args, **kwargs):
+            if not settings.RPC_METRICS_ENABLED:
+                return await func(*args, **kwargs)
+
+            statistics = CallStatistics()
+            token = _current_call.set(statistics)
+            started = time.perf_counter()
+            failed = True
+
+            try:
+                result = await func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _current_call.reset(token)
+                _record(func.__name__, statistics, time.perf_counter() - started, failed, kwargs.get(REQUEST_KEY))
+
+        return async_instrumented_wrapper
+
+    @wraps(func)
+    def instrumented_wrapper(*args, **kwargs):
+        if not settings.RPC_METRICS_ENABLED:
+            return func(*args, **kwargs)
+
+        statistics = CallStatistics()
+        token = _current_call.set(statistics)
+        started = time.perf_counter()
+        failed = True
+
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            _current_call.reset(token)
+            _record(func.__name__, statistics, time.perf_counter() - started, failed, kwargs.get(REQUEST_KEY))
+
+    return instrumented_wrapper
+
+
+def _record_response(request: HttpRequest, response: HttpResponse):
+    calls = getattr(request, _CALLS_ATTRIBUTE)
+
+    if not calls:
+        return
+
+    # The calls of a batch share a single response body.
+    size = len(response.content)
+    shares = [size // len(calls) + (index < size % len(calls)) for index in range(len(calls))]
+
+    with _metrics_lock:
+        for name, share in zip(calls, shares):
+            _metrics.setdefault(name, ProcedureMetrics()).response_bytes += share
+
+    if settings.RPC_METRICS_LOG:
+        logger.info(json.dumps({"procedures": calls, "response_bytes": size}))
+
+
+def measure_responses(view: F) -> F:
+    """Adds the size of the response body, as it is sent, to the metrics of the procedures called in
+    the request. Wraps the views of the RPC entry points, so that results aren't encoded a second time
+    only to be measured, and XML-RPC responses are measured in XML.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_measure_responses_wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            if not settings.RPC_METRICS_ENABLED:
+                return await view(request, *args, **kwargs)
+
+            setattr(request, _CALLS_ATTRIBUTE, [])
+            response = await view(request, *args, **kwargs)
+            _record_response(request, response)
+            return response
+
+        return async_measure_responses_wrapper
+
+    @wraps(view)
+    def measure_responses_wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if not settings.RPC_METRICS_ENABLED:
+            return view(request, *args, **kwargs)
+
+        setattr(request, _CALLS_ATTRIBUTE, [])
+        response = view(request, *args, **kwargs)
+        _record_response(request, response)
+        return response
+
+    return measure_responses_wrapper
+
+
+def record_cache_access(hit: bool):
+    """Counts a lookup of cached session details as a hit or a miss."""
+    with _metrics_lock:
+        if hit:
+            _cache_metrics.hits += 1
+        else:
+            _cache_metrics.misses += 1
+
+
+def get_metrics() -> dict[str, ProcedureMetrics]:
+    """Returns a copy of the metrics of every procedure called in this process so far."""
+    with _metrics_lock:
+        return {name: ProcedureMetrics(**{**vars(metrics), "duration_buckets": list(metrics.duration_buckets)})
+                for name, metrics in _metrics.items()}
+
+
+def get_cache_metrics() -> CacheMetrics:
+    """Returns a copy of the session details cache counters of this process."""
+    with _metrics_lock:
+        return CacheMetrics(**vars(_cache_metrics))
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+        _cache_metrics.hits = _cache_metrics.misses = 0
+
+
+def render_prometheus(metrics: dict[str, ProcedureMetrics], cache_metrics: CacheMetrics | None = None,
+                      worker: int | None = None) -> str:
+    """Formats metrics in the Prometheus text exposition format. Every worker process counts its own calls,
+    so their series are told apart by the process id given as `worker`.
+    """
+    lines = []
+    worker_label = f'worker="{worker}"' if worker is not None else ""
+
+    def family(name: str, kind: str, description: str, samples: list[tuple[str, str, float]]):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+
+        for suffix, labels, value in samples:
+            labels = ",".join(label for label in (worker_label, labels) if label)
+            lines.append(f"{name}{suffix}{{{labels}}} {value!r}" if labels else f"{name}{suffix} {value!r}")
+
+    procedures = sorted(metrics.items())
+
+    family("planning_poker_rpc_calls_total", "counter", "Remote procedure calls.",
+           [("", f'procedure="{name}"', m.calls) for name, m in procedures])
+    family("planning_poker_rpc_errors_total", "counter", "Remote procedure calls which raised an error.",
+           [("", f'procedure="{name}"', m.errors) for name, m in procedures])
+
+    duration_samples = []
+
+    for name, m in procedures:
+        cumulative = 0
+
+        for bound, count in zip(DURATION_BUCKETS, m.duration_buckets):
+            cumulative += count
+            duration_samples.append(("_bucket", f'procedure="{name}",le="{bound:g}"', cumulative))
+
+        duration_samples.append(("_bucket", f'procedure="{name}",le="+Inf"', m.calls))
+        duration_samples.append(("_sum", f'procedure="{name}"', m.duration))
+        duration_samples.append(("_count", f'procedure="{name}"', m.calls))
+
+    family("planning_poker_rpc_duration_seconds", "histogram", "Wall time of remote procedure calls.",
+           duration_samples)
+    family("planning_poker_rpc_queries_total", "counter", "Database queries made by remote procedure calls.",
+           [("", f'procedure="{name}"', m.queries) for name, m in procedures])
+    family("planning_poker_rpc_database_seconds_total", "counter",
+           "Time remote procedure calls spent waiting for the database.",
+           [("", f'procedure="{name}"', m.database_time) for name, m in procedures])
+    family("planning_poker_rpc_response_bytes_total", "counter",
+           "Size of the response bodies of remote procedure calls as sent, shared evenly by the calls of a batch.",
+           [("", f'procedure="{name}"', m.response_bytes) for name, m in procedures])
+
+    if cache_metrics is not None:
+        family("planning_poker_session_cache_hits_total", "counter",
+               "Session details served from the cache.", [("", "", cache_metrics.hits)])
+        family("planning_poker_session_cache_misses_total", "counter",
+               "Session details which had to be read from the database.", [("", "", cache_metrics.misses)])
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpc', '0003_alter_player_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-18 05:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('rpc', '0004_session_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='player',
+            name='session',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='rpc.session'),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='story',
+            name='session',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='rpc.session'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='story',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='rpc.story'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['session', 'id'], name='rpc_player_session_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['session', 'id'], name='rpc_story_session_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['story', 'id'], name='rpc_task_story_id_idx'),
+        ),
+    ]
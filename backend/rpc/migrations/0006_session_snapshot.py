@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 05:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpc', '0005_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionSnapshot',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='rpc.session')),
+                ('version', models.PositiveBigIntegerField()),
+                ('details', models.JSONField()),
+            ],
+        ),
+    ]
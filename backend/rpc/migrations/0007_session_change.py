@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 05:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpc', '0006_session_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField()),
+                ('changes', models.JSONField()),
+                ('session', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='rpc.session')),
+            ],
+            options={
+                'unique_together': {('session', 'version')},
+            },
+        ),
+    ]
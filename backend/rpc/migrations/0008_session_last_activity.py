@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 05:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpc', '0007_session_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
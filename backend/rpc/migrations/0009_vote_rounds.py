@@ -0,0 +1,58 @@
+# Generated by Django 4.2 on 2026-10-18 06:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('rpc', '0008_session_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='current_story',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rpc.story'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='round',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='VoteRound',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('revealed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('session', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='rpc.session')),
+                ('story', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='rpc.story')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Vote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.SmallIntegerField()),
+                ('round', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='rpc.voteround')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='voteround',
+            index=models.Index(fields=['story', 'id'], name='rpc_voteround_story_id_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='voteround',
+            unique_together={('session', 'number')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='vote',
+            unique_together={('round', 'user')},
+        ),
+    ]
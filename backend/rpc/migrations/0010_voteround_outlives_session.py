@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 06:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpc', '0009_vote_rounds'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='voteround',
+            name='session',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='rpc.session'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Session(models.Model):
@@ -16,25 +17,103 @@ class Session(models.Model):
     owner = models.ForeignKey(User, models.CASCADE)
     players_number = models.IntegerField()
     ready_players_number = models.IntegerField()
+    version = models.PositiveBigIntegerField(default=0)
+    # When the session was created or last modified, see ``rpc.changes.session_changed``
+    last_activity = models.DateTimeField(default=timezone.now)
+    # Number of the current voting round, which ends with the first reset of a selection after the votes are revealed
+    round = models.PositiveIntegerField(default=1)
+    # Story the current round is about, if any
+    current_story = models.ForeignKey("Story", models.SET_NULL, null=True, blank=True, related_name="+")
 
 
 class Player(models.Model):
     class Meta:
         unique_together = [["user", "session"]]
+        indexes = [
+            # Players of a session in the order they joined
+            models.Index(name="rpc_player_session_id_idx", fields=["session", "id"])
+        ]
 
-    user = models.ForeignKey(User, models.CASCADE)
-    session = models.ForeignKey(Session, models.CASCADE)
+    # Both foreign keys are the first column of an index below
+    user = models.ForeignKey(User, models.CASCADE, db_index=False)
+    session = models.ForeignKey(Session, models.CASCADE, db_index=False)
     selection = models.SmallIntegerField(null=True)
     voted = models.BooleanField(default=False)
 
 
 class Story(models.Model):
-    session = models.ForeignKey(Session, models.CASCADE)
+    class Meta:
+        indexes = [
+            # Stories of a session in the order they were created
+            models.Index(name="rpc_story_session_id_idx", fields=["session", "id"])
+        ]
+
+    session = models.ForeignKey(Session, models.CASCADE, db_index=False)
     summary = models.TextField()
     description = models.TextField()
 
 
 class Task(models.Model):
-    story = models.ForeignKey(Story, models.CASCADE)
+    class Meta:
+        indexes = [
+            # Tasks of a story in the order they were created
+            models.Index(name="rpc_task_story_id_idx", fields=["story", "id"])
+        ]
+
+    story = models.ForeignKey(Story, models.CASCADE, db_index=False)
     summary = models.TextField()
     estimation = models.SmallIntegerField(null=True)
+
+
+class SessionSnapshot(models.Model):
+    """Details of a session as returned to its players, apart from the user dependent ``user_is_owner`` flag.
+    Refreshed in the transaction of every modification of the session, see ``rpc.changes.session_changed``.
+    """
+    session = models.OneToOneField(Session, models.CASCADE, primary_key=True, related_name="snapshot")
+    version = models.PositiveBigIntegerField()
+    details = models.JSONField()
+
+
+class SessionChange(models.Model):
+    """Players, stories and tasks of a session changed by a single modification, see ``rpc.deltas.make_delta``.
+    At least the ``SESSION_CHANGE_LOG_LENGTH`` most recent versions of every session are kept, older ones are
+    removed once every ``SESSION_CHANGE_LOG_LENGTH`` versions.
+    """
+    class Meta:
+        unique_together = [["session", "version"]]
+
+    # The foreign key is the first column of the unique index above
+    session = models.ForeignKey(Session, models.CASCADE, db_index=False)
+    # Version the modification led to
+    version = models.PositiveBigIntegerField()
+    changes = models.JSONField()
+
+
+class VoteRound(models.Model):
+    """Votes of a session's round, recorded when they are revealed, see ``rpc.rounds.record_round``.
+    Rounds are never modified once the session has moved on to the next one, and are kept when their session or
+    story is deleted, as the history of the players who voted in them.
+    """
+    class Meta:
+        unique_together = [["session", "number"]]
+        indexes = [
+            # Rounds of a story in the order they were played
+            models.Index(name="rpc_voteround_story_id_idx", fields=["story", "id"])
+        ]
+
+    # Both foreign keys are the first column of an index above
+    session = models.ForeignKey(Session, models.SET_NULL, null=True, db_index=False)
+    story = models.ForeignKey(Story, models.SET_NULL, null=True, db_index=False)
+    number = models.PositiveIntegerField()
+    revealed_at = models.DateTimeField(default=timezone.now)
+
+
+class Vote(models.Model):
+    class Meta:
+        unique_together = [["round", "user"]]
+
+    # The foreign key is the first column of the unique index above
+    round = models.ForeignKey(VoteRound, models.CASCADE, db_index=False)
+    # Votes outlive the accounts of the players who cast them
+    user = models.ForeignKey(User, models.SET_NULL, null=True)
+    value = models.SmallIntegerField()
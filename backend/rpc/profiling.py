@@ -0,0 +1,256 @@
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from pathlib import Path
+from types import FrameType
+from typing import Any, Callable, Coroutine, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from modernrpc.core import REQUEST_KEY
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+class StackSampler:
+    """Samples the stacks of the running profiled calls at a fixed interval, from a background thread.
+    The thread sleeps while no call is profiled.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._calls: dict[int, tuple[Callable[[dict[int, FrameType]], str | None], Counter]] = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start_call(self, sample: Callable[[dict[int, FrameType]], str | None]) -> Counter:
+        """Starts sampling a call, returns the counter its stacks are collected in.
+
+        :param sample: formats the call's current stack, given the current frames of all threads,
+            or returns None when the call has nothing to show
+        """
+        stacks = Counter()
+
+        with self._condition:
+            self._calls[id(stacks)] = (sample, stacks)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rpc-stack-sampler", daemon=True)
+                self._thread.start()
+
+            self._condition.notify()
+
+        return stacks
+
+    def end_call(self, stacks: Counter):
+        with self._condition:
+            self._calls.pop(id(stacks), None)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._calls)
+                calls = list(self._calls.items())
+
+            frames = sys._current_frames()
+            samples = [(key, sample(frames)) for key, (sample, _) in calls]
+            del frames
+
+            with self._condition:
+                # Calls which have ended meanwhile are no longer sampled.
+                for key, stack in samples:
+                    if stack and key in self._calls:
+                        self._calls[key][1][stack] += 1
+
+            time.sleep(self.interval)
+
+
+def _frame_name(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+def _collapse(frame: FrameType, root: FrameType) -> str | None:
+    """Formats the stack from `root` down to `frame` in the folded format used by flame graph tools.
+    Returns None if `frame` isn't called from `root`.
+    """
+    names = []
+
+    while frame is not root:
+        if frame is None:
+            return None
+
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+def _thread_stack(ident: int, root: FrameType) -> Callable[[dict[int, FrameType]], str | None]:
+    """Samples what a thread runs below `root`."""
+
+    def sample(frames: dict[int, FrameType]) -> str | None:
+        frame = frames.get(ident)
+        return None if frame is None else _collapse(frame, root)
+
+    return sample
+
+
+def _coroutine_stack(ident: int, coroutine: Coroutine) -> Callable[[dict[int, FrameType]], str | None]:
+    """Samples a coroutine running on the event loop of a thread.
+
+    A suspended coroutine isn't on any thread's stack, so its stack is the chain of the coroutines it awaits,
+    ending with what the innermost one waits for, e.g. the future of a query run in a worker thread. While
+    the innermost one runs, the loop thread's frames below it are added.
+    """
+
+    def sample(frames: dict[int, FrameType]) -> str | None:
+        names, awaited = [], coroutine
+
+        while inspect.iscoroutine(awaited) or inspect.isgenerator(awaited):
+            frame = awaited.cr_frame if inspect.iscoroutine(awaited) else awaited.gi_frame
+
+            # Finished meanwhile
+            if frame is None:
+                return None
+
+            names.append(_frame_name(frame))
+            inner = awaited.cr_await if inspect.iscoroutine(awaited) else awaited.gi_yieldfrom
+
+            if inner is None:
+                running = frames.get(ident)
+                below = None if running is None else _collapse(running, frame)
+                return ";".join(names + [below] if below else names)
+
+            awaited = inner
+
+        return ";".join(names + [f"<{type(awaited).__qualname__}>"])
+
+    return sample
+
+
+def _shape(value: Any) -> Any:
+    """Describes a parameter without revealing its value."""
+    if isinstance(value, list):
+        return f"list[{len(value)}]"
+
+    if isinstance(value, dict):
+        return f"dict[{len(value)}]"
+
+    return "null" if value is None else type(value).__name__
+
+
+class ProfileStore:
+    """Keeps the most recent profiles as JSON files in a directory, deleting the oldest ones."""
+
+    def __init__(self, directory: str | Path, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, profile: dict[str, Any]) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Names sort by creation time, the process id keeps the workers sharing the directory apart.
+        path = self.directory / f"{time.time_ns()}-{os.getpid()}-{profile['procedure']}.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(profile))
+        os.replace(temporary, path)
+
+        for old in sorted(self.directory.glob("*.json"))[:-self.max_files]:
+            old.unlink(missing_ok=True)
+
+        return path
+
+
+_sampler: StackSampler | None = None
+_sampler_lock = threading.Lock()
+
+
+def _get_sampler() -> StackSampler:
+    global _sampler
+
+    with _sampler_lock:
+        if _sampler is None or _sampler.interval != settings.RPC_PROFILING_INTERVAL:
+            _sampler = StackSampler(settings.RPC_PROFILING_INTERVAL)
+
+        return _sampler
+
+
+def _save_profile(func: Callable, args: tuple, kwargs: dict, sampler: StackSampler, stacks: Counter,
+                  duration: float):
+    if random.random() < settings.RPC_PROFILING_SAMPLE_RATE:
+        reason = "sampled"
+    elif duration >= settings.RPC_PROFILING_SLOW_CALL:
+        reason = "slow"
+    else:
+        reason = None
+
+    # Calls shorter than the sampling interval may have no samples at all.
+    if reason and stacks:
+        request = kwargs.get(REQUEST_KEY)
+
+        ProfileStore(settings.RPC_PROFILING_DIRECTORY, settings.RPC_PROFILING_MAX_FILES).save({
+            "procedure": func.__name__,
+            "params": [_shape(arg) for arg in args],
+            "named_params": {name: _shape(value) for name, value in kwargs.items() if not name.startswith("_")},
+            "user_id": getattr(getattr(request, "user", None), "id", None),
+            "reason": reason,
+            "started": time.time() - duration,
+            "duration": duration,
+            "interval": sampler.interval,
+            "stacks": dict(stacks)
+        })
+
+
+def profiled(func: F) -> F:
+    """Samples the call stack of the decorated procedure while it runs, when ``RPC_PROFILING_ENABLED`` is on.
+    The stacks are saved to ``RPC_PROFILING_DIRECTORY`` for a ``RPC_PROFILING_SAMPLE_RATE`` fraction of calls,
+    and for every call taking at least ``RPC_PROFILING_SLOW_CALL`` seconds, together with the procedure name,
+    the shape of its parameters and the id of the user.
+
+    Coroutine functions are sampled through the chain of coroutines they await, so the time they spend
+    waiting shows up under what they waited for.
+    """
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_profiled_wrapper(*args, **kwargs):
+            if not settings.RPC_PROFILING_ENABLED:
+                return await func(*args, **kwargs)
+
+            sampler = _get_sampler()
+            coroutine = func(*args, **kwargs)
+            stacks = sampler.start_call(_coroutine_stack(threading.get_ident(), coroutine))
+            started = time.perf_counter()
+
+            try:
+                return await coroutine
+            finally:
+                duration = time.perf_counter() - started
+                sampler.end_call(stacks)
+                await sync_to_async(_save_profile, thread_sensitive=False)(func, args, kwargs, sampler, stacks,
+                                                                           duration)
+
+        return async_profiled_wrapper
+
+    @wraps(func)
+    def profiled_wrapper(*args, **kwargs):
+        if not settings.RPC_PROFILING_ENABLED:
+            return func(*args, **kwargs)
+
+        sampler = _get_sampler()
+        stacks = sampler.start_call(_thread_stack(threading.get_ident(), sys._getframe()))
+        started = time.perf_counter()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - started
+            sampler.end_call(stacks)
+            _save_profile(func, args, kwargs, sampler, stacks, duration)
+
+    return profiled_wrapper
@@ -1,13 +1,29 @@
 from functools import wraps
+from inspect import iscoroutinefunction
 from typing import Callable, Concatenate, ParamSpec, TypeVar
 
+from asgiref.sync import sync_to_async
 from django.http import HttpRequest
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate as django_authenticate, login as django_login, logout as django_logout
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, PositiveIntegerField, Subquery, When
 
 from modernrpc.core import rpc_method, REQUEST_KEY
-from .models import Player, Session, Story, Task
-from .types import SessionDTO, SessionDetailsDTO, PlayerDTO, StoryDTO
+from .changes import event, session_changed
+from .imports import bulk_import_stories, clean_story
+from .membership import check_membership, forget_membership, get_player_session, get_player_story, \
+    get_player_task, remember_membership
+from .metrics import instrumented
+from .models import Player, Session, Story, Task, VoteRound
+from .profiling import profiled
+from .rounds import record_round
+from .snapshots import build_player_dtos, build_session_delta, build_vote_results, get_session_details, \
+    session_details_related
+from .statistics import estimation_statistics, team_statistics
+from .summaries import session_summaries, session_summary_dto
+from .types import EstimationStatisticsDTO, ImportedStoryDTO, SessionDeltaDTO, SessionDetailsDTO, SessionChangeDTO, \
+    SessionSummaryDTO
 
 P = ParamSpec('P')
 R = TypeVar('R')
@@ -15,8 +31,21 @@ R = TypeVar('R')
 
 def authenticated_user_only(func: Callable[Concatenate[HttpRequest, P], R]) -> Callable[Concatenate[HttpRequest, P], R]:
     """Makes it impossible for not authenticated users to access the decorated function.
+    Works with both synchronous and asynchronous functions.
     """
 
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def async_authenticated_user_only_wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            request = kwargs[REQUEST_KEY]
+
+            if not await sync_to_async(lambda: request.user.is_authenticated)():
+                raise Exception("Not available to anonymous users")
+
+            return await func(*args, **kwargs)
+
+        return async_authenticated_user_only_wrapper
+
     @wraps(func)
     def authenticated_user_only_wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
         request = kwargs[REQUEST_KEY]
@@ -29,7 +58,20 @@ def authenticated_user_only(func: Callable[Concatenate[HttpRequest, P], R]) -> C
     return authenticated_user_only_wrapper
 
 
+def reveal_events(session: Session) -> list[tuple[str, dict]]:
+    """Returns the event revealing everyone's selections, if every player in the session is ready,
+    and records the revealed votes as the session's current round. Has to be called in the revealing transaction.
+    """
+    if session.ready_players_number != session.players_number:
+        return []
+
+    record_round(session)
+    return [event("votes_revealed", players=build_player_dtos(session), results=build_vote_results(session))]
+
+
 @rpc_method
+@instrumented
+@profiled
 def register(username: str, password: str, **kwargs):
     """Registers a new user and logs them in.
 
@@ -47,6 +89,8 @@ def register(username: str, password: str, **kwargs):
 
 
 @rpc_method
+@instrumented
+@profiled
 def login(username: str, password: str, **kwargs):
     """Logs the user in when given correct credentials.
 
@@ -68,6 +112,8 @@ def login(username: str, password: str, **kwargs):
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def logout(**kwargs):
     """Logs the user out.
@@ -79,6 +125,8 @@ def logout(**kwargs):
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def create_session(**kwargs) -> int:
     """Creates a planning poker session and adds the current user to it as a player.
@@ -93,11 +141,14 @@ def create_session(**kwargs) -> int:
 
     player = Player(user=user, session=session)
     player.save()
+    remember_membership(kwargs[REQUEST_KEY], session.id)
 
     return session.id
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def get_session(session_id: int, **kwargs) -> SessionDetailsDTO:
     """Returns info about the chosen session if users is registered as a player.
@@ -106,45 +157,76 @@ def get_session(session_id: int, **kwargs) -> SessionDetailsDTO:
     :return: session details
     :raise Any: any error that occurs inside
     """
-    user: User = kwargs[REQUEST_KEY].user
-    player = Player.objects.get(user=user, session=session_id)
-    session = player.session
+    request = kwargs[REQUEST_KEY]
+    session = get_player_session(request, session_id, *session_details_related())
+
+    return get_session_details(session, request.user)
 
-    players = session.player_set.all()
 
-    player_dtos: list[PlayerDTO] = \
-        [{"username": player.user.username} for player in players] \
-        if session.ready_players_number != session.players_number \
-        else [{"username": player.user.username, "selection": player.selection} for player in players]
+@rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+def get_session_if_changed(session_id: int, known_version: int, **kwargs) -> SessionChangeDTO:
+    """Returns info about the chosen session only if it has changed since `known_version`.
+    When it has not, only the current version is returned and no details are built.
 
-    stories = session.story_set.all()
+    :param session_id: identifier of the session to operate on
+    :param known_version: version of the session the client already has
+    :return: session's version and, if it has changed, its details
+    :raise Any: any error that occurs inside
+    """
+    request = kwargs[REQUEST_KEY]
+    session = get_player_session(request, session_id)
 
-    story_dtos: list[StoryDTO] = [{
-        "id": story.id,
-        "summary": story.summary,
-        "description": story.description,
-        "tasks": [{"id": task.id, "summary": task.summary, "estimation": task.estimation} for task in
-                  story.task_set.all()]
-    } for story in stories]
+    if session.version == known_version:
+        return {"version": session.version, "changed": False}
 
-    return {"id": session.id, "user_is_owner": session.owner == user, "players": player_dtos, "stories": story_dtos}
+    return {"version": session.version, "changed": True, "session": get_session_details(session, request.user)}
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
-def get_sessions(**kwargs) -> list[SessionDTO]:
-    """Returns a list of sessions the current user is registered as a player in.
+def get_session_delta(session_id: int, since_version: int, **kwargs) -> SessionDeltaDTO:
+    """Returns only the players, stories and tasks of the chosen session added, changed or removed since
+    `since_version`. When the changes since then are no longer known, the full details are returned instead,
+    with `full` set.
+
+    :param session_id: identifier of the session to operate on
+    :param since_version: version of the session the client already has
+    :return: session's version and either its changes or its details
+    :raise Any: any error that occurs inside
+    """
+    request = kwargs[REQUEST_KEY]
+    session = get_player_session(request, session_id)
+
+    return build_session_delta(session, request.user, since_version)
 
-    :return: list of session info objects
+
+@rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+def get_sessions(before: int | None = None, limit: int | None = None, **kwargs) -> list[SessionSummaryDTO]:
+    """Returns a page of the sessions the current user is registered as a player in, newest first,
+    with a summary of each. To get the next page, pass the id of the last session returned as `before`.
+    A page shorter than `limit` is the last one.
+
+    :param before: id of the last session of the previous page, None for the first page
+    :param limit: maximum number of sessions to return, by default and at most ``SESSIONS_PAGE_SIZE``
+    :return: list of session summaries
     :raise Any: any error that occurs inside
     """
     user: User = kwargs[REQUEST_KEY].user
 
-    sessions = [player.session for player in user.player_set.all()]
-    return [{"id": session.id, "user_is_owner": session.owner == user} for session in sessions]
+    return [session_summary_dto(user, row) for row in session_summaries(user, before, limit)]
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def join_session(session_id: int, **kwargs):
     """Joins the current user to an existing session as a player.
@@ -153,14 +235,20 @@ def join_session(session_id: int, **kwargs):
     :raise Any: any error that occurs inside
     """
     user: User = kwargs[REQUEST_KEY].user
-    session = Session.objects.get(id=session_id)
-    player = Player(user=user, session=session)
-    player.save()
-    session.players_number += 1
-    session.save()
+
+    with transaction.atomic():
+        if not Session.objects.filter(id=session_id).update(players_number=F("players_number") + 1):
+            raise Session.DoesNotExist("Session matching query does not exist.")
+
+        Player.objects.create(user=user, session_id=session_id)
+        session_changed(session_id, event("player_joined", username=user.username))
+
+    remember_membership(kwargs[REQUEST_KEY], session_id)
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def leave_session(session_id: int, **kwargs):
     """Removes the current user from a chosen session and wipes their selection.
@@ -169,24 +257,37 @@ def leave_session(session_id: int, **kwargs):
     :param session_id: identifies the session to be left
     :raise Any: any error that occurs inside
     """
-    user: User = kwargs[REQUEST_KEY].user
+    request = kwargs[REQUEST_KEY]
+    user: User = request.user
     session = Session.objects.get(id=session_id)
+    forget_membership(request, session_id)
+
+    if session.owner_id == user.id:
+        with transaction.atomic():
+            session.delete()
+            session_changed(session_id, event("session_deleted"))
 
-    if session.owner == user:
-        session.delete()
         return
 
-    player = Player.objects.get(user=user, session=session)
+    with transaction.atomic():
+        # Deleting voted and not voted players separately tells which counters to decrement
+        # without reading the player first.
+        voted = Player.objects.filter(user=user, session=session_id, voted=True).delete()[0] > 0
 
-    if player.voted:
-        session.ready_players_number -= 1
+        if not voted and not Player.objects.filter(user=user, session=session_id).delete()[0]:
+            raise Player.DoesNotExist("Player matching query does not exist.")
 
-    player.delete()
-    session.players_number -= 1
-    session.save()
+        Session.objects.filter(id=session_id).update(players_number=F("players_number") - 1,
+                                                     ready_players_number=F("ready_players_number") - int(voted))
+        session.refresh_from_db(fields=["players_number", "ready_players_number", "version", "round",
+                                        "current_story"])
+        session_changed(session_id, event("player_left", username=user.username), *reveal_events(session),
+                        session=session)
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def make_selection(session_id: int, selection: int, **kwargs):
     """Sets current user's selection in a chosen session to `selection` if they haven't voted.
@@ -196,23 +297,26 @@ def make_selection(session_id: int, selection: int, **kwargs):
     :raise Any: any error that occurs inside
     """
     user: User = kwargs[REQUEST_KEY].user
-    player = Player.objects.get(user=user, session=session_id)
-    session = player.session
+    players = Player.objects.filter(user=user, session=session_id, selection__isnull=True)
 
-    if player.selection is not None:
-        raise Exception("Selection is not empty")
+    with transaction.atomic():
+        # Only the request which actually marks the player as voted counts them as ready. Players whose
+        # selections were forced are already counted.
+        if players.filter(voted=False).update(selection=selection, voted=True):
+            Session.objects.filter(id=session_id).update(ready_players_number=F("ready_players_number") + 1)
+        elif not players.update(selection=selection):
+            check_membership(kwargs[REQUEST_KEY], session_id)
+            raise Exception("Selection is not empty")
 
-    player.selection = selection
-
-    if not player.voted:
-        session.ready_players_number += 1
-        player.voted = True
-
-    player.save()
-    session.save()
+        # Locked until the end of the transaction, so that its version is still the current one in session_changed.
+        session = Session.objects.select_for_update().get(id=session_id)
+        session_changed(session_id, event("vote_cast", username=user.username), *reveal_events(session),
+                        session=session)
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def force_selections(session_id: int, **kwargs):
     """Makes it so that everyone in the chosen session is considered to have voted,
@@ -223,18 +327,19 @@ def force_selections(session_id: int, **kwargs):
     """
     user: User = kwargs[REQUEST_KEY].user
     session = Session.objects.get(id=session_id, owner=user)
-    players = session.player_set.all()
-
-    session.ready_players_number = session.players_number
-    session.save()
 
-    for player in players:
-        if not player.voted:
-            player.voted = True
-            player.save()
+    with transaction.atomic():
+        # Counting the players actually marked here keeps the counter exact when someone votes meanwhile.
+        forced = Player.objects.filter(session=session, voted=False).update(voted=True)
+        Session.objects.filter(id=session.id).update(ready_players_number=F("ready_players_number") + forced)
+        session.refresh_from_db(fields=["players_number", "ready_players_number", "version", "round",
+                                        "current_story"])
+        session_changed(session.id, *reveal_events(session), session=session)
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def get_selection(session_id: int, **kwargs) -> int | None:
     """Gets current user's selection from chosen session.
@@ -250,6 +355,8 @@ def get_selection(session_id: int, **kwargs) -> int | None:
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def reset_selection(session_id: int, **kwargs):
     """Sets current user's selection in a chosen session to nothing if a selection was made before.
@@ -258,20 +365,86 @@ def reset_selection(session_id: int, **kwargs):
     :raise Any: any error that occurs inside
     """
     user: User = kwargs[REQUEST_KEY].user
-    player = Player.objects.get(user=user, session=session_id)
 
-    if player.selection is None:
-        raise Exception("Selection is empty")
+    with transaction.atomic():
+        if not Player.objects.filter(user=user, session=session_id, selection__isnull=False) \
+                .update(selection=None, voted=False):
+            check_membership(kwargs[REQUEST_KEY], session_id)
+            raise Exception("Selection is empty")
 
-    player.selection = None
-    player.voted = False
-    player.save()
-    session = player.session
-    session.ready_players_number -= 1
-    session.save()
+        # The first reset after the round was recorded starts the next one, even if players have joined since
+        # the votes were revealed.
+        recorded = VoteRound.objects.filter(session=OuterRef("id"), number=OuterRef("round"))
+        Session.objects.filter(id=session_id).update(
+            ready_players_number=F("ready_players_number") - 1,
+            round=Case(When(Exists(recorded), then=F("round") + 1), default=F("round"),
+                       output_field=PositiveIntegerField())
+        )
+        session_changed(session_id, event("vote_reset", username=user.username))
 
 
 @rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+def set_current_story(session_id: int, story_id: int | None, **kwargs):
+    """Sets the story the chosen session is estimating. The current round, even if it has already been revealed,
+    and the rounds after it are recorded for that story.
+
+    :param session_id: identifies the session to operate on
+    :param story_id: identifies a story of the session, None to estimate without a story
+    :raise Any: any error that occurs inside
+    """
+    check_membership(kwargs[REQUEST_KEY], session_id)
+
+    if story_id is not None and not Story.objects.filter(id=story_id, session=session_id).exists():
+        raise Story.DoesNotExist("Story matching query does not exist.")
+
+    with transaction.atomic():
+        Session.objects.filter(id=session_id).update(current_story_id=story_id)
+        VoteRound.objects.filter(session=session_id, number=Subquery(Session.objects.filter(id=session_id)
+                                                                     .values("round"))).update(story_id=story_id)
+        session_changed(session_id, event("current_story_changed", id=story_id))
+
+
+@rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+def get_estimation_statistics(session_id: int, **kwargs) -> EstimationStatisticsDTO:
+    """Returns statistics of the votes revealed in a chosen session: how the latest round of every story went,
+    and how every player's votes compare with the rest of their rounds.
+
+    :param session_id: identifies the session to operate on
+    :return: statistics of the stories and the players
+    :raise Any: any error that occurs inside
+    """
+    check_membership(kwargs[REQUEST_KEY], session_id)
+
+    return estimation_statistics(session_id)
+
+
+@rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+def get_team_statistics(usernames: list[str], **kwargs) -> EstimationStatisticsDTO:
+    """Returns statistics of the votes revealed in every round the calling user voted in, across all of their
+    sessions, describing the calling user and the chosen users. Users who don't exist are left out.
+
+    :param usernames: usernames of the other members of the team
+    :return: statistics of the stories and the members of the team
+    :raise Any: any error that occurs inside
+    """
+    user = kwargs[REQUEST_KEY].user
+    user_ids = [user.id, *User.objects.filter(username__in=usernames).exclude(id=user.id).values_list("id", flat=True)]
+
+    return team_statistics(user_ids, rounds_of=user.id)
+
+
+@rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def create_story(session_id: int, summary: str, description: str | None, **kwargs) -> int:
     """Creates a story in a chosen session.
@@ -281,14 +454,42 @@ def create_story(session_id: int, summary: str, description: str | None, **kwarg
     :param description: story's description
     :raise Any: any error that occurs inside
     """
-    user: User = kwargs[REQUEST_KEY].user
-    player = Player.objects.get(user=user, session=session_id)
-    session = player.session
+    check_membership(kwargs[REQUEST_KEY], session_id)
+
+    with transaction.atomic():
+        story = Story.objects.create(session_id=session_id, summary=summary, description=description)
+        session_changed(session_id, event("story_created", id=story.id, summary=summary, description=description,
+                                          tasks=[]))
+
+    return story.id
+
+
+@rpc_method
+@instrumented
+@profiled
+@authenticated_user_only
+def import_stories(session_id: int, stories: list[dict], **kwargs) -> list[ImportedStoryDTO]:
+    """Creates many stories with their tasks in a chosen session at once. Every story is an object with
+    a `summary`, an optional `description` and an optional list of `tasks`, each with a `summary` and
+    an optional `estimation`. Nothing is created if any of them is malformed.
+
+    :param session_id: identifies the session to operate on
+    :param stories: stories to create
+    :return: identifiers of the created stories and of their tasks, in the order they were given
+    :raise Any: any error that occurs inside
+    """
+    check_membership(kwargs[REQUEST_KEY], session_id)
 
-    return Story.objects.create(session=session, summary=summary, description=description).id
+    if not isinstance(stories, list):
+        raise Exception("Stories have to be a list")
+
+    return bulk_import_stories(session_id, (clean_story(story, f"story {index + 1}")
+                                            for index, story in enumerate(stories)))
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def update_story(story_id: int, summary: str, description: str | None, **kwargs):
     """Updates a chosen story.
@@ -298,16 +499,20 @@ def update_story(story_id: int, summary: str, description: str | None, **kwargs)
     :param description: story's description
     :raise Any: any error that occurs inside
     """
-    user: User = kwargs[REQUEST_KEY].user
-    story = Story.objects.get(id=story_id)
-    Player.objects.get(user=user, session=story.session_id)
+    story = get_player_story(kwargs[REQUEST_KEY], story_id)
 
     story.summary = summary
     story.description = description
-    story.save()
+
+    with transaction.atomic():
+        story.save()
+        session_changed(story.session_id, event("story_updated", id=story.id, summary=summary,
+                                                description=description))
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def delete_story(story_id: int, **kwargs):
     """Deletes a chosen story.
@@ -315,14 +520,16 @@ def delete_story(story_id: int, **kwargs):
     :param story_id: identifies the story to delete
     :raise Any: any error that occurs inside
     """
-    user: User = kwargs[REQUEST_KEY].user
-    story = Story.objects.get(id=story_id)
-    Player.objects.get(user=user, session=story.session_id)
+    story = get_player_story(kwargs[REQUEST_KEY], story_id)
 
-    story.delete()
+    with transaction.atomic():
+        story.delete()
+        session_changed(story.session_id, event("story_deleted", id=story_id))
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def create_task(story_id: int, summary: str, estimation: int | None, **kwargs):
     """Creates a task in a chosen story.
@@ -332,14 +539,19 @@ def create_task(story_id: int, summary: str, estimation: int | None, **kwargs):
     :param estimation: task's description
     :raise Any: any error that occurs inside
     """
-    user: User = kwargs[REQUEST_KEY].user
-    story = Story.objects.get(id=story_id)
-    Player.objects.get(user=user, session=story.session_id)
+    story = get_player_story(kwargs[REQUEST_KEY], story_id)
+
+    with transaction.atomic():
+        task = Task.objects.create(story=story, summary=summary, estimation=estimation)
+        session_changed(story.session_id, event("task_created", story_id=story.id, id=task.id, summary=summary,
+                                                estimation=estimation))
 
-    return Task.objects.create(story=story, summary=summary, estimation=estimation).id
+    return task.id
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def update_task(task_id: int, summary: str, estimation: int | None, **kwargs):
     """Updates a chosen task.
@@ -349,17 +561,21 @@ def update_task(task_id: int, summary: str, estimation: int | None, **kwargs):
     :param estimation: task's description
     :raise Any: any error that occurs inside
     """
-    user: User = kwargs[REQUEST_KEY].user
-    task = Task.objects.get(id=task_id)
+    task = get_player_task(kwargs[REQUEST_KEY], task_id)
     story = task.story
-    Player.objects.get(user=user, session=story.session_id)
 
     task.summary = summary
     task.estimation = estimation
-    task.save()
+
+    with transaction.atomic():
+        task.save()
+        session_changed(story.session_id, event("task_updated", story_id=story.id, id=task.id, summary=summary,
+                                                estimation=estimation))
 
 
 @rpc_method
+@instrumented
+@profiled
 @authenticated_user_only
 def delete_task(task_id: int, **kwargs):
     """Deletes a chosen task.
@@ -367,9 +583,9 @@ def delete_task(task_id: int, **kwargs):
     :param task_id: identifies the task to update
     :raise Any: any error that occurs inside
     """
-    user: User = kwargs[REQUEST_KEY].user
-    task = Task.objects.get(id=task_id)
+    task = get_player_task(kwargs[REQUEST_KEY], task_id)
     story = task.story
-    Player.objects.get(user=user, session=story.session_id)
 
-    task.delete()
+    with transaction.atomic():
+        task.delete()
+        session_changed(story.session_id, event("task_deleted", story_id=story.id, id=task_id))
@@ -0,0 +1,23 @@
+from .models import Player, Session, Vote, VoteRound
+
+
+def record_round(session: Session):
+    """Records the revealed votes of the session's current round. Has to be called in the transaction revealing them.
+
+    Votes can be revealed more than once in a round, e.g. when a player whose selection was forced votes
+    afterwards, in which case the new votes are added to the round. Votes already recorded are only replaced
+    by the same player's, and are kept when their player leaves. Players without a selection aren't recorded,
+    and neither are rounds without any votes.
+
+    :param session: session whose votes are revealed, with its current round and story
+    """
+    votes = list(Player.objects.filter(session=session, selection__isnull=False).order_by("id")
+                 .values_list("user_id", "selection"))
+
+    if not votes:
+        return
+
+    vote_round, _ = VoteRound.objects.get_or_create(session=session, number=session.round,
+                                                    defaults={"story_id": session.current_story_id})
+    Vote.objects.bulk_create([Vote(round=vote_round, user_id=user_id, value=value) for user_id, value in votes],
+                             update_conflicts=True, unique_fields=["round", "user"], update_fields=["value"])
@@ -0,0 +1,282 @@
+from typing import Collection
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, QuerySet
+
+from .cache import acache_contents, aget_cached_contents, cache_contents, get_cached_contents, get_session_cache
+from .deltas import make_delta, merge_deltas
+from .models import Player, Session, SessionChange, SessionSnapshot, Story, Task
+from .types import SessionDeltaDTO, SessionDetailsDTO, PlayerDTO, StoryDTO, TaskDTO, VoteResultsDTO
+
+# Parts of the session contents which are rebuilt separately: the players together with the results of their
+# selections, and the stories together with their tasks
+CONTENTS_PARTS = ("players", "stories")
+
+
+def _players(session: Session) -> QuerySet:
+    return Player.objects.filter(session=session).order_by("id").values_list("user__username", "selection")
+
+
+def _tasks(session: Session) -> QuerySet:
+    return Task.objects.filter(story__session=session).order_by("id").values("id", "story_id", "summary",
+                                                                              "estimation")
+
+
+def _stories(session: Session) -> QuerySet:
+    return Story.objects.filter(session=session).order_by("id").values("id", "summary", "description")
+
+
+def _selection_counts(session: Session) -> QuerySet:
+    return Player.objects.filter(session=session, selection__isnull=False).order_by("selection") \
+        .values_list("selection").annotate(count=Count("id"))
+
+
+def _is_revealed(session: Session) -> bool:
+    return session.ready_players_number == session.players_number
+
+
+def _assemble_players(session: Session, players: list[tuple[str, int | None]]) -> list[PlayerDTO]:
+    if not _is_revealed(session):
+        return [{"username": username} for username, _ in players]
+
+    return [{"username": username, "selection": selection} for username, selection in players]
+
+
+def _assemble_results(selection_counts: list[tuple[int, int]]) -> VoteResultsDTO:
+    # The histogram is ordered by selection and holds a handful of rows, everything else follows from it exactly.
+    votes = sum(count for _, count in selection_counts)
+
+    return {
+        "histogram": [{"selection": selection, "count": count} for selection, count in selection_counts],
+        "minimum": selection_counts[0][0] if selection_counts else None,
+        "maximum": selection_counts[-1][0] if selection_counts else None,
+        "average": sum(selection * count for selection, count in selection_counts) / votes if votes else None,
+        "consensus": len(selection_counts) == 1
+    }
+
+
+def _assemble_stories(tasks: list[dict], stories: list[dict]) -> list[StoryDTO]:
+    tasks_by_story: dict[int, list[TaskDTO]] = {}
+
+    for task in tasks:
+        tasks_by_story.setdefault(task.pop("story_id"), []).append(task)
+
+    return [{
+        "id": story["id"],
+        "summary": story["summary"],
+        "description": story["description"],
+        "tasks": tasks_by_story.get(story["id"], [])
+    } for story in stories]
+
+
+def _assemble_contents(session: Session, player_dtos: list[PlayerDTO], story_dtos: list[StoryDTO],
+                       results: VoteResultsDTO | None) -> dict:
+    contents = {"version": session.version, "players": player_dtos, "stories": story_dtos}
+
+    if results is not None:
+        contents["results"] = results
+
+    return contents
+
+
+def _with_user(session: Session, user: User, contents: dict) -> SessionDetailsDTO:
+    return {"id": session.id, "user_is_owner": session.owner_id == user.id, **contents}
+
+
+def build_player_dtos(session: Session) -> list[PlayerDTO]:
+    """Lists the players of a session in a single query. Selections are included only once everyone is ready.
+
+    :param session: session to describe
+    :return: session's players
+    """
+    return _assemble_players(session, list(_players(session)))
+
+
+def build_vote_results(session: Session) -> VoteResultsDTO:
+    """Sums up the selections of a session in a single aggregate query, counting the players of every selection.
+    Players without a selection, whose selections were forced, aren't counted.
+
+    :param session: session whose selections are revealed
+    :return: histogram of the selections, their range, average, and whether they are all the same
+    """
+    return _assemble_results(list(_selection_counts(session)))
+
+
+def _reusable_results(session: Session, player_dtos: list[PlayerDTO], previous: dict | None) -> VoteResultsDTO | None:
+    # The results only change together with the revealed selections.
+    if previous is not None and _is_revealed(session) and previous["players"] == player_dtos:
+        return previous.get("results")
+
+    return None
+
+
+def build_session_contents(session: Session, previous: dict | None = None, known: dict | None = None,
+                           changed: Collection[str] = CONTENTS_PARTS) -> dict:
+    """Assembles the parts of the session details which are the same for every user, in a fixed number of queries,
+    regardless of the session's size.
+
+    Players are read together with their usernames in a single joined query, stories in another one,
+    and all tasks of the session in a third one, which are then grouped by story in Python. Once the selections
+    are revealed, their results are added, see :func:`build_vote_results`.
+
+    :param session: session to describe
+    :param previous: earlier contents of the session, whose results are kept if no selection has changed since
+    :param known: players and results the caller has already built for the current state of the session,
+        e.g. when revealing the selections, which aren't read again
+    :param changed: parts of :data:`CONTENTS_PARTS` which may differ from `previous`, the others are taken from it
+        rather than read again
+    :return: version, players, stories and, once revealed, results of the session
+    """
+    known = known or {}
+
+    if previous is not None and "players" not in changed:
+        player_dtos, results = previous["players"], previous.get("results")
+    else:
+        player_dtos = known["players"] if "players" in known else build_player_dtos(session)
+        results = known["results"] if "results" in known else _reusable_results(session, player_dtos, previous)
+
+        if results is None and _is_revealed(session):
+            results = build_vote_results(session)
+
+    if previous is not None and "stories" not in changed:
+        story_dtos = previous["stories"]
+    else:
+        story_dtos = _assemble_stories(list(_tasks(session)), list(_stories(session)))
+
+    return _assemble_contents(session, player_dtos, story_dtos, results)
+
+
+def build_session_details(session: Session, user: User) -> SessionDetailsDTO:
+    """Assembles the details of a session from the normalized tables, see :func:`build_session_contents`.
+
+    :param session: session to describe
+    :param user: user the details are prepared for
+    :return: session details
+    """
+    return _with_user(session, user, build_session_contents(session))
+
+
+async def abuild_session_contents(session: Session) -> dict:
+    """Asynchronous version of :func:`build_session_contents`, running the same queries with the async ORM.
+    """
+    player_dtos = _assemble_players(session, [player async for player in _players(session)])
+    tasks = [task async for task in _tasks(session)]
+    stories = [story async for story in _stories(session)]
+    results = _assemble_results([row async for row in _selection_counts(session)]) if _is_revealed(session) else None
+
+    return _assemble_contents(session, player_dtos, _assemble_stories(tasks, stories), results)
+
+
+async def abuild_session_details(session: Session, user: User) -> SessionDetailsDTO:
+    """Asynchronous version of :func:`build_session_details`."""
+    return _with_user(session, user, await abuild_session_contents(session))
+
+
+def refresh_snapshot(session: Session, known: dict | None = None, changed: Collection[str] = CONTENTS_PARTS):
+    """Stores the current contents of a session as its snapshot, and what changed since the previous snapshot
+    in the session's change log. Has to be called in the transaction modifying the session, after its version
+    has been bumped.
+
+    Only the parts of the contents the modification changed are read again, the others are carried over from
+    the previous snapshot. Everything is rebuilt and the log is cleared when the previous snapshot isn't the one of
+    the previous version, e.g. when an inconsistent snapshot is repaired, as the changes since then are unknown.
+    The versions which fell out of the log are removed once every ``SESSION_CHANGE_LOG_LENGTH`` versions.
+
+    :param session: modified session, with its current version
+    :param known: players and results already built for the modification, see :func:`build_session_contents`
+    :param changed: parts of :data:`CONTENTS_PARTS` the modification may have changed, all of them by default
+    """
+    snapshot = SessionSnapshot.objects.filter(session=session).first()
+
+    if snapshot is not None and snapshot.version == session.version - 1:
+        contents = build_session_contents(session, snapshot.details, known, changed)
+        SessionChange.objects.create(session=session, version=session.version,
+                                     changes=make_delta(snapshot.details, contents))
+
+        if session.version % settings.SESSION_CHANGE_LOG_LENGTH == 0:
+            SessionChange.objects.filter(session=session,
+                                         version__lte=session.version - settings.SESSION_CHANGE_LOG_LENGTH).delete()
+    else:
+        contents = build_session_contents(session, known=known)
+        SessionChange.objects.filter(session=session).delete()
+
+    if snapshot is None:
+        SessionSnapshot.objects.create(session=session, version=session.version, details=contents)
+    else:
+        snapshot.version = session.version
+        snapshot.details = contents
+        snapshot.save()
+
+
+def _is_current(session: Session, snapshot: SessionSnapshot | None) -> bool:
+    # Missing for sessions which haven't changed since snapshots were introduced.
+    return snapshot is not None and snapshot.version == session.version
+
+
+def session_details_related() -> tuple[str, ...]:
+    """Returns the relations worth reading together with a session which is going to be described.
+    The snapshot is only needed on cache misses, so it isn't joined when session details are cached.
+    """
+    return () if get_session_cache() is not None else ("snapshot",)
+
+
+def get_session_details(session: Session, user: User) -> SessionDetailsDTO:
+    """Returns the details of a session from the cache configured with ``SESSION_DETAILS_CACHE`` or, on a miss,
+    from its snapshot, without further queries when the snapshot has been loaded together with the session.
+    Falls back to :func:`build_session_contents` when there is no up-to-date snapshot. Details read from
+    the database are cached for the session's version.
+
+    :param session: session to describe, ideally with ``select_related("snapshot")`` when nothing is cached
+    :param user: user the details are prepared for
+    :return: session details
+    """
+    contents = get_cached_contents(session)
+
+    if contents is None:
+        snapshot = getattr(session, "snapshot", None)
+        contents = snapshot.details if _is_current(session, snapshot) else build_session_contents(session)
+        cache_contents(session, contents)
+
+    return _with_user(session, user, contents)
+
+
+async def aget_session_details(session: Session, user: User) -> SessionDetailsDTO:
+    """Asynchronous version of :func:`get_session_details`."""
+    contents = await aget_cached_contents(session)
+
+    if contents is None:
+        if Session.snapshot.related.is_cached(session):
+            snapshot = getattr(session, "snapshot", None)
+        else:
+            snapshot = await SessionSnapshot.objects.filter(session=session).afirst()
+
+        contents = snapshot.details if _is_current(session, snapshot) else await abuild_session_contents(session)
+        await acache_contents(session, contents)
+
+    return _with_user(session, user, contents)
+
+
+def build_session_delta(session: Session, user: User, since_version: int) -> SessionDeltaDTO:
+    """Returns what changed in a session since `since_version`, merging the entries of its change log.
+    Falls back to the full details, see :func:`get_session_details`, when the log doesn't reach back that far.
+
+    :param session: session to describe
+    :param user: user the details are prepared for
+    :param since_version: version of the session the client already has
+    :return: session's version and either its changes or its details
+    """
+    if since_version == session.version:
+        changes = []
+    elif session.version - settings.SESSION_CHANGE_LOG_LENGTH <= since_version < session.version:
+        changes = list(SessionChange.objects.filter(session=session, version__gt=since_version,
+                                                    version__lte=session.version)
+                       .order_by("version").values_list("changes", flat=True))
+    else:
+        changes = None
+
+    # Every version in between has to be logged, the oldest ones may have been compacted away.
+    if changes is not None and len(changes) == session.version - since_version:
+        return {"version": session.version, "full": False, "changes": merge_deltas(changes)}
+
+    return {"version": session.version, "full": True, "session": get_session_details(session, user)}
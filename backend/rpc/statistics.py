@@ -0,0 +1,270 @@
+from dataclasses import dataclass
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db.models import Aggregate, QuerySet, TextField
+from django.db.models.functions import Coalesce
+
+from .models import Vote
+from .types import EstimationStatisticsDTO
+
+# Stands for a missing story or user in the integer arrays
+MISSING = -1
+
+# How far outside of the interquartile range of its group a vote has to be to count as an outlier, in ranges
+OUTLIER_RANGE = 1.5
+
+
+@dataclass
+class Votes:
+    """Votes as parallel arrays, one element per vote."""
+    rounds: np.ndarray
+    stories: np.ndarray
+    users: np.ndarray
+    values: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, selection: np.ndarray) -> "Votes":
+        return Votes(self.rounds[selection], self.stories[selection], self.users[selection], self.values[selection])
+
+
+@dataclass
+class GroupStatistics:
+    """Statistics of the values of every group, one element per group, in the order of the group keys."""
+    keys: np.ndarray
+    counts: np.ndarray
+    mean: np.ndarray
+    median: np.ndarray
+    # Population standard deviation
+    spread: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    # Share of the values equal to the most common one
+    agreement: np.ndarray
+    # Whether all values are equal
+    consensus: np.ndarray
+    # Number of values outside of the group's fences, see :data:`OUTLIER_RANGE`
+    outliers: np.ndarray
+    # Whether every value, in the order given, is an outlier of its group
+    outlier_mask: np.ndarray
+
+
+class _Concat(Aggregate):
+    """Joins integers into a single comma separated text, in the order the rows are read."""
+    function = "GROUP_CONCAT"
+    output_field = TextField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function="STRING_AGG",
+                              template="%(function)s(CAST(%(expressions)s AS text), ',')", **extra_context)
+
+
+def _parse(concatenated: str | None) -> np.ndarray:
+    return np.zeros(0, dtype=np.int64) if concatenated is None else np.fromstring(concatenated, np.int64, sep=",")
+
+
+def load_votes(votes: QuerySet | None = None) -> Votes:
+    """Reads votes into arrays in a single query. Votes without a story or a user get :data:`MISSING` instead.
+
+    Every column is read as a single text aggregate, parsed by numpy, rather than as a row per vote, which the
+    database driver turns into Python objects several times slower than the database reads them. The aggregates
+    of a single query read the rows in the same order, so their elements line up.
+
+    :param votes: votes to read, all of them by default
+    :return: the votes, ordered by round
+    """
+    votes = Vote.objects.all() if votes is None else votes
+    columns = votes.aggregate(rounds=_Concat("round_id"), stories=_Concat(Coalesce("round__story_id", MISSING)),
+                              users=_Concat(Coalesce("user_id", MISSING)), values=_Concat("value"))
+    rounds, stories, users, values = (_parse(columns[name]) for name in ("rounds", "stories", "users", "values"))
+    # Rows are usually read round by round already, which a stable sort leaves as they are.
+    order = np.argsort(rounds, kind="stable")
+
+    return Votes(rounds[order], stories[order], users[order], values[order])
+
+
+# Votes are small integers, so a group key and a value are packed into a single integer sorting by both,
+# as the high and low bits
+_VALUE_BITS = 16
+_VALUE_OFFSET = 1 << (_VALUE_BITS - 1)
+
+
+def _group_index(keys: np.ndarray, group_keys: np.ndarray) -> np.ndarray:
+    # Position of every key among the sorted group keys. Votes are usually loaded ordered by round,
+    # in which case it is a running count of the key changes, without a binary search per key.
+    if len(keys) and np.all(keys[1:] >= keys[:-1]):
+        return np.concatenate(([0], np.cumsum(keys[1:] != keys[:-1])))
+
+    return np.searchsorted(group_keys, keys)
+
+
+def _quantile(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    # Linear interpolation between the closest ranks, as numpy.quantile does by default.
+    position = starts + (counts - 1) * q
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def group_statistics(keys: np.ndarray, values: np.ndarray) -> GroupStatistics:
+    """Computes statistics of the values of every group at once, without a Python loop over the groups.
+
+    Keys and values are packed into single integers and sorted, so that every group becomes a contiguous run
+    of sorted values. Sums are reduced over the runs, and order statistics are read at computed positions
+    within them.
+
+    :param keys: group of every value, integers
+    :param values: values to describe, integers which fit in 16 bits like the votes do
+    :return: statistics of every group present in `keys`
+    """
+    keys, values = np.asarray(keys, dtype=np.int64), np.asarray(values, dtype=np.int64)
+    codes = np.sort((keys << _VALUE_BITS) | (values + _VALUE_OFFSET))
+    sorted_keys, sorted_values = codes >> _VALUE_BITS, (codes & ((1 << _VALUE_BITS) - 1)) - _VALUE_OFFSET
+    boundaries = np.empty(len(codes), dtype=bool)
+    boundaries[:1] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=boundaries[1:])
+    starts = np.flatnonzero(boundaries)
+    counts = np.diff(np.append(starts, len(codes)))
+
+    if not len(starts):
+        empty = np.zeros(0)
+        return GroupStatistics(sorted_keys, counts, empty, empty, empty, empty, empty, empty, empty.astype(bool),
+                               counts, np.zeros(0, dtype=bool))
+
+    mean = np.add.reduceat(sorted_values, starts) / counts
+    # Sums of integers are exact, the variance is only rounded once.
+    variance = np.add.reduceat(sorted_values * sorted_values, starts) / counts - mean * mean
+    minimum, maximum = sorted_values[starts], sorted_values[starts + counts - 1]
+
+    # Runs of equal codes are runs of equal values within a group, the longest one is the group's mode.
+    runs = np.empty(len(codes), dtype=bool)
+    runs[:1] = True
+    np.not_equal(codes[1:], codes[:-1], out=runs[1:])
+    run_starts = np.flatnonzero(runs)
+    run_lengths = np.diff(np.append(run_starts, len(codes)))
+    mode_counts = np.maximum.reduceat(run_lengths, np.searchsorted(run_starts, starts))
+
+    first_quartile = _quantile(sorted_values, starts, counts, 0.25)
+    third_quartile = _quantile(sorted_values, starts, counts, 0.75)
+    fence = (third_quartile - first_quartile) * OUTLIER_RANGE
+    group_keys = sorted_keys[starts]
+    groups = _group_index(keys, group_keys)
+    outlier_mask = (values < (first_quartile - fence)[groups]) | (values > (third_quartile + fence)[groups])
+
+    return GroupStatistics(
+        keys=group_keys,
+        counts=counts,
+        mean=mean,
+        median=_quantile(sorted_values, starts, counts, 0.5),
+        spread=np.sqrt(np.maximum(variance, 0)),
+        minimum=minimum,
+        maximum=maximum,
+        agreement=mode_counts / counts,
+        consensus=minimum == maximum,
+        outliers=np.bincount(groups, weights=outlier_mask, minlength=len(starts)).astype(np.int64),
+        outlier_mask=outlier_mask
+    )
+
+
+def story_statistics(votes: Votes) -> GroupStatistics:
+    """Describes the votes of the latest round of every story. Rounds without a story are left out.
+
+    :param votes: votes of any number of rounds
+    :return: statistics keyed by story id
+    """
+    votes = votes[votes.stories != MISSING]
+    latest_rounds = np.zeros(0, dtype=np.int64)
+
+    if len(votes):
+        # The latest round of a story has the highest id among its rounds.
+        stories, inverse = np.unique(votes.stories, return_inverse=True)
+        latest_rounds = np.full(len(stories), np.iinfo(np.int64).min)
+        np.maximum.at(latest_rounds, inverse, votes.rounds)
+        votes = votes[votes.rounds == latest_rounds[inverse]]
+
+    return group_statistics(votes.stories, votes.values)
+
+
+@dataclass
+class PlayerStatistics:
+    """How every player's votes compare with the rest of their rounds, one element per player."""
+    users: np.ndarray
+    votes: np.ndarray
+    # Mean difference between the player's votes and the medians of their rounds, positive for high estimates
+    bias: np.ndarray
+    # Mean absolute difference between the player's votes and the medians of their rounds
+    deviation: np.ndarray
+    # Share of the player's votes which were outliers of their rounds
+    outlier_rate: np.ndarray
+
+
+def player_statistics(votes: Votes) -> PlayerStatistics:
+    """Compares every vote with the other votes of its round, and sums the comparisons up by player.
+    Votes of deleted users are left out of the result, but still count for the rounds they were cast in.
+
+    :param votes: votes of any number of rounds
+    :return: statistics keyed by user id
+    """
+    rounds = group_statistics(votes.rounds, votes.values)
+    difference = votes.values - rounds.median[_group_index(votes.rounds, rounds.keys)]
+    # User ids are primary keys, dense enough to count the votes of every id up to the highest one.
+    known = votes.users != MISSING
+    players = votes.users[known]
+    counts = np.bincount(players)
+    users = np.flatnonzero(counts)
+
+    def mean(values: np.ndarray) -> np.ndarray:
+        return np.bincount(players, weights=values[known], minlength=len(counts))[users] / counts[users]
+
+    return PlayerStatistics(users=users, votes=counts[users], bias=mean(difference),
+                            deviation=mean(np.abs(difference)), outlier_rate=mean(rounds.outlier_mask))
+
+
+def estimation_statistics(session_id: int) -> EstimationStatisticsDTO:
+    """Describes the stories and the players of a session from the votes of its recorded rounds.
+
+    :param session_id: identifies the session
+    :return: statistics of the stories, ordered by id, and of the players, ordered by username
+    """
+    return _describe(load_votes(Vote.objects.filter(round__session=session_id)))
+
+
+def team_statistics(user_ids: list[int], rounds_of: int | None = None) -> EstimationStatisticsDTO:
+    """Describes a team from every recorded round any of its members voted in, across all of their sessions,
+    including deleted ones. Only the members are described among the players, but the votes of everyone else
+    still count for the rounds they were cast in.
+
+    :param user_ids: members of the team
+    :param rounds_of: user whose rounds only are described, all rounds of the team by default
+    :return: statistics of the stories, ordered by id, and of the members, ordered by username
+    """
+    rounds = Vote.objects.filter(user__in=user_ids if rounds_of is None else [rounds_of]).values("round_id")
+    return _describe(load_votes(Vote.objects.filter(round__in=rounds)), user_ids)
+
+
+def _describe(votes: Votes, user_ids: list[int] | None = None) -> EstimationStatisticsDTO:
+    stories, players = story_statistics(votes), player_statistics(votes)
+    described = players.users.tolist() if user_ids is None else user_ids
+    usernames = dict(User.objects.filter(id__in=described).values_list("id", "username"))
+
+    return {
+        "stories": [{
+            "story_id": story_id, "votes": votes_number, "mean": mean, "median": median, "spread": spread,
+            "minimum": minimum, "maximum": maximum, "agreement": agreement, "consensus": consensus,
+            "outliers": outliers
+        } for story_id, votes_number, mean, median, spread, minimum, maximum, agreement, consensus, outliers in zip(
+            stories.keys.tolist(), stories.counts.tolist(), stories.mean.tolist(), stories.median.tolist(),
+            stories.spread.tolist(), stories.minimum.tolist(), stories.maximum.tolist(), stories.agreement.tolist(),
+            stories.consensus.tolist(), stories.outliers.tolist()
+        )],
+        "players": sorted(({
+            "username": usernames[user_id], "votes": votes_number, "bias": bias, "deviation": deviation,
+            "outlier_rate": outlier_rate
+        } for user_id, votes_number, bias, deviation, outlier_rate in zip(
+            players.users.tolist(), players.votes.tolist(), players.bias.tolist(), players.deviation.tolist(),
+            players.outlier_rate.tolist()
+        ) if user_id in usernames), key=lambda player: player["username"])
+    }
@@ -0,0 +1,48 @@
+from typing import Any
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, F, IntegerField, OuterRef, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Player, Story
+from .types import SessionSummaryDTO
+
+
+def session_summaries(user: User, before: int | None = None, limit: int | None = None) -> QuerySet:
+    """Selects a page of the sessions a user is a player in, newest first, together with their summaries,
+    in a single query.
+
+    Pages are cut by session id rather than by offset, so a page is read from the user's index entries
+    starting at `before`, whatever the number of sessions the user has ever played in. The stories are only
+    counted for the sessions on the page.
+
+    :param user: player whose sessions are listed
+    :param before: id of the last session of the previous page, None for the first page
+    :param limit: size of the page, at most and by default ``SESSIONS_PAGE_SIZE``
+    :return: query yielding rows for :func:`session_summary_dto`
+    """
+    limit = settings.SESSIONS_PAGE_SIZE if limit is None else max(0, min(limit, settings.SESSIONS_PAGE_SIZE))
+    stories_number = Story.objects.filter(session=OuterRef("session_id")).order_by().values("session") \
+        .annotate(count=Count("id")).values("count")
+    players = Player.objects.filter(user=user)
+
+    if before is not None:
+        players = players.filter(session_id__lt=before)
+
+    return players.order_by("-session_id").values(
+        "session_id", owner_id=F("session__owner_id"), players_number=F("session__players_number"),
+        ready_players_number=F("session__ready_players_number"), last_activity=F("session__last_activity"),
+        stories_number=Coalesce(Subquery(stories_number, output_field=IntegerField()), Value(0))
+    )[:limit]
+
+
+def session_summary_dto(user: User, row: dict[str, Any]) -> SessionSummaryDTO:
+    return {
+        "id": row["session_id"],
+        "user_is_owner": row["owner_id"] == user.id,
+        "players_number": row["players_number"],
+        "ready_players_number": row["ready_players_number"],
+        "stories_number": row["stories_number"],
+        "last_activity": row["last_activity"].isoformat()
+    }
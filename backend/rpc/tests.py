@@ -1,44 +1,90 @@
-from copy import deepcopy
-from functools import wraps
-
-from django.test import LiveServerTestCase
-
-from xmlrpc.client import Fault, Transport, ServerProxy, INTERNAL_ERROR
-
-from .types import PlayerDTO, SessionDetailsDTO, StoryDTO
-
-
-class CookiesTransport(Transport):
-    """A Transport (HTTP) subclass that retains cookies over its lifetime."""
-    def __init__(self):
-        super().__init__()
-        self._cookies = []
-
-    def send_headers(self, connection, headers):
-        if self._cookies:
-            connection.putheader("Cookie", "; ".join(self._cookies))
-        super().send_headers(connection, headers)
-
-    def parse_response(self, response):
-        if response.msg.get_all("Set-Cookie"):
-            for header in response.msg.get_all("Set-Cookie"):
-                cookie = header.split(";", 1)[0]
-                self._cookies.append(cookie)
-        return super().parse_response(response)
-
-
-class ServerProxyPool:
-    @wraps(ServerProxy.__init__, assigned=("__doc__", "__annotations__"), updated=("__dict__",))
-    def __init__(self, *args, **kwargs):
-        self._client_storage = {}
-        self._server_proxy_args = args
-        self._server_proxy_kwargs = kwargs
-
-    def __getitem__(self, item: int) -> ServerProxy:
-        if self._client_storage.get(item) is None:
-            self._client_storage[item] = ServerProxy(*deepcopy(self._server_proxy_args), **deepcopy(self._server_proxy_kwargs))
-
-        return self._client_storage[item]
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import runpy
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+from unittest import mock, skipUnless
+
+import numpy as np
+import redis
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import F
+from django.http import HttpRequest, HttpResponse
+from django.test import AsyncClient, Client, LiveServerTestCase, SimpleTestCase, TestCase, TransactionTestCase, \
+    override_settings
+from django.test.utils import CaptureQueriesContext
+from modernrpc.core import REQUEST_KEY
+from modernrpc.exceptions import RPC_INTERNAL_ERROR, RPC_INVALID_PARAMS
+
+from xmlrpc.client import Fault, INTERNAL_ERROR, dumps as xmlrpc_dumps
+
+from benchmarks.clients import CookiesTransport, ServerProxyPool
+from rpc import membership, metrics
+from rpc.cache import BoundedLocMemCache, cache_contents, get_cached_contents, get_session_cache
+from rpc.changes import deliver, session_changed
+from rpc.event_broker import EventBrokerThread
+from rpc.event_bus import RedisEventBus
+from rpc.json_patch import make_patch
+from rpc.models import Player, Session, SessionChange, SessionSnapshot, Story, Task, Vote, VoteRound
+from rpc.profiling import profiled
+from rpc.remote_procedures import create_story, create_task, delete_story, delete_task, force_selections, \
+    get_estimation_statistics, get_selection, get_session, get_session_delta, get_session_if_changed, get_sessions, \
+    get_team_statistics, import_stories, join_session, leave_session, make_selection, reset_selection, \
+    set_current_story, update_story, update_task
+from rpc.snapshots import build_session_contents, build_session_details, build_vote_results
+from rpc.statistics import MISSING, group_statistics, load_votes
+from rpc.views import stream_session_events
+from rpc.websockets import session_events
+from .types import PlayerDTO, SessionChangeDTO, SessionDetailsDTO, SessionSummaryDTO, StoryDTO
+
+
+class SessionTestMixin:
+    """Helpers of the test cases calling remote procedures directly, within a session owned by ``owner``."""
+
+    def create_session(self, *usernames: str, ready_players_number: int = 0, **owner_fields) -> list[User]:
+        """Creates the ``owner`` user and a session of theirs, played together with new users named `usernames`.
+
+        :param usernames: names of the other players
+        :param ready_players_number: how many players the session counts as ready
+        :param owner_fields: fields of the owner's player, e.g. their selection
+        :return: other players, in the order of `usernames`
+        """
+        self.owner = User.objects.create_user("owner")
+        users = [User.objects.create_user(username) for username in usernames]
+        self.session = Session.objects.create(owner=self.owner, players_number=len(users) + 1,
+                                              ready_players_number=ready_players_number)
+        Player.objects.create(user=self.owner, session=self.session, **owner_fields)
+
+        for user in users:
+            Player.objects.create(user=user, session=self.session)
+
+        return users
+
+    @staticmethod
+    def make_request(user: User) -> HttpRequest:
+        request = HttpRequest()
+        request.user = user
+
+        return request
+
+    def call_procedure(self, procedure: Callable, user: User, *args):
+        return procedure(*args, request=self.make_request(user))
+
+    def acall_procedure(self, procedure: Callable, user: User, *args):
+        return sync_to_async(procedure)(*args, request=self.make_request(user))
 
 
 class RPCTestCase(LiveServerTestCase):
@@ -155,6 +201,75 @@ class RPCTestCase(LiveServerTestCase):
         # then
         self.assertIn(second_player_dto, returned_player_dtos)
 
+    def test_session_was_not_returned_when_unchanged(self):
+        # given
+        username = "username"
+
+        self.clients[1].register(username, "")
+        returned_session_id: int = self.clients[1].create_session()
+        returned_session_details_dto: SessionDetailsDTO = self.clients[1].get_session(returned_session_id)
+        known_version = returned_session_details_dto.get("version")
+
+        # when
+        returned_session_change_dto: SessionChangeDTO = \
+            self.clients[1].get_session_if_changed(returned_session_id, known_version)
+
+        # then
+        self.assertEqual({"version": known_version, "changed": False}, returned_session_change_dto)
+
+    def test_session_was_returned_when_changed(self):
+        # given
+        first_username = "first_username"
+        second_username = "second_username"
+        second_player_dto: PlayerDTO = {"username": second_username}
+
+        self.clients[1].register(first_username, "")
+        self.clients[2].register(second_username, "")
+        returned_session_id: int = self.clients[1].create_session()
+        returned_session_details_dto: SessionDetailsDTO = self.clients[1].get_session(returned_session_id)
+        known_version = returned_session_details_dto.get("version")
+
+        # when
+        self.clients[2].join_session(returned_session_id)
+        returned_session_change_dto: SessionChangeDTO = \
+            self.clients[1].get_session_if_changed(returned_session_id, known_version)
+
+        # then
+        self.assertTrue(returned_session_change_dto.get("changed"))
+        self.assertGreater(returned_session_change_dto.get("version"), known_version)
+        self.assertIn(second_player_dto, returned_session_change_dto.get("session").get("players"))
+
+    def test_session_version_was_bumped_by_every_mutation(self):
+        # given
+        username = "username"
+
+        self.clients[1].register(username, "")
+        returned_session_id: int = self.clients[1].create_session()
+        versions = [self.clients[1].get_session(returned_session_id).get("version")]
+
+        # when
+        self.clients[1].make_selection(returned_session_id, 1)
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+        self.clients[1].reset_selection(returned_session_id)
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+        self.clients[1].force_selections(returned_session_id)
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+        returned_story_id: int = self.clients[1].create_story(returned_session_id, "summary", "description")
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+        self.clients[1].update_story(returned_story_id, "summary", "description")
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+        returned_task_id: int = self.clients[1].create_task(returned_story_id, "summary", None)
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+        self.clients[1].update_task(returned_task_id, "summary", 1)
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+        self.clients[1].delete_task(returned_task_id)
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+        self.clients[1].delete_story(returned_story_id)
+        versions.append(self.clients[1].get_session(returned_session_id).get("version"))
+
+        # then
+        self.assertEqual(sorted(set(versions)), versions)
+
     def test_returned_sessions_match(self):
         # given
         first_username = "first_username"
@@ -165,16 +280,19 @@ class RPCTestCase(LiveServerTestCase):
         first_returned_session_id: int = self.clients[1].create_session()
         second_returned_session_id: int = self.clients[2].create_session()
         self.clients[2].join_session(first_returned_session_id)
-        session_details_dtos: list[SessionDTO] = [
-            {"id": first_returned_session_id, "user_is_owner": False},
-            {"id": second_returned_session_id, "user_is_owner": True}
+        last_activities = dict(Session.objects.values_list("id", "last_activity"))
+        session_summary_dtos: list[SessionSummaryDTO] = [
+            {"id": second_returned_session_id, "user_is_owner": True, "players_number": 1, "ready_players_number": 0,
+             "stories_number": 0, "last_activity": last_activities[second_returned_session_id].isoformat()},
+            {"id": first_returned_session_id, "user_is_owner": False, "players_number": 2, "ready_players_number": 0,
+             "stories_number": 0, "last_activity": last_activities[first_returned_session_id].isoformat()}
         ]
 
         # when
-        returned_session_dtos: list[SessionDTO] = sorted(self.clients[2].get_sessions(), key=lambda key: key.get("id"))
+        returned_session_dtos: list[SessionSummaryDTO] = self.clients[2].get_sessions()
 
         # then
-        self.assertEqual(session_details_dtos, returned_session_dtos)
+        self.assertEqual(session_summary_dtos, returned_session_dtos)
 
     def test_session_was_left(self):
         # given
@@ -660,3 +778,1924 @@ class RPCTestCase(LiveServerTestCase):
 
         # then
         self.assertEqual(cm.exception.faultCode, INTERNAL_ERROR)
+
+
+class SessionSnapshotTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.create_session()
+
+    def grow_session(self, players_number: int, stories_number: int, tasks_number: int):
+        users = User.objects.bulk_create(
+            [User(username=f"player_{self.session.players_number + i}") for i in range(players_number)])
+        Player.objects.bulk_create([Player(user=user, session=self.session) for user in users])
+        self.session.players_number += players_number
+        self.session.save()
+
+        stories = Story.objects.bulk_create(
+            [Story(session=self.session, summary="summary", description="description") for _ in range(stories_number)])
+        Task.objects.bulk_create(
+            [Task(story=story, summary="summary", estimation=1) for story in stories for _ in range(tasks_number)])
+
+    def test_query_count_does_not_depend_on_session_size(self):
+        # given
+        with self.assertNumQueries(3):
+            build_session_details(self.session, self.owner)
+
+        # when
+        self.grow_session(players_number=12, stories_number=40, tasks_number=5)
+
+        # then
+        with self.assertNumQueries(3):
+            session_details_dto = build_session_details(self.session, self.owner)
+
+        self.assertEqual(13, len(session_details_dto.get("players")))
+        self.assertEqual(40, len(session_details_dto.get("stories")))
+        self.assertTrue(all(len(story.get("tasks")) == 5 for story in session_details_dto.get("stories")))
+
+    def test_modifications_were_rolled_back_when_session_change_failed(self):
+        # given
+        request = self.make_request(self.owner)
+        story = Story.objects.create(session=self.session, summary="story", description="description")
+        task = Task.objects.create(story=story, summary="task", estimation=1)
+
+        # when
+        with mock.patch("rpc.changes.invalidate_session", side_effect=OperationalError("database is locked")):
+            for procedure, args in ((create_story, (self.session.id, "new", "")), (update_story, (story.id, "new", "")),
+                                    (create_task, (story.id, "new", 2)), (update_task, (task.id, "new", 2)),
+                                    (delete_task, (task.id,)), (delete_story, (story.id,)),
+                                    (leave_session, (self.session.id,))):
+                with self.subTest(procedure=procedure.__name__), self.assertRaises(OperationalError):
+                    procedure(*args, request=request)
+
+        # then
+        self.assertEqual([("story", "description")], list(Story.objects.values_list("summary", "description")))
+        self.assertEqual([("task", 1)], list(Task.objects.values_list("summary", "estimation")))
+        self.assertTrue(Session.objects.filter(id=self.session.id, version=self.session.version).exists())
+
+    def test_tasks_are_assigned_to_their_stories(self):
+        # given
+        first_story = Story.objects.create(session=self.session, summary="first", description="")
+        second_story = Story.objects.create(session=self.session, summary="second", description="")
+        task = Task.objects.create(story=second_story, summary="task", estimation=None)
+        story_dtos: list[StoryDTO] = [
+            {"id": first_story.id, "summary": "first", "description": "", "tasks": []},
+            {"id": second_story.id, "summary": "second", "description": "",
+             "tasks": [{"id": task.id, "summary": "task", "estimation": None}]}
+        ]
+
+        # when
+        session_details_dto: SessionDetailsDTO = build_session_details(self.session, self.owner)
+
+        # then
+        self.assertEqual(story_dtos, session_details_dto.get("stories"))
+
+    def get_session(self) -> SessionDetailsDTO:
+        return self.call_procedure(get_session, self.owner, self.session.id)
+
+    def test_snapshot_was_refreshed_by_modification(self):
+        # given
+        Story.objects.create(session=self.session, summary="summary", description="description")
+
+        # when
+        session_changed(self.session.id)
+
+        # then
+        snapshot = SessionSnapshot.objects.get(session=self.session)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.version, snapshot.version)
+        self.assertEqual(build_session_details(self.session, self.owner),
+                         {"id": self.session.id, "user_is_owner": True, **snapshot.details})
+
+    def test_only_changed_parts_of_snapshot_were_rebuilt(self):
+        # given
+        request = self.make_request(self.owner)
+        self.grow_session(players_number=2, stories_number=3, tasks_number=2)
+        session_changed(self.session.id)
+
+        # when
+        with CaptureQueriesContext(connection) as vote:
+            make_selection(self.session.id, 5, request=request)
+
+        with CaptureQueriesContext(connection) as story:
+            create_story(self.session.id, "summary", "description", request=request)
+
+        # then
+        vote_queries = " ".join(query["sql"] for query in vote.captured_queries)
+        story_queries = " ".join(query["sql"] for query in story.captured_queries)
+        self.assertNotIn('FROM "rpc_story"', vote_queries)
+        self.assertNotIn('FROM "rpc_task"', vote_queries)
+        self.assertNotIn('INNER JOIN "auth_user"', story_queries)
+        self.session.refresh_from_db()
+        self.assertEqual(build_session_details(self.session, self.owner), get_session(self.session.id, request=request))
+
+    @override_settings(SESSION_DETAILS_CACHE=None)
+    def test_session_was_read_from_snapshot_in_one_query(self):
+        # given
+        self.grow_session(players_number=12, stories_number=40, tasks_number=5)
+        session_changed(self.session.id)
+        self.session.refresh_from_db()
+
+        # when
+        with self.assertNumQueries(1):
+            session_details_dto = self.get_session()
+
+        # then
+        self.assertEqual(build_session_details(self.session, self.owner), session_details_dto)
+
+    def test_outdated_snapshot_was_not_served(self):
+        # given
+        session_changed(self.session.id)
+        Story.objects.create(session=self.session, summary="summary", description="description")
+        Session.objects.filter(id=self.session.id).update(version=F("version") + 1)
+
+        # when
+        session_details_dto = self.get_session()
+
+        # then
+        self.assertEqual(1, len(session_details_dto.get("stories")))
+
+    def test_inconsistent_snapshot_was_reported_and_repaired(self):
+        # given
+        session_changed(self.session.id)
+        SessionSnapshot.objects.filter(session=self.session).update(details={})
+
+        # when
+        with self.assertRaises(CommandError):
+            call_command("check_snapshots", stdout=io.StringIO())
+
+        call_command("check_snapshots", "--repair", stdout=io.StringIO())
+
+        # then
+        call_command("check_snapshots", stdout=io.StringIO())
+
+
+class SessionDetailsCacheTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.create_session()
+        self.player = User.objects.create_user("player")
+        get_session_cache().clear()
+        metrics.reset_metrics()
+
+    def tearDown(self) -> None:
+        get_session_cache().clear()
+        metrics.reset_metrics()
+
+    def get_session(self, session: Session) -> SessionDetailsDTO:
+        return self.call_procedure(get_session, session.owner, session.id)
+
+    def test_details_were_served_from_cache_in_one_query(self):
+        # given
+        self.get_session(self.session)
+
+        # when
+        with self.assertNumQueries(1):
+            session_details_dto = self.get_session(self.session)
+
+        # then
+        self.assertEqual(build_session_details(self.session, self.owner), session_details_dto)
+        self.assertEqual(metrics.CacheMetrics(hits=1, misses=1), metrics.get_cache_metrics())
+
+    def test_no_mutation_left_stale_details(self):
+        # given
+        other_session = Session.objects.create(owner=self.player, players_number=1, ready_players_number=0)
+        Player.objects.create(user=self.player, session=other_session)
+        self.get_session(other_session)
+        owner, player = self.make_request(self.owner), self.make_request(self.player)
+        story_id = None
+        task_id = None
+
+        def create_first_story():
+            nonlocal story_id
+            story_id = create_story(self.session.id, "summary", "description", request=owner)
+
+        def create_first_task():
+            nonlocal task_id
+            create_task(story_id, "summary", 1, request=owner)
+            task_id = Task.objects.get(story=story_id).id
+
+        mutations: list[tuple[str, Callable[[], object]]] = [
+            ("join_session", lambda: join_session(self.session.id, request=player)),
+            ("make_selection", lambda: make_selection(self.session.id, 3, request=owner)),
+            ("force_selections", lambda: force_selections(self.session.id, request=owner)),
+            ("reset_selection", lambda: reset_selection(self.session.id, request=owner)),
+            ("create_story", create_first_story),
+            ("update_story", lambda: update_story(story_id, "new summary", "new description", request=owner)),
+            ("create_task", create_first_task),
+            ("update_task", lambda: update_task(task_id, "new summary", 2, request=owner)),
+            ("delete_task", lambda: delete_task(task_id, request=owner)),
+            ("delete_story", lambda: delete_story(story_id, request=owner)),
+            ("leave_session", lambda: leave_session(self.session.id, request=player)),
+        ]
+
+        for name, mutate in mutations:
+            with self.subTest(name):
+                self.get_session(self.session)
+                self.session.refresh_from_db()
+                self.assertIsNotNone(get_cached_contents(self.session))
+
+                # when
+                mutate()
+
+                # then
+                self.session.refresh_from_db()
+                self.assertIsNone(get_cached_contents(self.session))
+                self.assertEqual(build_session_details(self.session, self.owner), self.get_session(self.session))
+
+        self.assertIsNotNone(get_cached_contents(other_session))
+
+    def test_details_of_deleted_session_were_not_served_for_new_one(self):
+        # given
+        self.get_session(self.session)
+        leave_session(self.session.id, request=self.make_request(self.owner))
+
+        # when
+        session = Session.objects.create(id=self.session.id, owner=self.player, players_number=1,
+                                         ready_players_number=0)
+        Player.objects.create(user=self.player, session=session)
+
+        # then
+        self.assertEqual(build_session_details(session, self.player), self.get_session(session))
+
+    def test_details_stored_by_other_process_for_previous_version_were_not_served(self):
+        # given
+        stale_session = Session.objects.get(id=self.session.id)
+        create_story(self.session.id, "summary", "description", request=self.make_request(self.owner))
+
+        # when
+        cache_contents(stale_session, build_session_contents(stale_session))
+
+        # then
+        self.session.refresh_from_db()
+        self.assertIsNone(get_cached_contents(self.session))
+        self.assertEqual(build_session_details(self.session, self.owner), self.get_session(self.session))
+
+    def test_redis_cache_was_configured_from_location(self):
+        # when
+        with mock.patch.dict(os.environ, {"SESSION_DETAILS_CACHE_LOCATION": "redis://cache:6379/1"}):
+            configured = runpy.run_module("planning_poker_backend.settings")["CACHES"]["session_details"]
+
+        # then
+        self.assertEqual("django.core.cache.backends.redis.RedisCache", configured["BACKEND"])
+        self.assertEqual("redis://cache:6379/1", configured["LOCATION"])
+        self.assertIsNone(configured["TIMEOUT"])
+
+    @skipUnless(os.environ.get("REDIS_TEST_LOCATION"), "Set REDIS_TEST_LOCATION to test against a Redis server")
+    def test_details_were_shared_through_redis(self):
+        # given
+        with override_settings(CACHES={**settings.CACHES, "session_details": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("REDIS_TEST_LOCATION"),
+            "TIMEOUT": None,
+        }}):
+            get_session_cache().clear()
+            self.get_session(self.session)
+
+            # when
+            contents = get_cached_contents(self.session)
+            create_story(self.session.id, "summary", "description", request=self.make_request(self.owner))
+
+            # then
+            self.assertEqual(build_session_contents(self.session), contents)
+            self.session.refresh_from_db()
+            self.assertIsNone(get_cached_contents(self.session))
+            get_session_cache().clear()
+
+    def test_least_recently_used_details_were_evicted_past_memory_cap(self):
+        # given
+        cache = BoundedLocMemCache("test-bounded-cache", {"OPTIONS": {"MAX_BYTES": 3000}})
+        cache.clear()
+        cache.set("first", "x" * 900)
+        cache.set("second", "x" * 900)
+        cache.set("third", "x" * 900)
+        cache.get("first")
+
+        # when
+        cache.set("fourth", "x" * 900)
+
+        # then
+        self.assertEqual(["first", "third", "fourth"], [key for key in ("first", "second", "third", "fourth")
+                                                        if cache.has_key(key)])
+        self.assertLessEqual(cache.total_size, 3000)
+
+
+class SessionDeltaTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.player, = self.create_session("player")
+        self.request = self.make_request(self.owner)
+        session_changed(self.session.id)
+
+    def version(self) -> int:
+        self.session.refresh_from_db()
+        return self.session.version
+
+    def get_session_delta(self, since_version: int) -> dict:
+        return get_session_delta(self.session.id, since_version, request=self.request)
+
+    @staticmethod
+    def apply(session_details_dto: dict, changes: dict) -> dict:
+        players = {player["username"]: player for player in session_details_dto["players"]}
+        stories = {story["id"]: {key: value for key, value in story.items() if key != "tasks"}
+                   for story in session_details_dto["stories"]}
+        tasks = {task["id"]: {**task, "story_id": story["id"]}
+                 for story in session_details_dto["stories"] for task in story["tasks"]}
+
+        for elements, part, key in ((players, "players", "username"), (stories, "stories", "id"),
+                                    (tasks, "tasks", "id")):
+            for removed in changes[part]["removed"]:
+                elements.pop(removed, None)
+
+            for changed in changes[part]["changed"]:
+                elements[changed[key]] = changed
+
+        return {**session_details_dto, "players": list(players.values()), "stories": [
+            {**story, "tasks": [{key: value for key, value in task.items() if key != "story_id"}
+                                for task in tasks.values() if task["story_id"] == story["id"]]}
+            for story in stories.values()
+        ]}
+
+    def test_only_changes_were_returned(self):
+        # given
+        since_version = self.version()
+        session_details_dto = build_session_details(self.session, self.owner)
+        story_id = create_story(self.session.id, "summary", "description " * 100, request=self.request)
+        create_task(story_id, "task", 3, request=self.request)
+        make_selection(self.session.id, 5, request=self.request)
+
+        # when
+        delta = self.get_session_delta(since_version)
+
+        # then
+        self.assertEqual(self.version(), delta["version"])
+        self.assertFalse(delta["full"])
+        self.assertEqual({"changed": [], "removed": []}, delta["changes"]["players"])
+        self.assertEqual([story_id], [story["id"] for story in delta["changes"]["stories"]["changed"]])
+        self.assertEqual([{"id": Task.objects.get().id, "summary": "task", "estimation": 3, "story_id": story_id}],
+                         delta["changes"]["tasks"]["changed"])
+        self.assertEqual(build_session_details(self.session, self.owner),
+                         {**self.apply(session_details_dto, delta["changes"]), "version": delta["version"]})
+
+    def test_removed_elements_were_listed(self):
+        # given
+        story_id = create_story(self.session.id, "summary", "description", request=self.request)
+        create_task(story_id, "task", None, request=self.request)
+        task_id = Task.objects.get().id
+        since_version = self.version()
+        session_details_dto = build_session_details(self.session, self.owner)
+        delete_story(story_id, request=self.request)
+
+        # when
+        delta = self.get_session_delta(since_version)
+
+        # then
+        self.session.refresh_from_db()
+        self.assertEqual([story_id], delta["changes"]["stories"]["removed"])
+        self.assertEqual([task_id], delta["changes"]["tasks"]["removed"])
+        self.assertEqual(build_session_details(self.session, self.owner),
+                         {**self.apply(session_details_dto, delta["changes"]), "version": delta["version"]})
+
+    def test_nothing_was_read_when_unchanged(self):
+        # given
+        since_version = self.version()
+        self.get_session_delta(since_version)
+
+        # when
+        with self.assertNumQueries(1):
+            delta = self.get_session_delta(since_version)
+
+        # then
+        self.assertEqual({"version": since_version, "full": False, "changes": {
+            part: {"changed": [], "removed": []} for part in ("players", "stories", "tasks")
+        }}, delta)
+
+    @override_settings(SESSION_CHANGE_LOG_LENGTH=2)
+    def test_full_details_were_returned_for_compacted_versions(self):
+        # given
+        since_version = self.version()
+
+        for summary in ("first", "second", "third"):
+            create_story(self.session.id, summary, "description", request=self.request)
+
+        # when
+        outdated_delta = self.get_session_delta(since_version)
+        recent_delta = self.get_session_delta(since_version + 1)
+        future_delta = self.get_session_delta(self.version() + 1)
+
+        # then
+        self.assertLess(SessionChange.objects.filter(session=self.session).count(), 2 * 2)
+        self.assertTrue(outdated_delta["full"])
+        self.assertEqual(build_session_details(self.session, self.owner), outdated_delta["session"])
+        self.assertFalse(recent_delta["full"])
+        self.assertEqual(["second", "third"],
+                         [story["summary"] for story in recent_delta["changes"]["stories"]["changed"]])
+        self.assertTrue(future_delta["full"])
+
+
+class SessionSummariesTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.owner = User.objects.create_user("owner")
+        self.player = User.objects.create_user("player")
+        self.sessions = Session.objects.bulk_create(
+            [Session(owner=self.owner if i % 2 else self.player, players_number=2, ready_players_number=i % 3)
+             for i in range(30)])
+        Player.objects.bulk_create([Player(user=user, session=session) for session in self.sessions
+                                    for user in (self.owner, self.player)])
+        Story.objects.bulk_create([Story(session=self.sessions[-1], summary="summary", description="description")
+                                   for _ in range(4)])
+        self.request = self.make_request(self.owner)
+
+    def test_sessions_were_summarized_in_one_query(self):
+        # given
+        session = self.sessions[-1]
+
+        # when
+        with self.assertNumQueries(1):
+            session_summary_dtos = get_sessions(limit=10, request=self.request)
+
+        # then
+        self.assertEqual(10, len(session_summary_dtos))
+        self.assertEqual({"id": session.id, "user_is_owner": True, "players_number": 2, "ready_players_number": 2,
+                          "stories_number": 4, "last_activity": session.last_activity.isoformat()},
+                         session_summary_dtos[0])
+        self.assertEqual(0, session_summary_dtos[1]["stories_number"])
+
+    def test_sessions_were_paginated_newest_first(self):
+        # given
+        pages = [get_sessions(limit=7, request=self.request)]
+
+        # when
+        while len(pages[-1]) == 7:
+            pages.append(get_sessions(pages[-1][-1]["id"], 7, request=self.request))
+
+        # then
+        self.assertEqual([7, 7, 7, 7, 2], [len(page) for page in pages])
+        self.assertEqual(sorted((session.id for session in self.sessions), reverse=True),
+                         [session_summary_dto["id"] for page in pages for session_summary_dto in page])
+
+    @override_settings(SESSIONS_PAGE_SIZE=3)
+    def test_page_size_was_capped(self):
+        # when
+        session_summary_dtos = get_sessions(limit=100, request=self.request)
+
+        # then
+        self.assertEqual(3, len(session_summary_dtos))
+
+
+class StoryImportTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.create_session()
+        self.request = self.make_request(self.owner)
+        self.client.force_login(self.owner)
+
+    def inserts(self, context: CaptureQueriesContext, table: str) -> int:
+        return sum(query["sql"].startswith(f'INSERT INTO "{table}"') for query in context.captured_queries)
+
+    @override_settings(IMPORT_BATCH_SIZE=100)
+    def test_stories_were_imported_with_bulk_inserts(self):
+        # given
+        stories = [{"summary": f"story {i}", "description": "description",
+                    "tasks": [{"summary": "task", "estimation": i % 5}, {"summary": "task"}]} for i in range(250)]
+        version = self.session.version
+
+        # when
+        with CaptureQueriesContext(connection) as context:
+            imported = import_stories(self.session.id, stories, request=self.request)
+
+        # then
+        self.assertEqual(3, self.inserts(context, "rpc_story"))
+        self.assertEqual(5, self.inserts(context, "rpc_task"))
+        self.assertEqual(list(Story.objects.filter(session=self.session).order_by("id").values_list("id", flat=True)),
+                         [story["id"] for story in imported])
+        self.assertEqual(list(Task.objects.filter(story_id=imported[7]["id"]).order_by("id")
+                              .values_list("id", flat=True)), imported[7]["tasks"])
+        self.assertEqual(2, Task.objects.get(id=imported[7]["tasks"][0]).estimation)
+        self.session.refresh_from_db()
+        self.assertEqual(version + 1, self.session.version)
+
+    def test_nothing_was_imported_when_a_story_was_malformed(self):
+        # given
+        stories = [{"summary": "story"}, {"summary": "story", "tasks": [{"estimation": 3}]}]
+
+        # when
+        with self.assertRaisesMessage(ValueError, "story 2, task 1: a task needs a summary"):
+            import_stories(self.session.id, stories, request=self.request)
+
+        # then
+        self.assertFalse(Story.objects.exists())
+
+    def test_csv_upload_was_imported(self):
+        # given
+        body = 'kind,summary,description,estimation\r\n' \
+               'story,Login,"Users log in\r\nwith a password",\r\n' \
+               'task,Form,,3\r\n' \
+               'task,Backend,,\r\n' \
+               'story,Logout,,\r\n'
+
+        # when
+        response = self.client.post(f"/import/{self.session.id}", body.encode(), content_type="text/csv")
+
+        # then
+        self.assertEqual(201, response.status_code)
+        session_details_dto = build_session_details(self.session, self.owner)
+        self.assertEqual([("Login", "Users log in\r\nwith a password", [("Form", 3), ("Backend", None)]),
+                          ("Logout", "", [])],
+                         [(story["summary"], story["description"],
+                           [(task["summary"], task["estimation"]) for task in story["tasks"]])
+                          for story in session_details_dto["stories"]])
+        self.assertEqual([story["id"] for story in session_details_dto["stories"]],
+                         [story["id"] for story in response.json()["stories"]])
+
+    def test_ndjson_upload_was_imported(self):
+        # given
+        body = "\n".join(json.dumps({"summary": f"story {i}", "tasks": [{"summary": "task", "estimation": 1}]})
+                         for i in range(20))
+
+        # when
+        response = self.client.post(f"/import/{self.session.id}", body, content_type="application/x-ndjson")
+
+        # then
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(20, Story.objects.filter(session=self.session).count())
+        self.assertEqual(20, Task.objects.filter(story__session=self.session).count())
+
+    def test_malformed_upload_was_rejected(self):
+        # given
+        body = '{"summary": "story"}\n{"summary": "story", "tasks": {}}\n'
+
+        # when
+        response = self.client.post(f"/import/{self.session.id}", body, content_type="application/x-ndjson")
+
+        # then
+        self.assertEqual(400, response.status_code)
+        self.assertEqual({"error": "line 2: tasks have to be a list"}, response.json())
+        self.assertFalse(Story.objects.exists())
+
+    def test_cant_import_when_not_in_session(self):
+        # given
+        self.client.force_login(User.objects.create_user("stranger"))
+
+        # when
+        response = self.client.post(f"/import/{self.session.id}", "", content_type="text/csv")
+
+        # then
+        self.assertEqual(403, response.status_code)
+
+
+class SessionExportTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.player, = self.create_session("player", ready_players_number=1, selection=5, voted=True)
+        self.stories = Story.objects.bulk_create([Story(session=self.session, summary=f"story {i}",
+                                                        description="description\nwith lines") for i in range(50)])
+        Task.objects.bulk_create([Task(story=story, summary="task", estimation=3) for story in self.stories])
+        self.client = AsyncClient()
+        self.client.force_login(self.owner)
+
+    async def export(self, query: str = "") -> tuple[list[str], str]:
+        response = await self.client.get(f"/export/{self.session.id}{query}")
+        self.assertEqual(200, response.status_code)
+        chunks = [chunk.decode() async for chunk in response.streaming_content]
+
+        return chunks, response["Content-Type"]
+
+    async def test_session_was_exported_as_ndjson(self):
+        # when
+        chunks, content_type = await self.export()
+
+        # then
+        records = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual("application/x-ndjson; charset=utf-8", content_type)
+        self.assertEqual(["session"] + ["player"] * 2 + ["story"] * 50 + ["task"] * 50,
+                         [record["record"] for record in records])
+        self.assertEqual({"record": "player", "username": "owner", "selection": None, "voted": True}, records[1])
+        self.assertEqual({"record": "story", "id": self.stories[0].id, "summary": "story 0",
+                          "description": "description\nwith lines"}, records[3])
+        self.assertEqual(self.stories[-1].id, records[-1]["story_id"])
+
+    async def test_session_was_exported_as_csv(self):
+        # given
+        await Player.objects.filter(user=self.player).aupdate(selection=8, voted=True)
+        await Session.objects.filter(id=self.session.id).aupdate(ready_players_number=2)
+
+        # when
+        chunks, content_type = await self.export("?format=csv")
+
+        # then
+        rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+        self.assertEqual("text/csv; charset=utf-8", content_type)
+        self.assertEqual(103, len(rows))
+        self.assertEqual(["5", "8"], [row["selection"] for row in rows if row["record"] == "player"])
+        self.assertEqual("description\nwith lines", rows[3]["description"])
+        self.assertEqual("3", rows[-1]["estimation"])
+
+    @override_settings(EXPORT_CHUNK_SIZE=10, EXPORT_BUFFER_SIZE=1024)
+    async def test_session_was_streamed_in_chunks(self):
+        # when
+        chunks, _ = await self.export()
+
+        # then
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(len(chunk) < 2 * 1024 for chunk in chunks))
+
+    async def test_cant_export_when_not_in_session(self):
+        # given
+        await Player.objects.filter(user=self.owner).adelete()
+
+        # when
+        response = await self.client.get(f"/export/{self.session.id}")
+
+        # then
+        self.assertEqual(403, response.status_code)
+
+
+class VoteRoundsTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.player, = self.create_session("player")
+        self.story = Story.objects.create(session=self.session, summary="story", description="description")
+        self.requests = {user: self.make_request(user) for user in (self.owner, self.player)}
+
+    def vote(self, user: User, selection: int):
+        make_selection(self.session.id, selection, request=self.requests[user])
+
+    def recorded(self) -> list[tuple[int, int | None, str, int]]:
+        return list(Vote.objects.filter(round__session=self.session).order_by("round__number", "user__username")
+                    .values_list("round__number", "round__story_id", "user__username", "value"))
+
+    def test_round_was_recorded_when_votes_were_revealed(self):
+        # given
+        set_current_story(self.session.id, self.story.id, request=self.requests[self.owner])
+        self.vote(self.owner, 3)
+        self.assertEqual([], self.recorded())
+
+        # when
+        self.vote(self.player, 5)
+
+        # then
+        self.assertEqual([(1, self.story.id, "owner", 3), (1, self.story.id, "player", 5)], self.recorded())
+
+    def test_votes_were_added_when_revealed_again_in_the_same_round(self):
+        # given
+        self.vote(self.owner, 3)
+        force_selections(self.session.id, request=self.requests[self.owner])
+        self.assertEqual([(1, None, "owner", 3)], self.recorded())
+
+        # when
+        self.vote(self.player, 8)
+
+        # then
+        self.assertEqual(1, VoteRound.objects.filter(session=self.session).count())
+        self.assertEqual([(1, None, "owner", 3), (1, None, "player", 8)], self.recorded())
+
+    def test_next_round_started_when_revealed_votes_were_reset(self):
+        # given
+        self.vote(self.owner, 3)
+        self.vote(self.player, 5)
+
+        # when
+        reset_selection(self.session.id, request=self.requests[self.owner])
+        reset_selection(self.session.id, request=self.requests[self.player])
+        self.vote(self.owner, 5)
+        self.vote(self.player, 5)
+
+        # then
+        self.session.refresh_from_db()
+        self.assertEqual(2, self.session.round)
+        self.assertEqual([(1, None, "owner", 3), (1, None, "player", 5), (2, None, "owner", 5), (2, None, "player", 5)],
+                         self.recorded())
+
+    def test_next_round_started_when_a_player_joined_after_the_reveal(self):
+        # given
+        latecomer = User.objects.create_user("latecomer")
+        self.requests[latecomer] = self.make_request(latecomer)
+        self.vote(self.owner, 3)
+        self.vote(self.player, 5)
+        join_session(self.session.id, request=self.requests[latecomer])
+
+        # when
+        reset_selection(self.session.id, request=self.requests[self.owner])
+        reset_selection(self.session.id, request=self.requests[self.player])
+
+        for user in (self.owner, self.player, latecomer):
+            self.vote(user, 8)
+
+        # then
+        self.assertEqual([(1, None, "owner", 3), (1, None, "player", 5), (2, None, "latecomer", 8),
+                          (2, None, "owner", 8), (2, None, "player", 8)], self.recorded())
+
+    def test_recorded_votes_were_kept_when_their_player_left(self):
+        # given
+        self.vote(self.owner, 3)
+        self.vote(self.player, 5)
+
+        # when
+        leave_session(self.session.id, request=self.requests[self.player])
+
+        # then
+        self.assertEqual([(1, None, "owner", 3), (1, None, "player", 5)], self.recorded())
+
+    def test_recorded_rounds_were_kept_when_the_session_was_deleted(self):
+        # given
+        set_current_story(self.session.id, self.story.id, request=self.requests[self.owner])
+        self.vote(self.owner, 3)
+        self.vote(self.player, 5)
+
+        # when
+        leave_session(self.session.id, request=self.requests[self.owner])
+
+        # then
+        self.assertFalse(Session.objects.filter(id=self.session.id).exists())
+        self.assertEqual([(None, None, 1, "owner", 3), (None, None, 1, "player", 5)],
+                         list(Vote.objects.order_by("user__username").values_list(
+                             "round__session_id", "round__story_id", "round__number", "user__username", "value")))
+
+    def test_revealed_round_was_moved_to_the_new_current_story(self):
+        # given
+        self.vote(self.owner, 3)
+        self.vote(self.player, 5)
+
+        # when
+        set_current_story(self.session.id, self.story.id, request=self.requests[self.owner])
+
+        # then
+        self.assertEqual([(1, self.story.id, "owner", 3), (1, self.story.id, "player", 5)], self.recorded())
+
+    def test_cant_set_current_story_of_another_session(self):
+        # given
+        other_session = Session.objects.create(owner=self.player, players_number=0, ready_players_number=0)
+        other_story = Story.objects.create(session=other_session, summary="story", description="description")
+
+        # when
+        with self.assertRaises(Story.DoesNotExist):
+            set_current_story(self.session.id, other_story.id, request=self.requests[self.owner])
+
+        # then
+        self.session.refresh_from_db()
+        self.assertIsNone(self.session.current_story_id)
+
+    def test_estimation_statistics_were_returned(self):
+        # given
+        set_current_story(self.session.id, self.story.id, request=self.requests[self.owner])
+        self.vote(self.owner, 3)
+        self.vote(self.player, 8)
+
+        # when
+        statistics = get_estimation_statistics(self.session.id, request=self.requests[self.player])
+
+        # then
+        self.assertEqual([{"story_id": self.story.id, "votes": 2, "mean": 5.5, "median": 5.5, "spread": 2.5,
+                           "minimum": 3, "maximum": 8, "agreement": 0.5, "consensus": False, "outliers": 0}],
+                         statistics["stories"])
+        self.assertEqual([{"username": "owner", "votes": 1, "bias": -2.5, "deviation": 2.5, "outlier_rate": 0.0},
+                          {"username": "player", "votes": 1, "bias": 2.5, "deviation": 2.5, "outlier_rate": 0.0}],
+                         statistics["players"])
+        json.dumps(statistics)
+
+    def test_votes_were_loaded_ordered_by_round(self):
+        # given
+        self.vote(self.owner, 3)
+        self.vote(self.player, 5)
+        reset_selection(self.session.id, request=self.requests[self.owner])
+        reset_selection(self.session.id, request=self.requests[self.player])
+        set_current_story(self.session.id, self.story.id, request=self.requests[self.owner])
+        self.vote(self.owner, 8)
+        self.vote(self.player, 13)
+        first_round, second_round = VoteRound.objects.order_by("id").values_list("id", flat=True)
+        player_id = self.player.id
+        self.player.delete()
+
+        # when
+        votes = load_votes(Vote.objects.filter(round__session=self.session))
+
+        # then
+        self.assertEqual([first_round, first_round, second_round, second_round], votes.rounds.tolist())
+        self.assertEqual({(first_round, MISSING, self.owner.id, 3), (first_round, MISSING, MISSING, 5),
+                          (second_round, self.story.id, self.owner.id, 8), (second_round, self.story.id, MISSING, 13)},
+                         set(zip(votes.rounds.tolist(), votes.stories.tolist(), votes.users.tolist(),
+                                 votes.values.tolist())))
+        self.assertNotIn(player_id, votes.users.tolist())
+
+    def test_team_statistics_covered_every_session_of_the_calling_user(self):
+        # given
+        outsider = User.objects.create_user("outsider")
+        self.vote(self.owner, 3)
+        self.vote(self.player, 8)
+        leave_session(self.session.id, request=self.requests[self.owner])
+
+        for players, votes in (([self.player, outsider], [5, 5]), ([self.owner, self.player, outsider], [1, 2, 3])):
+            session = Session.objects.create(owner=players[0], players_number=len(players), ready_players_number=0)
+            Player.objects.bulk_create(Player(user=user, session=session) for user in players)
+
+            for user, selection in zip(players, votes):
+                self.call_procedure(make_selection, user, session.id, selection)
+
+        # when
+        statistics = get_team_statistics(["player", "unknown"], request=self.requests[self.owner])
+
+        # then
+        self.assertEqual([{"username": "owner", "votes": 2, "bias": -1.75, "deviation": 1.75, "outlier_rate": 0.0},
+                          {"username": "player", "votes": 2, "bias": 1.25, "deviation": 1.25, "outlier_rate": 0.0}],
+                         statistics["players"])
+
+
+class GroupStatisticsTestCase(SimpleTestCase):
+    def test_statistics_match_numpy(self):
+        # given
+        generator = np.random.default_rng(0)
+        keys = generator.integers(-1, 40, 3000)
+        values = generator.choice([-1, 0, 1, 2, 3, 5, 8, 13, 21, 100], 3000)
+
+        for sort in (False, True):
+            with self.subTest(sorted_keys=sort):
+                if sort:
+                    order = np.argsort(keys, kind="stable")
+                    keys, values = keys[order], values[order]
+
+                # when
+                statistics = group_statistics(keys, values)
+
+                # then
+                self.assertEqual(np.unique(keys).tolist(), statistics.keys.tolist())
+
+                for index, key in enumerate(statistics.keys):
+                    group = values[keys == key]
+                    first_quartile, third_quartile = np.quantile(group, [0.25, 0.75])
+                    fence = (third_quartile - first_quartile) * 1.5
+                    outliers = (group < first_quartile - fence) | (group > third_quartile + fence)
+
+                    self.assertEqual(len(group), statistics.counts[index])
+                    self.assertAlmostEqual(group.mean(), statistics.mean[index])
+                    self.assertAlmostEqual(np.median(group), statistics.median[index])
+                    self.assertAlmostEqual(group.std(), statistics.spread[index])
+                    self.assertEqual(np.unique(group, return_counts=True)[1].max() / len(group),
+                                     statistics.agreement[index])
+                    self.assertEqual(outliers.tolist(), statistics.outlier_mask[keys == key].tolist())
+                    self.assertEqual(outliers.sum(), statistics.outliers[index])
+
+
+class VoteResultsTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        first, second = self.create_session("first", "second")
+        self.users = [self.owner, first, second]
+        self.requests = [self.make_request(user) for user in self.users]
+
+    def aggregations(self, context: CaptureQueriesContext) -> int:
+        return sum('GROUP BY "rpc_player"."selection"' in query["sql"] for query in context.captured_queries)
+
+    def test_results_were_included_once_revealed(self):
+        # given
+        make_selection(self.session.id, 3, request=self.requests[0])
+        make_selection(self.session.id, 5, request=self.requests[1])
+        self.assertNotIn("results", get_session(self.session.id, request=self.requests[0]))
+
+        # when
+        make_selection(self.session.id, 5, request=self.requests[2])
+
+        # then
+        self.assertEqual({"histogram": [{"selection": 3, "count": 1}, {"selection": 5, "count": 2}], "minimum": 3,
+                          "maximum": 5, "average": 13 / 3, "consensus": False},
+                         get_session(self.session.id, request=self.requests[1])["results"])
+
+    def test_results_were_computed_in_one_aggregate_query(self):
+        # given
+        make_selection(self.session.id, 8, request=self.requests[0])
+        make_selection(self.session.id, 8, request=self.requests[1])
+        self.session.refresh_from_db()
+
+        # when
+        with CaptureQueriesContext(connection) as context:
+            force_selections(self.session.id, request=self.requests[0])
+
+        # then
+        results = get_session(self.session.id, request=self.requests[2])["results"]
+        self.assertEqual({"histogram": [{"selection": 8, "count": 2}], "minimum": 8, "maximum": 8, "average": 8,
+                          "consensus": True}, results)
+        # The snapshot reuses the results of the event revealing the votes.
+        self.assertEqual(1, self.aggregations(context))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(results, build_vote_results(self.session))
+
+    def test_revealing_selection_read_session_and_players_once(self):
+        # given
+        make_selection(self.session.id, 3, request=self.requests[0])
+        make_selection(self.session.id, 5, request=self.requests[1])
+
+        # when
+        with CaptureQueriesContext(connection) as context:
+            make_selection(self.session.id, 5, request=self.requests[2])
+
+        # then
+        queries = [query["sql"] for query in context.captured_queries]
+        self.assertEqual(1, sum(query.startswith('SELECT "rpc_session"') for query in queries))
+        self.assertEqual(1, sum('INNER JOIN "auth_user"' in query for query in queries))
+        self.assertEqual(1, self.aggregations(context))
+        self.assertEqual(build_session_details(Session.objects.get(id=self.session.id), self.users[0]),
+                         get_session(self.session.id, request=self.requests[0]))
+
+    def test_results_were_kept_until_a_selection_changed(self):
+        # given
+        for request, selection in zip(self.requests, (1, 2, 3)):
+            make_selection(self.session.id, selection, request=request)
+
+        version = Session.objects.get(id=self.session.id).version
+
+        # when
+        with CaptureQueriesContext(connection) as context:
+            create_story(self.session.id, "story", "description", request=self.requests[0])
+
+        reset_selection(self.session.id, request=self.requests[1])
+
+        # then
+        self.assertEqual(0, self.aggregations(context))
+        self.assertNotIn("results", get_session(self.session.id, request=self.requests[0]))
+        delta = get_session_delta(self.session.id, version - 1, request=self.requests[0])
+        self.assertIsNone(delta["changes"]["results"])
+
+
+class JsonRpcBatchTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.create_session()
+        self.client.force_login(self.owner)
+
+    def call_batch(self, *calls: tuple) -> list[dict]:
+        response = self.client.post("/", json.dumps([
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": i} for i, (method, *params) in enumerate(calls)
+        ]), content_type="application/json")
+
+        return response.json()
+
+    def test_batched_calls_were_answered_in_order(self):
+        # when
+        responses = self.call_batch(("make_selection", self.session.id, 5), ("get_session", self.session.id))
+
+        # then
+        self.assertEqual([0, 1], [response.get("id") for response in responses])
+        self.assertEqual(None, responses[0].get("result"))
+        self.assertEqual([{"username": "owner", "selection": 5}], responses[1].get("result").get("players"))
+
+    def test_membership_was_looked_up_once_per_batch(self):
+        # when
+        with CaptureQueriesContext(connection) as queries:
+            responses = self.call_batch(*[("create_story", self.session.id, f"story {i}", "") for i in range(3)],
+                                        ("get_session", self.session.id))
+
+        # then
+        self.assertTrue(all("error" not in response for response in responses))
+        self.assertEqual(1, len([query for query in queries
+                                 if f'"rpc_player"."user_id" = {self.owner.id}' in query["sql"]]))
+        self.assertEqual(3, len(responses[3].get("result").get("stories")))
+
+    def test_membership_was_forgotten_after_leaving_in_batch(self):
+        # given
+        player = User.objects.create_user("player")
+        Player.objects.create(user=player, session=self.session)
+        Session.objects.filter(id=self.session.id).update(players_number=2)
+        self.client.force_login(player)
+
+        # when
+        with self.assertLogs("modernrpc", "WARNING"):
+            responses = self.call_batch(("get_session", self.session.id), ("leave_session", self.session.id),
+                                        ("get_session", self.session.id))
+
+        # then
+        self.assertNotIn("error", responses[0])
+        self.assertNotIn("error", responses[1])
+        self.assertIn("error", responses[2])
+
+
+class MembershipTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.player, = self.create_session("player")
+        self.stranger = User.objects.create_user("stranger")
+        self.story = Story.objects.create(session=self.session, summary="summary", description="")
+        self.task = Task.objects.create(story=self.story, summary="summary", estimation=None)
+
+    def tearDown(self) -> None:
+        membership._process_memberships.clear()
+
+    def test_task_and_its_story_were_resolved_in_one_query(self):
+        # when
+        with self.assertNumQueries(1):
+            task = membership.get_player_task(self.make_request(self.player), self.task.id)
+            session_id = task.story.session_id
+
+        # then
+        self.assertEqual(self.session.id, session_id)
+
+    def test_cant_resolve_story_or_task_when_not_in_session(self):
+        # when
+        request = self.make_request(self.stranger)
+
+        # then
+        with self.assertRaises(Story.DoesNotExist):
+            membership.get_player_story(request, self.story.id)
+
+        with self.assertRaises(Task.DoesNotExist):
+            membership.get_player_task(request, self.task.id)
+
+    def test_membership_was_looked_up_in_every_request_without_ttl(self):
+        # given
+        membership.check_membership(self.make_request(self.player), self.session.id)
+
+        # then
+        with self.assertNumQueries(1):
+            membership.check_membership(self.make_request(self.player), self.session.id)
+
+    @override_settings(SESSION_MEMBERSHIP_CACHE_TTL=60)
+    def test_membership_was_remembered_across_requests_until_player_left(self):
+        # given
+        membership.check_membership(self.make_request(self.player), self.session.id)
+
+        with self.assertNumQueries(0):
+            membership.check_membership(self.make_request(self.player), self.session.id)
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            leave_session(self.session.id, request=self.make_request(self.player))
+
+        # then
+        with self.assertNumQueries(1), self.assertRaises(Player.DoesNotExist):
+            membership.check_membership(self.make_request(self.player), self.session.id)
+
+    @override_settings(SESSION_MEMBERSHIP_CACHE_TTL=60)
+    def test_memberships_were_forgotten_when_other_process_reported_leaving(self):
+        # given
+        membership.check_membership(self.make_request(self.owner), self.session.id)
+
+        # when
+        deliver(self.session.id, [{"type": "session_deleted", "version": None, "data": {}}])
+
+        # then
+        with self.assertNumQueries(1):
+            membership.check_membership(self.make_request(self.owner), self.session.id)
+
+
+class QueryPlanTestCase(SessionTestMixin, TestCase):
+    SESSIONS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        cls.player = User.objects.create_user("player")
+        cls.newcomer = User.objects.create_user("newcomer")
+
+        # Every other session has a player, a story and a task of its own, so that none of them fits in a page or two.
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO rpc_session (owner_id, players_number, ready_players_number, version, last_activity,
+                                         round)
+                WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers WHERE n < {cls.SESSIONS})
+                SELECT %s, 1, 0, 0, CURRENT_TIMESTAMP, 1 FROM numbers
+            """, [cls.player.id])
+            cursor.execute("INSERT INTO rpc_player (user_id, session_id, voted) "
+                           "SELECT owner_id, id, %s FROM rpc_session", [False])
+            cursor.execute("INSERT INTO rpc_story (session_id, summary, description) "
+                           "SELECT id, '', '' FROM rpc_session")
+            cursor.execute("INSERT INTO rpc_task (story_id, summary) SELECT id, '' FROM rpc_story")
+
+            if connection.vendor == "postgresql":
+                cursor.execute("ANALYZE")
+
+        cls.session = Session.objects.create(owner=cls.owner, players_number=2, ready_players_number=0)
+        Player.objects.create(user=cls.owner, session=cls.session)
+        Player.objects.create(user=cls.player, session=cls.session)
+        cls.story = Story.objects.create(session=cls.session, summary="summary", description="description")
+        cls.task = Task.objects.create(story=cls.story, summary="summary", estimation=None)
+
+    @staticmethod
+    def full_scans(sql: str) -> list[str]:
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+                return [step for step in plan if step.startswith("SCAN ")]
+
+            cursor.execute(f"EXPLAIN {sql}")
+            plan = [row[0] for row in cursor.fetchall()]
+            return [step.strip() for step in plan if "Seq Scan" in step]
+
+    def assert_no_full_scans(self, procedure: Callable, user: User, *args):
+        with CaptureQueriesContext(connection) as context:
+            self.call_procedure(procedure, user, *args)
+
+        for query in context.captured_queries:
+            if query["sql"].startswith(("SELECT", "UPDATE", "DELETE")):
+                with self.subTest(procedure=procedure.__name__, sql=query["sql"]):
+                    self.assertEqual([], self.full_scans(query["sql"]))
+
+    def test_hot_procedures_use_indexes(self):
+        self.assert_no_full_scans(get_session, self.player, self.session.id)
+        self.assert_no_full_scans(get_session_if_changed, self.player, self.session.id, -1)
+        self.assert_no_full_scans(get_sessions, self.owner)
+        self.assert_no_full_scans(get_selection, self.player, self.session.id)
+        self.assert_no_full_scans(make_selection, self.player, self.session.id, 3)
+        self.assert_no_full_scans(reset_selection, self.player, self.session.id)
+        self.assert_no_full_scans(force_selections, self.owner, self.session.id)
+        self.assert_no_full_scans(create_story, self.player, self.session.id, "summary", "description")
+        self.assert_no_full_scans(update_story, self.player, self.story.id, "summary", "description")
+        self.assert_no_full_scans(create_task, self.player, self.story.id, "summary", 3)
+        self.assert_no_full_scans(update_task, self.player, self.task.id, "summary", 5)
+        self.assert_no_full_scans(join_session, self.newcomer, self.session.id)
+        self.assert_no_full_scans(leave_session, self.newcomer, self.session.id)
+        self.assert_no_full_scans(delete_task, self.player, self.task.id)
+        self.assert_no_full_scans(delete_story, self.player, self.story.id)
+
+
+class SqliteConnectionTestCase(TestCase):
+    def test_pragmas_were_applied_to_new_connection(self):
+        # given
+        if connection.vendor != "sqlite":
+            self.skipTest("Only SQLite connections are tuned")
+
+        # when
+        with connection.cursor() as cursor:
+            pragmas = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                       for name in ("journal_mode", "busy_timeout", "synchronous")}
+
+        # then
+        self.assertEqual({"journal_mode": "wal", "busy_timeout": 20000, "synchronous": 1}, pragmas)
+
+
+class HealthTestCase(TestCase):
+    def test_health_was_reported(self):
+        # when
+        response = self.client.get("/health")
+
+        # then
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"status": "ok"}, response.json())
+
+
+class MetricsTestCase(SessionTestMixin, TestCase):
+    def setUp(self) -> None:
+        self.create_session()
+        self.client.force_login(self.owner)
+        metrics.reset_metrics()
+
+    def tearDown(self) -> None:
+        metrics.reset_metrics()
+
+    def post(self, method: str, *params) -> HttpResponse:
+        return self.client.post("/", json.dumps({"jsonrpc": "2.0", "method": method, "params": list(params), "id": 1}),
+                                content_type="application/json")
+
+    def call(self, method: str, *params) -> dict:
+        return self.post(method, *params).json()
+
+    def test_call_was_measured(self):
+        # when
+        response = self.post("get_session", self.session.id)
+
+        # then
+        recorded = metrics.get_metrics()["get_session"]
+        self.assertEqual(1, recorded.calls)
+        self.assertEqual(0, recorded.errors)
+        # Reading the logged-in user, the membership, the missing snapshot and the session details
+        self.assertEqual(7, recorded.queries)
+        self.assertEqual(len(response.content), recorded.response_bytes)
+        self.assertGreater(recorded.duration, recorded.database_time)
+        self.assertEqual(1, sum(recorded.duration_buckets))
+
+    def test_xml_rpc_response_was_measured_as_sent(self):
+        # when
+        response = self.client.post("/", xmlrpc_dumps((self.session.id,), "get_selection"),
+                                    content_type="text/xml")
+
+        # then
+        self.assertIn(b"<methodResponse>", response.content)
+        self.assertEqual(len(response.content), metrics.get_metrics()["get_selection"].response_bytes)
+
+    def test_batch_response_was_shared_by_its_calls(self):
+        # when
+        response = self.client.post("/", json.dumps([
+            {"jsonrpc": "2.0", "method": "get_selection", "params": [self.session.id], "id": 1},
+            {"jsonrpc": "2.0", "method": "get_session", "params": [self.session.id], "id": 2}
+        ]), content_type="application/json")
+
+        # then
+        recorded = metrics.get_metrics()
+        self.assertEqual(len(response.content),
+                         recorded["get_selection"].response_bytes + recorded["get_session"].response_bytes)
+        self.assertLessEqual(abs(recorded["get_selection"].response_bytes - recorded["get_session"].response_bytes), 1)
+
+    def test_failed_call_was_counted(self):
+        # when
+        self.call("get_session", self.session.id + 1)
+
+        # then
+        self.assertEqual(1, metrics.get_metrics()["get_session"].errors)
+
+    async def test_async_call_queries_were_counted(self):
+        # given
+        client = AsyncClient()
+        client.cookies = self.client.cookies
+
+        # when
+        response = await client.post("/async/", json.dumps({"jsonrpc": "2.0", "method": "get_selection",
+                                                             "params": [self.session.id], "id": 1}),
+                                     content_type="application/json")
+
+        # then
+        self.assertIn("result", response.json())
+        # Reading the logged-in user and the player's selection
+        self.assertEqual(3, metrics.get_metrics()["get_selection"].queries)
+
+    def test_metrics_were_exported(self):
+        # given
+        self.call("get_session", self.session.id)
+
+        # when
+        response = self.client.get("/metrics")
+
+        # then
+        worker = f'worker="{os.getpid()}"'
+        self.assertEqual(200, response.status_code)
+        self.assertIn(f'planning_poker_rpc_calls_total{{{worker},procedure="get_session"}} 1\n',
+                      response.content.decode())
+        self.assertIn(f'planning_poker_rpc_duration_seconds_count{{{worker},procedure="get_session"}} 1\n',
+                      response.content.decode())
+        self.assertIn(f'planning_poker_session_cache_misses_total{{{worker}}} 1\n', response.content.decode())
+
+    @override_settings(RPC_METRICS_TOKEN="secret")
+    def test_metrics_required_token(self):
+        # when
+        missing = self.client.get("/metrics")
+        wrong = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer guess")
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+
+        # then
+        self.assertEqual(403, missing.status_code)
+        self.assertEqual(403, wrong.status_code)
+        self.assertEqual(200, response.status_code)
+
+    @override_settings(RPC_METRICS_ENABLED=False)
+    def test_nothing_was_recorded_when_disabled(self):
+        # when
+        self.call("get_session", self.session.id)
+        response = self.client.get("/metrics")
+
+        # then
+        self.assertEqual({}, metrics.get_metrics())
+        self.assertEqual(404, response.status_code)
+
+
+@profiled
+def slow_procedure(items: list, **kwargs):
+    time.sleep(0.05)
+
+
+@profiled
+async def slow_async_procedure(items: list, **kwargs):
+    await sync_to_async(time.sleep, thread_sensitive=False)(0.05)
+
+
+class ProfilingTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.request = HttpRequest()
+        self.request.user = User(id=7)
+        self.settings_override = override_settings(RPC_PROFILING_ENABLED=True, RPC_PROFILING_SAMPLE_RATE=0,
+                                                   RPC_PROFILING_SLOW_CALL=0.04, RPC_PROFILING_INTERVAL=0.001,
+                                                   RPC_PROFILING_DIRECTORY=self.directory.name)
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def profiles(self) -> list[Path]:
+        return sorted(Path(self.directory.name).glob("*.json"))
+
+    def test_slow_call_was_saved(self):
+        # when
+        slow_procedure([1, 2, 3], **{REQUEST_KEY: self.request})
+
+        # then
+        [path] = self.profiles()
+        profile = json.loads(path.read_text())
+        self.assertEqual("slow_procedure", profile["procedure"])
+        self.assertEqual(["list[3]"], profile["params"])
+        self.assertEqual(7, profile["user_id"])
+        self.assertEqual("slow", profile["reason"])
+        self.assertTrue(all(stack.endswith(f"{__name__}.slow_procedure") for stack in profile["stacks"]))
+
+    def test_slow_async_call_was_saved_with_what_it_awaited(self):
+        # when
+        asyncio.run(slow_async_procedure([1], **{REQUEST_KEY: self.request}))
+
+        # then
+        [path] = self.profiles()
+        profile = json.loads(path.read_text())
+        self.assertEqual("slow_async_procedure", profile["procedure"])
+        self.assertEqual("slow", profile["reason"])
+        self.assertIn(f"{__name__}.slow_async_procedure;asgiref.sync.SyncToAsync.__call__;asyncio.tasks.wait_for;"
+                      "<FutureIter>", profile["stacks"])
+
+    @override_settings(RPC_PROFILING_SLOW_CALL=1)
+    def test_fast_call_was_not_saved(self):
+        # when
+        slow_procedure([], **{REQUEST_KEY: self.request})
+
+        # then
+        self.assertEqual([], self.profiles())
+
+    @override_settings(RPC_PROFILING_MAX_FILES=2)
+    def test_oldest_profiles_were_deleted(self):
+        # when
+        for _ in range(3):
+            slow_procedure([], **{REQUEST_KEY: self.request})
+
+        # then
+        self.assertEqual(2, len(self.profiles()))
+
+    def test_profile_was_exported_as_folded_stacks(self):
+        # given
+        slow_procedure([], **{REQUEST_KEY: self.request})
+        output = io.StringIO()
+
+        # when
+        call_command("export_profile", stdout=output, stderr=io.StringIO())
+
+        # then
+        self.assertRegex(output.getvalue(), rf"^{re.escape(__name__)}\.slow_procedure \d+$")
+
+
+class LongPollingTestCase(SessionTestMixin, TransactionTestCase):
+    def setUp(self) -> None:
+        self.create_session()
+        self.client = AsyncClient()
+        self.client.force_login(self.owner)
+
+    async def wait_for_session_change(self, known_version: int, timeout: float) -> dict:
+        response = await self.client.post("/async/", json.dumps({
+            "jsonrpc": "2.0",
+            "method": "wait_for_session_change",
+            "params": [self.session.id, known_version, timeout],
+            "id": 1
+        }), content_type="application/json")
+
+        return response.json()
+
+    async def test_unchanged_session_was_returned_after_timeout(self):
+        # when
+        response = await self.wait_for_session_change(self.session.version, 0.1)
+
+        # then
+        self.assertEqual({"version": self.session.version, "changed": False}, response.get("result"))
+
+    async def test_session_was_returned_immediately_when_version_is_outdated(self):
+        # when
+        response = await self.wait_for_session_change(self.session.version - 1, 10)
+
+        # then
+        self.assertTrue(response.get("result").get("changed"))
+        self.assertEqual(self.session.id, response.get("result").get("session").get("id"))
+
+    @override_settings(SESSION_CHANGE_POLL_INTERVAL=30)
+    async def test_waiting_request_was_woken_up_by_change(self):
+        # given
+        started = time.monotonic()
+        waiting = asyncio.ensure_future(self.wait_for_session_change(self.session.version, 10))
+        await asyncio.sleep(0.2)
+
+        # when
+        await sync_to_async(session_changed)(self.session.id)
+        response = await waiting
+
+        # then
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(response.get("result").get("changed"))
+        self.assertEqual(self.session.version + 1, response.get("result").get("version"))
+
+    async def test_cant_wait_for_session_when_not_in_session(self):
+        # given
+        await sync_to_async(Player.objects.filter(user=self.owner).delete)()
+
+        # when
+        response = await self.wait_for_session_change(self.session.version, 0.1)
+
+        # then
+        self.assertIn("error", response)
+
+
+class AsyncProceduresTestCase(SessionTestMixin, TransactionTestCase):
+    def setUp(self) -> None:
+        self.player, = self.create_session("player", ready_players_number=1, selection=3, voted=True)
+        story = Story.objects.create(session=self.session, summary="summary", description="description")
+        Task.objects.create(story=story, summary="task", estimation=5)
+        self.client = AsyncClient()
+        self.client.force_login(self.owner)
+
+    async def call(self, payload) -> dict | list:
+        response = await self.client.post("/async/", json.dumps(payload), content_type="application/json")
+
+        return response.json()
+
+    async def call_method(self, method: str, *params) -> dict:
+        return await self.call({"jsonrpc": "2.0", "method": method, "params": list(params), "id": 1})
+
+    async def test_async_get_session_matched_sync_version(self):
+        # given
+        expected = await sync_to_async(build_session_details)(self.session, self.owner)
+
+        # when
+        response = await self.call_method("get_session", self.session.id)
+
+        # then
+        self.assertEqual(expected, response.get("result"))
+
+    async def test_async_get_sessions_returned_users_sessions(self):
+        # given
+        session = await Session.objects.aget(id=self.session.id)
+
+        # when
+        response = await self.call_method("get_sessions")
+
+        # then
+        self.assertEqual([{"id": self.session.id, "user_is_owner": True, "players_number": 2, "ready_players_number": 1,
+                           "stories_number": 1, "last_activity": session.last_activity.isoformat()}],
+                         response.get("result"))
+
+    async def test_async_get_selection_returned_users_selection(self):
+        # when
+        response = await self.call_method("get_selection", self.session.id)
+
+        # then
+        self.assertEqual(3, response.get("result"))
+
+    async def test_cant_get_session_when_not_in_session(self):
+        # given
+        await Player.objects.filter(user=self.owner).adelete()
+
+        # when
+        response = await self.call_method("get_session", self.session.id)
+
+        # then
+        self.assertIn("error", response)
+
+    async def test_anonymous_user_cant_get_sessions(self):
+        # given
+        self.client = AsyncClient()
+
+        # when
+        response = await self.call_method("get_sessions")
+
+        # then
+        self.assertIn("error", response)
+
+    async def test_wrong_arguments_were_reported_as_invalid_params(self):
+        # when
+        response = await self.call_method("get_session", self.session.id, "unexpected")
+
+        # then
+        self.assertEqual(RPC_INVALID_PARAMS, response["error"]["code"])
+
+    async def test_type_error_inside_procedure_was_reported_as_internal_error(self):
+        # when
+        with mock.patch("rpc.async_procedures.aget_session_details", side_effect=TypeError("bug")):
+            response = await self.call_method("get_session", self.session.id)
+
+        # then
+        self.assertEqual({"code": RPC_INTERNAL_ERROR, "message": "bug"}, response["error"])
+
+    async def test_batch_mixed_async_and_sync_procedures(self):
+        # when
+        response = await self.call([
+            {"jsonrpc": "2.0", "method": "reset_selection", "params": [self.session.id], "id": 1},
+            {"jsonrpc": "2.0", "method": "get_selection", "params": [self.session.id], "id": 2},
+            {"jsonrpc": "2.0", "method": "no_such_method", "id": 3}
+        ])
+
+        # then
+        self.assertEqual([1, 2, 3], [item.get("id") for item in response])
+        self.assertIsNone(response[0].get("result"))
+        self.assertIsNone(response[1].get("result"))
+        self.assertIn("error", response[2])
+
+    async def test_notifications_were_not_answered(self):
+        # when
+        responses = [await self.client.post("/async/", json.dumps(payload), content_type="application/json")
+                     for payload in ({"jsonrpc": "2.0", "method": "get_sessions", "params": []},
+                                     {"jsonrpc": "2.0", "method": "no_such_method"},
+                                     [{"jsonrpc": "2.0", "method": "get_sessions"}])]
+
+        # then
+        self.assertEqual([b"", b"", b""], [response.content for response in responses])
+
+    async def test_notifications_were_made_but_left_out_of_batch_response(self):
+        # when
+        response = await self.call([
+            {"jsonrpc": "2.0", "method": "reset_selection", "params": [self.session.id]},
+            {"jsonrpc": "2.0", "method": "get_selection", "params": [self.session.id], "id": 2}
+        ])
+
+        # then
+        self.assertEqual([{"id": 2, "jsonrpc": "2.0", "result": None}], response)
+
+
+class SessionEventsWebSocketTestCase(SessionTestMixin, TransactionTestCase):
+    def setUp(self) -> None:
+        self.create_session()
+
+    @staticmethod
+    async def connect(user: User, session_id: int) -> ApplicationCommunicator:
+        client = Client()
+        await sync_to_async(client.force_login)(user)
+        cookie = f"sessionid={client.cookies['sessionid'].value}"
+
+        return ApplicationCommunicator(session_events, {
+            "type": "websocket",
+            "path": f"/ws/sessions/{session_id}/",
+            "headers": [(b"cookie", cookie.encode())]
+        })
+
+    async def receive_event(self, communicator: ApplicationCommunicator) -> dict:
+        message = await communicator.receive_output(5)
+        self.assertEqual("websocket.send", message.get("type"))
+
+        return json.loads(message.get("text"))
+
+    async def test_snapshot_was_sent_after_connecting(self):
+        # given
+        communicator = await self.connect(self.owner, self.session.id)
+
+        # when
+        await communicator.send_input({"type": "websocket.connect"})
+
+        # then
+        self.assertEqual({"type": "websocket.accept"}, await communicator.receive_output(5))
+        snapshot = await self.receive_event(communicator)
+        self.assertEqual("snapshot", snapshot.get("type"))
+        self.assertEqual([{"username": "owner"}], snapshot.get("data").get("players"))
+
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait(5)
+
+    async def test_events_were_sent_for_procedure_calls(self):
+        # given
+        player = await sync_to_async(User.objects.create_user)("player")
+        communicator = await self.connect(self.owner, self.session.id)
+        await communicator.send_input({"type": "websocket.connect"})
+        await communicator.receive_output(5)
+        await self.receive_event(communicator)
+
+        # when
+        await self.acall_procedure(join_session, player, self.session.id)
+        await self.acall_procedure(make_selection, self.owner, self.session.id, 3)
+        await self.acall_procedure(make_selection, player, self.session.id, 5)
+
+        # then
+        events = [await self.receive_event(communicator) for _ in range(4)]
+        self.assertEqual(["player_joined", "vote_cast", "vote_cast", "votes_revealed"],
+                         [event.get("type") for event in events])
+        self.assertEqual({"username": "player"}, events[0].get("data"))
+        self.assertEqual([{"username": "owner", "selection": 3}, {"username": "player", "selection": 5}],
+                         events[3].get("data").get("players"))
+        self.assertEqual(sorted(event.get("version") for event in events), [event.get("version") for event in events])
+
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait(5)
+
+    async def test_cant_connect_when_not_in_session(self):
+        # given
+        stranger = await sync_to_async(User.objects.create_user)("stranger")
+        communicator = await self.connect(stranger, self.session.id)
+
+        # when
+        await communicator.send_input({"type": "websocket.connect"})
+
+        # then
+        message = await communicator.receive_output(5)
+        self.assertEqual("websocket.close", message.get("type"))
+        self.assertEqual(4403, message.get("code"))
+
+
+class SessionEventStreamTestCase(SessionTestMixin, TransactionTestCase):
+    def setUp(self) -> None:
+        self.create_session()
+
+    @staticmethod
+    async def receive_event(stream) -> dict:
+        fields = dict(line.split(": ", 1) for line in (await stream.__anext__()).strip().split("\n"))
+
+        return {"id": fields.get("id"), "event": fields.get("event"), "data": json.loads(fields.get("data"))}
+
+    @staticmethod
+    async def drain(stream) -> list[str]:
+        return [event async for event in stream]
+
+    async def test_patch_was_streamed_after_snapshot(self):
+        # given
+        stream = stream_session_events(self.owner, self.session.id)
+        snapshot = await self.receive_event(stream)
+
+        # when
+        story_id = await self.acall_procedure(create_story, self.owner, self.session.id, "summary", "description")
+        patch = await self.receive_event(stream)
+        await stream.aclose()
+
+        # then
+        self.assertEqual("snapshot", snapshot.get("event"))
+        self.assertEqual("patch", patch.get("event"))
+        self.assertEqual(str(self.session.version + 1), patch.get("id"))
+        self.assertIn({"op": "add", "path": "/stories/-",
+                       "value": {"id": story_id, "summary": "summary", "description": "description", "tasks": []}},
+                      patch.get("data"))
+
+    async def test_stream_was_resumed_from_change_log(self):
+        # given
+        await sync_to_async(session_changed)(self.session.id)
+        stream = stream_session_events(self.owner, self.session.id)
+        snapshot = await self.receive_event(stream)
+        await stream.aclose()
+        story_id = await self.acall_procedure(create_story, self.owner, self.session.id, "summary", "description")
+
+        # when
+        stream = stream_session_events(self.owner, self.session.id, int(snapshot.get("id")))
+        changes = await self.receive_event(stream)
+        await stream.aclose()
+
+        # then
+        self.assertEqual("changes", changes.get("event"))
+        self.assertEqual(str(int(snapshot.get("id")) + 1), changes.get("id"))
+        self.assertEqual([{"id": story_id, "summary": "summary", "description": "description"}],
+                         changes.get("data").get("stories").get("changed"))
+
+    @override_settings(SESSION_CHANGE_LOG_LENGTH=1)
+    async def test_snapshot_was_streamed_when_log_ended_before_last_event_id(self):
+        # given
+        await sync_to_async(session_changed)(self.session.id)
+        stream = stream_session_events(self.owner, self.session.id)
+        snapshot = await self.receive_event(stream)
+        await stream.aclose()
+        await self.acall_procedure(create_story, self.owner, self.session.id, "first", "description")
+        await self.acall_procedure(create_story, self.owner, self.session.id, "second", "description")
+
+        # when
+        stream = stream_session_events(self.owner, self.session.id, int(snapshot.get("id")))
+        resumed = await self.receive_event(stream)
+        await stream.aclose()
+
+        # then
+        self.assertEqual("snapshot", resumed.get("event"))
+        self.assertEqual(["first", "second"], [story.get("summary") for story in resumed.get("data").get("stories")])
+
+    async def test_stream_was_closed_after_leaving_session(self):
+        # given
+        player = await sync_to_async(User.objects.create_user)("player")
+        await self.acall_procedure(join_session, player, self.session.id)
+        stream = stream_session_events(player, self.session.id)
+        await self.receive_event(stream)
+
+        # when
+        await self.acall_procedure(leave_session, player, self.session.id)
+
+        # then
+        self.assertEqual("closed", (await self.receive_event(stream)).get("event"))
+
+    @override_settings(EVENT_STREAM_MAX_LIFETIME=0.3, SESSION_CHANGE_POLL_INTERVAL=0.05)
+    async def test_stream_ended_after_its_lifetime(self):
+        # given
+        stream = stream_session_events(self.owner, self.session.id)
+        snapshot = await self.receive_event(stream)
+
+        # when
+        rest = await asyncio.wait_for(self.drain(stream), 5)
+
+        # then
+        self.assertEqual("snapshot", snapshot.get("event"))
+        self.assertEqual([], rest)
+
+    async def test_cant_stream_when_not_in_session(self):
+        # given
+        stranger = await sync_to_async(User.objects.create_user)("stranger")
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(stranger)
+
+        # when
+        response = await client.get(f"/events/{self.session.id}")
+
+        # then
+        self.assertEqual(403, response.status_code)
+
+
+class JsonPatchTestCase(TestCase):
+    def test_patch_covers_changed_added_and_removed_values(self):
+        # given
+        old = {"players": [{"username": "a"}, {"username": "b"}], "stories": [], "flag": False}
+        new = {"players": [{"username": "a", "selection": 3}], "stories": [{"id": 1}], "flag": True}
+
+        # when
+        patch = make_patch(old, new)
+
+        # then
+        self.assertEqual([
+            {"op": "add", "path": "/players/0/selection", "value": 3},
+            {"op": "remove", "path": "/players/1"},
+            {"op": "add", "path": "/stories/-", "value": {"id": 1}},
+            {"op": "replace", "path": "/flag", "value": True}
+        ], patch)
+
+
+class RedisEventBusTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.location = f"unix://{self.directory.name}/broker.sock"
+        self.broker = EventBrokerThread(self.location)
+        self.broker.start()
+        self.received = {"first": [], "second": []}
+        self.second_received = threading.Event()
+
+    def tearDown(self) -> None:
+        self.broker.stop()
+        self.directory.cleanup()
+
+    def receiver(self, name: str):
+        def receive(session_id: int, events: list):
+            self.received[name].append((session_id, events))
+
+            if name == "second":
+                self.second_received.set()
+
+        return receive
+
+    def test_events_were_delivered_to_other_process(self):
+        # given
+        first_bus = RedisEventBus(self.receiver("first"), self.location)
+        second_bus = RedisEventBus(self.receiver("second"), self.location)
+        self.assertTrue(first_bus.subscribed.wait(5) and second_bus.subscribed.wait(5))
+
+        # when
+        first_bus.publish(1, [{"type": "vote_cast"}])
+
+        # then
+        self.assertTrue(self.second_received.wait(5))
+        first_bus.close()
+        second_bus.close()
+        self.assertEqual([(1, [{"type": "vote_cast"}])], self.received["first"])
+        self.assertEqual([(1, [{"type": "vote_cast"}])], self.received["second"])
+
+    def test_events_were_delivered_locally_without_broker(self):
+        # given
+        bus = RedisEventBus(self.receiver("first"), f"unix://{self.directory.name}/missing.sock")
+
+        # when
+        with self.assertLogs("rpc.event_bus", "WARNING"):
+            bus.publish(1, [{"type": "vote_cast"}])
+
+        # then
+        bus.close()
+        self.assertEqual([(1, [{"type": "vote_cast"}])], self.received["first"])
+
+    def test_publishing_to_stalled_server_timed_out(self):
+        # given
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.bind(f"{self.directory.name}/stalled.sock")
+        stalled.listen()
+        bus = RedisEventBus(self.receiver("first"), f"unix://{self.directory.name}/stalled.sock", reconnect_delay=60,
+                            publish_timeout=0.1)
+
+        # when
+        started = time.monotonic()
+
+        with self.assertLogs("rpc.event_bus", "WARNING"):
+            bus.publish(1, [{"type": "vote_cast"}])
+
+        bus.publish(1, [{"type": "vote_reset"}])
+        duration = time.monotonic() - started
+
+        # then
+        bus.close()
+        stalled.close()
+        self.assertLess(duration, 1)
+        self.assertEqual([(1, [{"type": "vote_cast"}]), (1, [{"type": "vote_reset"}])], self.received["first"])
+
+
+
+class EventBrokerTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.location = f"unix://{self.directory.name}/broker.sock"
+        self.broker = EventBrokerThread(self.location, max_buffer_size=256 * 1024)
+        self.broker.start()
+
+    def tearDown(self) -> None:
+        self.broker.stop()
+        self.directory.cleanup()
+
+    def test_stalled_subscriber_was_disconnected(self):
+        # given
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        stalled.connect(f"{self.directory.name}/broker.sock")
+        stalled.sendall(b"*2\r\n$9\r\nSUBSCRIBE\r\n$8\r\nsessions\r\n")
+        stalled.recv(1024)
+        publisher = redis.Redis.from_url(self.location)
+        message = b"x" * 64 * 1024
+
+        # when
+        with self.assertLogs("rpc.event_broker", "WARNING"):
+            receivers = [publisher.publish("sessions", message) for _ in range(256)]
+
+        # then
+        publisher.close()
+        stalled.close()
+        self.assertEqual(1, receivers[0])
+        self.assertEqual(0, receivers[-1])
+        self.assertEqual({}, self.broker.broker._channels)
+
+
+class ConcurrentCountersTestCase(SessionTestMixin, TransactionTestCase):
+    players_number = 300
+
+    def setUp(self) -> None:
+        self.owner = User.objects.create_user("owner")
+        self.users = User.objects.bulk_create(User(username=f"player{i}") for i in range(self.players_number))
+        self.session = Session.objects.create(owner=self.owner, players_number=self.players_number + 1,
+                                              ready_players_number=0)
+        Player.objects.bulk_create(Player(user=user, session=self.session) for user in [self.owner, *self.users])
+
+    def call_concurrently(self, calls: list[tuple]) -> list[Exception]:
+        errors = []
+        start = threading.Barrier(16)
+
+        def work(chunk: list[tuple]):
+            start.wait()
+
+            for procedure, user, *args in chunk:
+                try:
+                    self.call_procedure(procedure, user, *args)
+                except Exception as exc:
+                    errors.append(exc)
+
+            connections.close_all()
+
+        threads = [threading.Thread(target=work, args=(calls[i::16],)) for i in range(16)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return errors
+
+    def test_counters_are_exact_after_simultaneous_votes(self):
+        # given
+        calls = [(make_selection, user, self.session.id, 3) for user in self.users]
+
+        # when
+        errors = self.call_concurrently(calls)
+
+        # then
+        self.session.refresh_from_db()
+        self.assertEqual([], errors)
+        self.assertEqual(self.players_number, self.session.ready_players_number)
+        self.assertEqual(self.players_number, Player.objects.filter(session=self.session, voted=True).count())
+
+    def test_counters_are_exact_after_simultaneous_votes_resets_and_leaves(self):
+        # given
+        newcomers = User.objects.bulk_create(User(username=f"newcomer{i}") for i in range(100))
+        Player.objects.filter(user__in=self.users[:100]).update(selection=1, voted=True)
+        Session.objects.filter(id=self.session.id).update(ready_players_number=100)
+        calls = [(reset_selection, user, self.session.id) for user in self.users[:50]] \
+            + [(leave_session, user, self.session.id) for user in self.users[50:100]] \
+            + [(make_selection, user, self.session.id, 5) for user in self.users[100:200]] \
+            + [(join_session, user, self.session.id) for user in newcomers]
+
+        # when
+        errors = self.call_concurrently(calls)
+
+        # then
+        self.session.refresh_from_db()
+        self.assertEqual([], errors)
+        self.assertEqual(Player.objects.filter(session=self.session).count(), self.session.players_number)
+        self.assertEqual(Player.objects.filter(session=self.session, voted=True).count(),
+                         self.session.ready_players_number)
+        self.assertEqual(self.players_number + 1 - 50 + 100, self.session.players_number)
+        self.assertEqual(100 - 50 - 50 + 100, self.session.ready_players_number)
+
+    def test_repeated_votes_are_counted_once(self):
+        # given
+        calls = [(make_selection, self.users[0], self.session.id, 8)] * 200
+
+        # when
+        errors = self.call_concurrently(calls)
+
+        # then
+        self.session.refresh_from_db()
+        self.assertEqual(199, len(errors))
+        self.assertTrue(all(str(error) == "Selection is not empty" for error in errors))
+        self.assertEqual(1, self.session.ready_players_number)
+
+    def test_counters_are_exact_after_forcing_selections_during_votes(self):
+        # given
+        calls = [(make_selection, user, self.session.id, 2) for user in self.users[:150]]
+        calls.insert(75, (force_selections, self.owner, self.session.id))
+
+        # when
+        errors = self.call_concurrently(calls)
+
+        # then
+        self.session.refresh_from_db()
+        self.assertEqual([], errors)
+        self.assertEqual(self.players_number + 1, self.session.ready_players_number)
+        self.assertFalse(Player.objects.filter(session=self.session, voted=False).exists())
@@ -1,4 +1,4 @@
-from typing import NotRequired, TypedDict
+from typing import Any, NotRequired, TypedDict
 
 
 class SessionDTO(TypedDict):
@@ -6,6 +6,13 @@ class SessionDTO(TypedDict):
     user_is_owner: bool
 
 
+class SessionSummaryDTO(SessionDTO):
+    players_number: int
+    ready_players_number: int
+    stories_number: int
+    last_activity: str
+
+
 class PlayerDTO(TypedDict):
     username: str
     selection: NotRequired[int | None]
@@ -24,6 +31,104 @@ class StoryDTO(TypedDict):
     tasks: list[TaskDTO]
 
 
+class ImportedStoryDTO(TypedDict):
+    id: int
+    tasks: list[int]
+
+
+class SelectionCountDTO(TypedDict):
+    selection: int
+    count: int
+
+
+class VoteResultsDTO(TypedDict):
+    histogram: list[SelectionCountDTO]
+    minimum: int | None
+    maximum: int | None
+    average: float | None
+    consensus: bool
+
+
 class SessionDetailsDTO(SessionDTO):
+    version: int
     players: list[PlayerDTO]
     stories: list[StoryDTO]
+    results: NotRequired[VoteResultsDTO]
+
+
+class SessionChangeDTO(TypedDict):
+    version: int
+    changed: bool
+    session: NotRequired[SessionDetailsDTO]
+
+
+class StorySummaryDTO(TypedDict):
+    id: int
+    summary: str
+    description: str
+
+
+class StoryTaskDTO(TaskDTO):
+    story_id: int
+
+
+class PlayerChangesDTO(TypedDict):
+    changed: list[PlayerDTO]
+    removed: list[str]
+
+
+class StoryChangesDTO(TypedDict):
+    changed: list[StorySummaryDTO]
+    removed: list[int]
+
+
+class TaskChangesDTO(TypedDict):
+    changed: list[StoryTaskDTO]
+    removed: list[int]
+
+
+class SessionChangesDTO(TypedDict):
+    players: PlayerChangesDTO
+    stories: StoryChangesDTO
+    tasks: TaskChangesDTO
+    # Only present when the results changed, None when the selections got hidden
+    results: NotRequired[VoteResultsDTO | None]
+
+
+class SessionDeltaDTO(TypedDict):
+    version: int
+    full: bool
+    session: NotRequired[SessionDetailsDTO]
+    changes: NotRequired[SessionChangesDTO]
+
+
+class StoryStatisticsDTO(TypedDict):
+    story_id: int
+    votes: int
+    mean: float
+    median: float
+    spread: float
+    minimum: int
+    maximum: int
+    agreement: float
+    consensus: bool
+    outliers: int
+
+
+class PlayerStatisticsDTO(TypedDict):
+    username: str
+    votes: int
+    bias: float
+    deviation: float
+    outlier_rate: float
+
+
+class EstimationStatisticsDTO(TypedDict):
+    stories: list[StoryStatisticsDTO]
+    players: list[PlayerStatisticsDTO]
+
+
+class SessionEventDTO(TypedDict):
+    type: str
+    version: int | None
+    data: dict[str, Any]
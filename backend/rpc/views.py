@@ -0,0 +1,210 @@
+import asyncio
+import codecs
+import hmac
+import json
+import os
+from typing import Any, AsyncIterator
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed, \
+    JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .changes import SessionSubscription
+from .exports import export_records, format_csv, format_ndjson
+from .imports import bulk_import_stories, parse_csv, parse_ndjson
+from .json_patch import make_patch
+from .membership import check_membership
+from .metrics import get_cache_metrics, get_metrics, render_prometheus
+from .models import Player
+from .snapshots import build_session_delta, get_session_details
+from .types import SessionDeltaDTO, SessionDetailsDTO
+
+
+def health(request: HttpRequest) -> HttpResponse:
+    """Reports whether this worker is able to serve requests, that is whether it can reach the database.
+    Meant for load balancers and container probes.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError:
+        return JsonResponse({"status": "unavailable"}, status=503)
+
+    return JsonResponse({"status": "ok"})
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """Exports the remote procedure call metrics of this worker in the Prometheus text format, labelled with
+    the worker's process id. Not available when ``RPC_METRICS_ENABLED`` is off. When ``RPC_METRICS_TOKEN`` is
+    set, scrapers have to send it as a bearer token.
+    """
+    if not settings.RPC_METRICS_ENABLED:
+        raise Http404()
+
+    if settings.RPC_METRICS_TOKEN and not hmac.compare_digest(request.headers.get("Authorization", ""),
+                                                              f"Bearer {settings.RPC_METRICS_TOKEN}"):
+        return HttpResponseForbidden("Invalid metrics token")
+
+    return HttpResponse(render_prometheus(get_metrics(), get_cache_metrics(), os.getpid()),
+                        content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@csrf_exempt
+def import_stories(request: HttpRequest, session_id: int) -> HttpResponse:
+    """Imports stories with their tasks into a session, if the user is registered as a player. The request body
+    is either ``text/csv`` or newline delimited JSON (``application/x-ndjson``), see :mod:`rpc.imports` for
+    the formats. It is read line by line rather than as a whole, so uploads of any size can be imported.
+
+    Answers with the ids of the created stories and of their tasks, or with a 400 status and the first problem
+    found, in which case nothing is imported.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden("Not available to anonymous users")
+
+    try:
+        check_membership(request, session_id)
+    except Player.DoesNotExist:
+        return HttpResponseForbidden("Not a player of this session")
+
+    parse = {"text/csv": parse_csv, "application/x-ndjson": parse_ndjson}.get(request.content_type)
+
+    if parse is None:
+        return HttpResponse("Expected text/csv or application/x-ndjson", status=415)
+
+    try:
+        imported = bulk_import_stories(session_id, parse(codecs.iterdecode(request, "utf-8-sig")))
+    except (UnicodeDecodeError, ValueError) as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    return JsonResponse({"stories": imported}, status=201)
+
+
+async def export_session(request: HttpRequest, session_id: int) -> HttpResponse:
+    """Streams a complete session, its players with their votes, its stories and its tasks with their estimations,
+    if the user is registered as a player. Records are newline delimited JSON, or CSV with ``?format=csv``,
+    see :mod:`rpc.exports`. Memory use doesn't depend on the size of the session.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return HttpResponseForbidden("Not available to anonymous users")
+
+    if not await Player.objects.filter(user=request.user, session=session_id).aexists():
+        return HttpResponseForbidden("Not a player of this session")
+
+    if request.GET.get("format", "ndjson") == "csv":
+        content, content_type, extension = format_csv(export_records(session_id)), "text/csv", "csv"
+    else:
+        content, content_type, extension = format_ndjson(export_records(session_id)), "application/x-ndjson", "ndjson"
+
+    response = StreamingHttpResponse(content, content_type=f"{content_type}; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="session-{session_id}.{extension}"'
+    return response
+
+
+async def session_events(request: HttpRequest, session_id: int) -> HttpResponse:
+    """Streams changes of a session as Server-Sent Events, if the user is registered as a player.
+
+    The first event is either a ``snapshot`` with the session details or, when the client resumes with
+    a ``Last-Event-ID`` header still covered by the session's change log, a ``changes`` event covering everything
+    it missed, in the format of ``get_session_delta``. Every following ``patch`` event holds a JSON Patch against
+    the previously sent details. Event ids are session versions. Streams end after ``EVENT_STREAM_MAX_LIFETIME``
+    seconds, and clients reconnect with ``Last-Event-ID``.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return HttpResponseForbidden("Not available to anonymous users")
+
+    user: User = request.user
+
+    if not await Player.objects.filter(user=user, session=session_id).aexists():
+        return HttpResponseForbidden("Not a player of this session")
+
+    last_event_id = request.headers.get("Last-Event-ID", "")
+    last_version = int(last_event_id) if last_event_id.isdigit() else None
+
+    response = StreamingHttpResponse(stream_session_events(user, session_id, last_version),
+                                     content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def stream_session_events(user: User, session_id: int, last_version: int | None = None) -> AsyncIterator[str]:
+    """Yields Server-Sent Events describing the changes of a session, see :func:`session_events`.
+
+    Changes are streamed as soon as they are published on the event bus. As a safety net for events lost
+    by the bus, the session version is also re-read every ``SESSION_CHANGE_POLL_INTERVAL`` seconds.
+    The stream ends with a ``closed`` event once the user is no longer a player of the session.
+
+    Neither the ASGI handler nor the server tells a streaming response that its client has disconnected, so
+    the stream also ends after ``EVENT_STREAM_MAX_LIFETIME`` seconds. Otherwise streams of closed tabs would
+    keep polling until their users leave their sessions.
+
+    :param user: user the details are prepared for
+    :param session_id: identifies the session to stream
+    :param last_version: version the client already has, if it is resuming
+    """
+    loop = asyncio.get_running_loop()
+
+    with SessionSubscription(session_id) as subscription:
+        details, delta = await _get_session_delta(user, session_id, last_version)
+
+        if delta is None or delta["full"]:
+            yield _format_event("snapshot", details["version"], details)
+        elif delta["version"] != last_version:
+            yield _format_event("changes", delta["version"], delta["changes"])
+
+        last_sent = loop.time()
+        deadline = last_sent + settings.EVENT_STREAM_MAX_LIFETIME
+
+        while (remaining := deadline - loop.time()) > 0:
+            await subscription.get(min(settings.SESSION_CHANGE_POLL_INTERVAL, remaining))
+
+            try:
+                version = await Player.objects.filter(user=user, session=session_id) \
+                    .values_list("session__version", flat=True).aget()
+                new_details = await _get_session_details(user, session_id) if version != details["version"] else None
+            except Player.DoesNotExist:
+                yield _format_event("closed", None, None)
+                return
+
+            if new_details is not None:
+                yield _format_event("patch", new_details["version"], make_patch(details, new_details))
+                details = new_details
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= settings.EVENT_STREAM_KEEP_ALIVE:
+                yield ": keep-alive\n\n"
+                last_sent = loop.time()
+
+
+def _format_event(event_type: str, version: int | None, data: Any) -> str:
+    lines = [] if version is None else [f"id: {version}"]
+    lines += [f"event: {event_type}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+@sync_to_async
+def _get_session_delta(user: User, session_id: int,
+                       since_version: int | None) -> tuple[SessionDetailsDTO, SessionDeltaDTO | None]:
+    # The details and the changes are read from the same version of the session.
+    player = Player.objects.select_related("session__snapshot").get(user=user, session=session_id)
+    details = get_session_details(player.session, user)
+
+    return details, None if since_version is None else build_session_delta(player.session, user, since_version)
+
+
+@sync_to_async
+def _get_session_details(user: User, session_id: int) -> SessionDetailsDTO:
+    player = Player.objects.select_related("session__snapshot").get(user=user, session=session_id)
+    return get_session_details(player.session, user)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.http import HttpRequest
+
+from .changes import SessionSubscription
+from .models import Player
+from .snapshots import get_session_details
+from .types import SessionDetailsDTO, SessionEventDTO
+
+SESSION_EVENTS_PATH = re.compile(r"^/ws/sessions/(?P<session_id>\d+)/$")
+
+CLOSE_NOT_FOUND = 4404
+CLOSE_FORBIDDEN = 4403
+
+
+async def session_events(scope: dict, receive, send):
+    """ASGI application streaming the events of a session over a WebSocket at ``/ws/sessions/<session_id>/``.
+
+    Only players of the session, authenticated with the usual session cookie, are accepted. The first message
+    is a ``snapshot`` event holding the session details, every following one is an event published by
+    :func:`rpc.changes.session_changed`. The socket is closed when the session gets deleted or the player leaves it.
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+
+    match = SESSION_EVENTS_PATH.match(scope["path"])
+
+    if match is None:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+
+    session_id = int(match["session_id"])
+
+    with SessionSubscription(session_id) as subscription:
+        user = await _get_user(scope)
+
+        try:
+            details = await _get_session_details(user, session_id)
+        except Player.DoesNotExist:
+            await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+            return
+
+        await send({"type": "websocket.accept"})
+        await _send_event(send, {"type": "snapshot", "version": details["version"], "data": details})
+
+        receiving = asyncio.ensure_future(receive())
+        publishing = asyncio.ensure_future(subscription.get())
+
+        try:
+            while True:
+                await asyncio.wait([receiving, publishing], return_when=asyncio.FIRST_COMPLETED)
+
+                if receiving.done():
+                    if receiving.result()["type"] == "websocket.disconnect":
+                        return
+
+                    # Clients have nothing to say on this channel, so anything they send is ignored.
+                    receiving = asyncio.ensure_future(receive())
+
+                if publishing.done():
+                    event_dto = publishing.result()
+                    publishing = asyncio.ensure_future(subscription.get())
+
+                    # Events up to the snapshot's version are already included in it.
+                    if event_dto["version"] is not None and event_dto["version"] <= details["version"]:
+                        continue
+
+                    await _send_event(send, event_dto)
+
+                    if event_dto["type"] == "session_deleted" or \
+                            event_dto["type"] == "player_left" and event_dto["data"]["username"] == user.username:
+                        await send({"type": "websocket.close"})
+                        return
+        finally:
+            receiving.cancel()
+            publishing.cancel()
+
+
+async def _send_event(send, event_dto: SessionEventDTO):
+    await send({"type": "websocket.send", "text": json.dumps(event_dto)})
+
+
+@sync_to_async
+def _get_user(scope: dict) -> User:
+    cookies = SimpleCookie()
+
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies.load(value.decode("latin1"))
+
+    request = HttpRequest()
+    session_cookie = cookies.get(settings.SESSION_COOKIE_NAME)
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_cookie and session_cookie.value)
+
+    return get_user(request)
+
+
+@sync_to_async
+def _get_session_details(user: User, session_id: int) -> SessionDetailsDTO:
+    if not user.is_authenticated:
+        raise Player.DoesNotExist("Not available to anonymous users")
+
+    player = Player.objects.select_related("session__snapshot").get(user=user, session=session_id)
+
+    return get_session_details(player.session, user)
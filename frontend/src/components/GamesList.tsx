@@ -2,7 +2,13 @@ import { useSessionContext } from "../contexts/SessionContext";
 import { Game } from "../types";
 
 export function GamesList() {
-  const { sessions, activateGame, game: currentGame } = useSessionContext();
+  const {
+    sessions,
+    hasMoreSessions,
+    loadMoreSessions,
+    activateGame,
+    game: currentGame,
+  } = useSessionContext();
 
   return (
     // a list of games with tailwind
@@ -24,6 +30,14 @@ export function GamesList() {
           </button>
         </div>
       ))}
+      {hasMoreSessions && (
+        <button
+          className="bg-gray-200 hover:bg-gray-300 py-1 px-2 rounded-md"
+          onClick={() => loadMoreSessions()}
+        >
+          Load more
+        </button>
+      )}
     </div>
   );
 }
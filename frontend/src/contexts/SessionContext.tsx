@@ -5,6 +5,7 @@ import React, {
   useContext,
   useEffect,
   useMemo,
+  useRef,
   useState,
 } from "react";
 import {
@@ -20,12 +21,17 @@ import { useUserContext } from "./UserContext";
 import { getClosestFibonacci } from "../utils";
 import Cookies from "js-cookie";
 
+// at most the backend's SESSIONS_PAGE_SIZE, a shorter page is the last one
+const SESSIONS_PAGE_SIZE = 50;
+
 interface SessionContextProps {
   game: Game | null;
   currentVote: Vote | null;
   roundResult: GameRoundResult | null;
   players: Player[];
   sessions: Game[];
+  hasMoreSessions: boolean;
+  loadMoreSessions: () => Promise<void>;
   stories: Story[];
   activateGame: (gameId: string) => Promise<void>;
   setVote: (cardValue: CardValue | null) => Promise<void>;
@@ -51,6 +57,8 @@ export const SessionContext = createContext<SessionContextProps>({
   roundResult: null,
   players: [],
   sessions: [],
+  hasMoreSessions: false,
+  loadMoreSessions: async () => {},
   stories: [],
   activateGame: async () => {},
   setVote: async () => {},
@@ -78,6 +86,12 @@ export const SessionProvider = ({
   const [players, setPlayers] = useState<Player[]>([]);
   const [stories, setStories] = useState<Story[]>([]);
   const { user, clientId } = useUserContext();
+  const sessionVersion = useRef<number | null>(null);
+  // id of the oldest session loaded so far, the next page of sessions starts after it
+  const sessionsCursor = useRef<string | null>(null);
+  const [hasMoreSessions, setHasMoreSessions] = useState(false);
+  // game the long-poll loop currently works for, so late responses for a previous game are dropped
+  const polledGameId = useRef<string | null>(null);
 
   const isGameActionDisabled = !game?.id || !user || currentVote?.cardValue;
 
@@ -85,19 +99,30 @@ export const SessionProvider = ({
     if (!game || !user) return;
 
     if (cardValue) {
-      const makeSelectionResullt = await fetch("/rpc", {
+      // one batch, so that the vote and the refreshed session share a single request
+      const [makeSelectionResult, sessionChangeResult] = await fetch("/rpc", {
         method: "POST",
-        body: JSON.stringify({
-          jsonrpc: "2.0",
-          method: "make_selection",
-          params: [game?.id, cardValue],
-          id: clientId,
-        }),
-      }).then((res) => res.json());
+        body: JSON.stringify([
+          {
+            jsonrpc: "2.0",
+            method: "make_selection",
+            params: [game?.id, cardValue],
+            id: 1,
+          },
+          {
+            jsonrpc: "2.0",
+            method: "get_session_if_changed",
+            params: [game?.id, sessionVersion.current ?? -1],
+            id: 2,
+          },
+        ]),
+      })
+        .then((res) => res.json())
+        .then((results: any[]) => results.sort((a, b) => a.id - b.id));
 
-      if (makeSelectionResullt.error) return;
+      if (makeSelectionResult.error) return;
 
-      const selections = await getSelections();
+      applySessionChange(sessionChangeResult);
       setCurrentVote({ cardValue: cardValue, username: user.username });
     } else {
       const res = await fetch("/rpc", {
@@ -159,8 +184,7 @@ export const SessionProvider = ({
       setGame(null);
       Cookies.remove("gameId");
       // get sessions again
-      const sessions = await getSessions();
-      setSessions(sessions);
+      await reloadSessions();
     }
   };
 
@@ -201,19 +225,42 @@ export const SessionProvider = ({
   };
 
   const getSelections = async () => {
-    const res = await fetch("/rpc", {
+    const res = await fetch("/rpc/async/", {
       method: "POST",
       body: JSON.stringify({
         jsonrpc: "2.0",
-        method: "get_session",
+        method: "get_session_if_changed",
         id: clientId,
-        params: [game?.id],
+        params: [game?.id, sessionVersion.current ?? -1],
       }),
     }).then((res) => res.json());
 
-    if (res.error) return;
+    return applySessionChange(res);
+  };
+
+  const waitForSelections = async (gameId: string, isCurrent: () => boolean) => {
+    const res = await fetch("/rpc/async/", {
+      method: "POST",
+      body: JSON.stringify({
+        jsonrpc: "2.0",
+        method: "wait_for_session_change",
+        id: clientId,
+        params: [gameId, sessionVersion.current ?? -1, 25],
+      }),
+    }).then((res) => res.json());
+
+    if (!isCurrent()) return;
+    if (res.error) throw new Error(res.error.message);
 
-    const selections = res.result;
+    return applySessionChange(res);
+  };
+
+  const applySessionChange = (res: any) => {
+    if (res.error || !res.result.changed) return;
+
+    sessionVersion.current = res.result.version;
+
+    const selections = res.result.session;
     const { players: playersResponse } = selections;
     const { stories: storiesResponse } = selections;
 
@@ -239,26 +286,52 @@ export const SessionProvider = ({
       setRoundResult(null);
     }
 
-    return res.result;
+    return selections;
   };
 
-  const getSessions = async () => {
-    const res = await fetch("/rpc", {
+  // get_sessions returns the newest sessions first, a page at a time
+  const getSessions = async (before: string | null) => {
+    const res = await fetch("/rpc/async/", {
       method: "POST",
       body: JSON.stringify({
         jsonrpc: "2.0",
         method: "get_sessions",
         id: clientId,
+        params: [before, SESSIONS_PAGE_SIZE],
       }),
     }).then((res) => res.json());
 
-    return res.result;
+    if (res.error) return [];
+
+    const page: Game[] = res.result.map((s: any) => ({
+      ...s,
+      isOwner: s.user_is_owner,
+    }));
+
+    sessionsCursor.current = page.length ? page[page.length - 1].id : before;
+    setHasMoreSessions(page.length === SESSIONS_PAGE_SIZE);
+
+    return page;
+  };
+
+  const reloadSessions = async () => {
+    setSessions(await getSessions(null));
+  };
+
+  const loadMoreSessions = async () => {
+    const page = await getSessions(sessionsCursor.current);
+
+    // sessions joined meanwhile may already be listed
+    setSessions((loaded) => [
+      ...loaded,
+      ...page.filter((s) => !loaded.some((l) => l.id === s.id)),
+    ]);
   };
 
   const activateGame = async (id: string) => {
     if (!user) return;
 
-    const res = await fetch("/rpc", {
+    const res = await fetch("/rpc/async/", {
       method: "POST",
       body: JSON.stringify({
         jsonrpc: "2.0",
@@ -421,12 +494,27 @@ export const SessionProvider = ({
   };
 
   useEffect(() => {
+    sessionVersion.current = null;
+    polledGameId.current = game?.id ?? null;
     if (!game?.id) return;
-    const interval = setInterval(() => {
-      getSelections();
-    }, 1500);
+    let active = true;
+    const isCurrent = (gameId: string) => () => active && polledGameId.current === gameId;
+
+    // long-poll: the server answers as soon as the session changes
+    const poll = async (gameId: string) => {
+      while (active) {
+        try {
+          await waitForSelections(gameId, isCurrent(gameId));
+        } catch {
+          await new Promise((resolve) => setTimeout(resolve, 1500));
+        }
+      }
+    };
+    poll(game.id);
 
-    return () => clearInterval(interval);
+    return () => {
+      active = false;
+    };
   }, [game?.id]);
 
   const api = useMemo(() => {
@@ -436,6 +524,8 @@ export const SessionProvider = ({
       isGameActionDisabled,
       roundResult,
       sessions,
+      hasMoreSessions,
+      loadMoreSessions,
       players,
       stories,
       addStory,
@@ -456,6 +546,7 @@ export const SessionProvider = ({
     roundResult,
     user,
     sessions,
+    hasMoreSessions,
     stories,
     setVote,
     startNewGame,
@@ -466,14 +557,7 @@ export const SessionProvider = ({
 
   useEffect(() => {
     resetContext();
-    getSessions().then((sessions) => {
-      // map through sessions and add isOwner property from user_is_owner field
-      sessions = sessions.map((s: any) => ({
-        ...s,
-        isOwner: s.user_is_owner,
-      }));
-      setSessions(sessions);
-    });
+    reloadSessions();
   }, [user]);
 
   // reset game cookie when game is left